@@ -1338,6 +1338,20 @@ class OAuthHandler(BaseHandler):
       raise CustomHTTPError(HTTPCodes.UNAUTHORIZED, message='Invalid password')
 
 
+class SourceArchiveHandler(web.StaticFileHandler):
+  """ Serves source archives to other machines in the deployment. Range
+  requests are supported, so archives can be fetched in chunks. """
+  def prepare(self):
+    """ Ensures the request comes from a machine in the deployment.
+
+    Raises:
+      CustomHTTPError if the secret is missing or invalid.
+    """
+    secret = self.request.headers.get('AppScale-Secret', '')
+    if not utils.constant_time_compare(secret, options.secret):
+      raise CustomHTTPError(HTTPCodes.UNAUTHORIZED, message='Invalid secret')
+
+
 def main():
   """ Starts the AdminServer. """
   logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
@@ -1446,7 +1460,9 @@ def main():
     ('/api/queue/update', UpdateQueuesHandler,
      {'zk_client': zk_client, 'ua_client': ua_client}),
     ('/v1/projects/([^/]*)/serviceAccounts', ServiceAccountsHandler,
-     {'zk_client': zk_client, 'ua_client': ua_client})
+     {'zk_client': zk_client, 'ua_client': ua_client}),
+    (constants.SOURCES_URL_PATH + r'/([^/]+\.tar\.gz)', SourceArchiveHandler,
+     {'path': constants.SOURCES_DIRECTORY})
   ])
   logger.info('Starting AdminServer')
   app.listen(args.port)
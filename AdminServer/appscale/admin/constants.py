@@ -125,6 +125,9 @@ IMMUTABLE_PROJECTS = [DASHBOARD_APP_ID]
 # The directory where source archives are stored.
 SOURCES_DIRECTORY = os.path.join('/', 'opt', 'appscale', 'apps')
 
+# The URL path that the AdminServer uses to serve source archives.
+SOURCES_URL_PATH = '/sources'
+
 # The inbound services that are supported.
 SUPPORTED_INBOUND_SERVICES = ('INBOUND_SERVICE_WARMUP',
                               'INBOUND_SERVICE_XMPP_MESSAGE',
@@ -0,0 +1,190 @@
+""" Fetches source archives from other machines using HTTP range requests. """
+
+import collections
+import hashlib
+import logging
+import os
+
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPError
+from tornado.locks import Condition
+from tornado.options import options
+
+from appscale.common.constants import HTTPCodes
+from .constants import (
+  MAX_CONCURRENT_CHUNKS,
+  SOURCE_CHUNK_SIZE,
+  SOURCE_CHUNK_TIMEOUT
+)
+from ..constants import DEFAULT_PORT, InvalidSource, SOURCES_URL_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkUnavailable(Exception):
+  """ Indicates that a chunk could not be fetched from any host. """
+  pass
+
+
+class ChunkedArchiveFetch(object):
+  """ Downloads a source archive in chunks from several machines at once.
+
+  Chunks are requested in parallel, but they are written and hashed in order,
+  so the archive is verified while it is being downloaded. The number of
+  chunks held in memory while waiting for a preceding chunk is limited.
+  """
+  def __init__(self, hosts, location, expected_md5,
+               chunk_size=SOURCE_CHUNK_SIZE,
+               concurrency=MAX_CONCURRENT_CHUNKS):
+    """ Creates a new ChunkedArchiveFetch.
+
+    Args:
+      hosts: A list of strings specifying machines that have the archive.
+      location: A string specifying the path to the archive.
+      expected_md5: A string specifying the archive's MD5 hex digest.
+      chunk_size: An integer specifying the number of bytes per request.
+      concurrency: An integer specifying the max number of requests to make
+        at once.
+    """
+    self.hosts = hosts
+    self.location = location
+    self.expected_md5 = expected_md5
+    self.chunk_size = chunk_size
+    self.concurrency = concurrency
+
+    self._pending = collections.deque()
+    self._fetched = {}
+    self._next_chunk = 0
+    self._chunk_count = None
+    self._chunk_written = Condition()
+    self._md5 = None
+    self._archive_file = None
+
+  @gen.coroutine
+  def run(self):
+    """ Downloads the archive to its location.
+
+    Raises:
+      ChunkUnavailable if a chunk could not be fetched from any host.
+      InvalidSource if the downloaded archive does not match the MD5 digest.
+    """
+    first_chunk, total_size = yield self._fetch_chunk(0)
+    self._chunk_count = max(
+      (total_size + self.chunk_size - 1) // self.chunk_size, 1)
+    self._pending.extend(range(1, self._chunk_count))
+
+    partial_location = '{}.part'.format(self.location)
+    self._md5 = hashlib.md5()
+    self._archive_file = open(partial_location, 'wb')
+    try:
+      self._add_chunk(0, first_chunk)
+      worker_count = min(self.concurrency, len(self._pending))
+      yield [self._fetch_pending(worker) for worker in range(worker_count)]
+    finally:
+      self._archive_file.close()
+      if self._next_chunk != self._chunk_count:
+        os.remove(partial_location)
+
+    if self._md5.hexdigest() != self.expected_md5:
+      os.remove(partial_location)
+      raise InvalidSource('Source MD5 does not match')
+
+    os.rename(partial_location, self.location)
+
+  @gen.coroutine
+  def _fetch_pending(self, worker):
+    """ Fetches chunks until there are none left.
+
+    Args:
+      worker: An integer used to spread requests across hosts.
+    """
+    max_buffered = self.concurrency * 2
+    while self._pending:
+      # Avoid holding too many chunks that can't be written yet.
+      if self._pending[0] >= self._next_chunk + max_buffered:
+        yield self._chunk_written.wait()
+        continue
+
+      index = self._pending.popleft()
+      try:
+        body, _ = yield self._fetch_chunk(index, worker)
+      except ChunkUnavailable:
+        # Stop the other workers since the archive can't be completed.
+        self._pending.clear()
+        self._chunk_written.notify_all()
+        raise
+
+      if self._archive_file.closed:
+        return
+
+      self._add_chunk(index, body)
+
+  def _add_chunk(self, index, body):
+    """ Writes and hashes all chunks that are ready in order.
+
+    Args:
+      index: An integer specifying the position of the fetched chunk.
+      body: A byte string containing the chunk.
+    """
+    self._fetched[index] = body
+    while self._next_chunk in self._fetched:
+      chunk = self._fetched.pop(self._next_chunk)
+      self._md5.update(chunk)
+      self._archive_file.write(chunk)
+      self._next_chunk += 1
+
+    self._chunk_written.notify_all()
+
+  @gen.coroutine
+  def _fetch_chunk(self, index, worker=0):
+    """ Requests a range of the archive, trying each host in turn.
+
+    Args:
+      index: An integer specifying the position of the chunk.
+      worker: An integer used to pick the first host to try.
+    Returns:
+      A tuple containing the chunk and the total size of the archive.
+    Raises:
+      ChunkUnavailable if no host was able to provide the chunk.
+    """
+    start = index * self.chunk_size
+    end = start + self.chunk_size - 1
+    headers = {'AppScale-Secret': options.secret,
+               'Range': 'bytes={}-{}'.format(start, end)}
+    http_client = AsyncHTTPClient()
+    first_host = (index + worker) % len(self.hosts)
+    for host in self.hosts[first_host:] + self.hosts[:first_host]:
+      url = 'http://{}:{}{}/{}'.format(host, DEFAULT_PORT, SOURCES_URL_PATH,
+                                       os.path.basename(self.location))
+      try:
+        response = yield http_client.fetch(
+          url, headers=headers, request_timeout=SOURCE_CHUNK_TIMEOUT)
+      except (HTTPError, IOError) as error:
+        logger.warning('Unable to fetch {} from {}: {}'.format(
+          headers['Range'], host, error))
+        continue
+
+      # A range that covers the whole archive is returned as a regular
+      # response.
+      if response.code == HTTPCodes.OK and start == 0:
+        raise gen.Return((response.body, len(response.body)))
+
+      content_range = response.headers.get('Content-Range', '')
+      try:
+        returned_range, total_size = content_range.split()[1].split('/')
+        total_size = int(total_size)
+      except (IndexError, ValueError):
+        logger.warning('Invalid range response from {}'.format(host))
+        continue
+
+      expected_size = min(end + 1, total_size) - start
+      if (returned_range != '{}-{}'.format(start, start + expected_size - 1)
+          or len(response.body) != expected_size):
+        logger.warning('Unexpected range from {}: {}'.format(
+          host, content_range))
+        continue
+
+      raise gen.Return((response.body, total_size))
+
+    raise ChunkUnavailable('Unable to fetch {} of {}'.format(
+      headers['Range'], self.location))
@@ -1,7 +1,6 @@
 """ Common constants for managing AppServer instances. """
 
 import os
-import urllib2
 
 from appscale.common.constants import APPSCALE_HOME
 
@@ -16,21 +15,6 @@ class BadConfigurationException(Exception):
     return repr(self.value)
 
 
-class NoRedirection(urllib2.HTTPErrorProcessor):
-  """ A url opener that does not automatically redirect. """
-  def http_response(self, request, response):
-    """ Processes HTTP responses.
-
-    Args:
-      request: An HTTP request object.
-      response: An HTTP response object.
-    Returns:
-      The HTTP response object.
-    """
-    return response
-  https_response = http_response
-
-
 # The location of the API server start script.
 API_SERVER_LOCATION = os.path.join('/', 'opt', 'appscale_venvs', 'api_server',
                                    'bin', 'appscale-api-server')
@@ -41,8 +25,9 @@ API_SERVER_PREFIX = 'appscale-api-server@'
 # Max application server log size in bytes.
 APP_LOG_SIZE = 250 * 1024 * 1024
 
-# The amount of seconds to wait between checking if an application is up.
-BACKOFF_TIME = 1
+# The initial amount of seconds to wait between checking if an application is
+# up. The delay doubles after each failed check.
+BACKOFF_TIME = .5
 
 # Patterns that match jars that should be stripped from version sources.
 CONFLICTING_JARS = [
@@ -62,6 +47,13 @@ DASHBOARD_PROJECT_ID = 'appscaledashboard'
 # Max log size for AppScale Dashboard servers.
 DASHBOARD_LOG_SIZE = 10 * 1024 * 1024
 
+# The directory that holds extracted source trees by archive digest.
+EXTRACTED_SOURCES_CACHE = os.path.join('/', 'var', 'cache', 'appscale',
+                                       'sources')
+
+# The number of unused extracted source trees to keep.
+EXTRACTED_SOURCES_CACHE_SIZE = 10
+
 # The default amount of memory in MB to allow an instance.
 DEFAULT_MAX_APPSERVER_MEMORY = 400
 
@@ -95,9 +87,23 @@ HEALTH_CHECK_TIMEOUT = 2
 # The highest available port to assign to an API server.
 MAX_API_SERVER_PORT = 19999
 
+# The max amount of seconds to wait between checking if an application is up.
+MAX_BACKOFF_TIME = 4
+
 # The maximum number of threads to use for executing blocking tasks.
 MAX_BACKGROUND_WORKERS = 4
 
+# The maximum number of chunk requests to make at once for a source archive.
+MAX_CONCURRENT_CHUNKS = 4
+
+# The maximum number of instances that can be starting on a machine at once.
+MAX_CONCURRENT_STARTS = 4
+
+# The maximum number of health checks in flight at once. It's kept below the
+# default max_clients of AsyncHTTPClient so that checks don't wait in its
+# queue.
+MAX_CONCURRENT_HEALTH_CHECKS = 5
+
 # The number of seconds an instance is allowed to finish serving requests after
 # it receives a shutdown signal.
 MAX_INSTANCE_RESPONSE_TIME = 600
@@ -129,6 +135,15 @@ INSTANCE_CLASSES = {
     'B8': 1024,
 }
 
+# The number of bytes to request at once when fetching a source archive.
+SOURCE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# The number of seconds to wait for a source archive chunk.
+SOURCE_CHUNK_TIMEOUT = 60
+
+# The file in a revision directory that records the digest of its archive.
+SOURCE_MD5_FILE = 'source.md5'
+
 # The amount of seconds to wait for an application to start up.
 START_APP_TIMEOUT = 180
 
@@ -4,11 +4,12 @@ import logging
 import monotonic
 import json
 import os
-import urllib2
+import socket
 
 from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPError
 from tornado.ioloop import IOLoop, PeriodicCallback
-from tornado.locks import Lock as AsyncLock
+from tornado.locks import Lock as AsyncLock, Semaphore
 
 from appscale.admin.constants import CONTROLLER_STATE_NODE, UNPACK_ROOT
 from appscale.admin.instance_manager.constants import (
@@ -16,9 +17,10 @@ from appscale.admin.instance_manager.constants import (
   BadConfigurationException, DASHBOARD_LOG_SIZE, DASHBOARD_PROJECT_ID,
   DEFAULT_MAX_APPSERVER_MEMORY, FETCH_PATH, GO_SDK, HEALTH_CHECK_TIMEOUT,
   INSTANCE_CLASSES, JAVA_APPSERVER_CLASS, MAX_API_SERVER_PORT,
-  MAX_INSTANCE_RESPONSE_TIME, SERVICE_INSTANCE_PREFIX, NoRedirection,
-  PIDFILE_TEMPLATE, PYTHON_APPSERVER, START_APP_TIMEOUT,
-  STARTING_INSTANCE_PORT, VERSION_REGISTRATION_NODE)
+  MAX_BACKOFF_TIME, MAX_CONCURRENT_HEALTH_CHECKS, MAX_CONCURRENT_STARTS,
+  MAX_INSTANCE_RESPONSE_TIME, SERVICE_INSTANCE_PREFIX, PIDFILE_TEMPLATE,
+  PYTHON_APPSERVER, START_APP_TIMEOUT, STARTING_INSTANCE_PORT,
+  VERSION_REGISTRATION_NODE)
 from appscale.admin.instance_manager.instance import (
   create_java_app_env, create_java_start_cmd, create_python_api_start_cmd,
   create_python_app_env, create_python27_start_cmd, get_login_server, Instance)
@@ -70,6 +72,12 @@ class InstanceManager(object):
     # Ensures only one process tries to make changes at a time.
     self._work_lock = AsyncLock()
 
+    # Limits the number of instances that are starting at the same time.
+    self._start_semaphore = Semaphore(MAX_CONCURRENT_STARTS)
+
+    # Limits the number of health checks that are made at the same time.
+    self._health_check_semaphore = Semaphore(MAX_CONCURRENT_HEALTH_CHECKS)
+
     self._health_checker = PeriodicCallback(
       self._ensure_health, self.HEALTH_CHECK_INTERVAL * 1000)
 
@@ -107,6 +115,20 @@ class InstanceManager(object):
     """ Starts a Google App Engine application on this machine. It
         will start it up and then proceed to fetch the main page.
 
+    Instances can be started concurrently, but no more than
+    MAX_CONCURRENT_STARTS at a time.
+
+    Args:
+      version: A Version object.
+      port: An integer specifying a port to use.
+    """
+    with (yield self._start_semaphore.acquire()):
+      yield self._launch_instance(version, port)
+
+  @gen.coroutine
+  def _launch_instance(self, version, port):
+    """ Starts an instance process and registers it once it's ready.
+
     Args:
       version: A Version object.
       port: An integer specifying a port to use.
@@ -333,24 +355,38 @@ class InstanceManager(object):
 
     raise gen.Return((server_port, api_services))
 
+  @gen.coroutine
   def _instance_healthy(self, port):
     """ Determines the health of an instance with an HTTP request.
 
     Args:
       port: An integer specifying the port the instance is listening on.
     Returns:
-      A boolean indicating whether or not the instance is healthy.
+      A boolean indicating whether or not the instance is healthy or None if
+      the request was not sent.
     """
     url = "http://" + self._private_ip + ":" + str(port) + FETCH_PATH
+    http_client = AsyncHTTPClient()
     try:
-      opener = urllib2.build_opener(NoRedirection)
-      response = opener.open(url, timeout=HEALTH_CHECK_TIMEOUT)
-      if response.code == httplib.SERVICE_UNAVAILABLE:
-        return False
-    except IOError:
-      return False
-
-    return True
+      with (yield self._health_check_semaphore.acquire()):
+        response = yield http_client.fetch(
+          url, follow_redirects=False, request_timeout=HEALTH_CHECK_TIMEOUT)
+    except HTTPError as error:
+      # The client reports requests that timed out while waiting for a free
+      # connection slot as 599 as well, but they don't say anything about
+      # the instance.
+      if error.code == 599 and 'request queue' in (error.message or ''):
+        logger.debug('Unable to check health of instance at port {}: '
+                     '{}'.format(port, error))
+        raise gen.Return(None)
+
+      # Only an unavailable instance or a failed connection (reported as 599)
+      # is unhealthy. Apps are not required to handle the health check path.
+      raise gen.Return(error.code not in (httplib.SERVICE_UNAVAILABLE, 599))
+    except (socket.error, IOError):
+      raise gen.Return(False)
+
+    raise gen.Return(response.code != httplib.SERVICE_UNAVAILABLE)
 
   @gen.coroutine
   def _wait_for_app(self, port):
@@ -363,13 +399,16 @@ class InstanceManager(object):
       True on success, False otherwise
     """
     deadline = monotonic.monotonic() + START_APP_TIMEOUT
+    backoff = BACKOFF_TIME
 
     while monotonic.monotonic() < deadline:
-      if self._instance_healthy(port):
+      healthy = yield self._instance_healthy(port)
+      if healthy:
         raise gen.Return(True)
 
       logger.debug('Instance at port {} is not ready yet'.format(port))
-      yield gen.sleep(BACKOFF_TIME)
+      yield gen.sleep(backoff)
+      backoff = min(backoff * 2, MAX_BACKOFF_TIME)
 
     raise gen.Return(False)
 
@@ -442,13 +481,17 @@ class InstanceManager(object):
 
     yield self._clean_old_sources()
 
-  def _get_lowest_port(self):
+  def _get_lowest_port(self, reserved_ports=()):
     """ Determines the lowest usuable port for a new instance.
 
+    Args:
+      reserved_ports: An iterable of ports that will be used by instances
+        that are about to start.
     Returns:
       An integer specifying a free port.
     """
     existing_ports = {instance.port for instance in self._running_instances}
+    existing_ports.update(reserved_ports)
     port = STARTING_INSTANCE_PORT
     while True:
       if port in existing_ports:
@@ -488,9 +531,12 @@ class InstanceManager(object):
   def _restart_unavailable_instances(self):
     """ Restarts instances that fail health check requests. """
     with (yield self._work_lock.acquire()):
-      for instance in self._running_instances:
+      instances = list(self._running_instances)
+      health = yield [self._instance_healthy(instance.port)
+                      for instance in instances]
+      for instance, healthy in zip(instances, health):
         # TODO: Add a threshold to avoid restarting on a transient error.
-        if not self._instance_healthy(instance.port):
+        if healthy is False:
           try:
             version = self._projects_manager.version_from_key(
               instance.version_key)
@@ -536,6 +582,10 @@ class InstanceManager(object):
       for instance in to_stop:
         yield self._stop_app_instance(instance)
 
+      # Instances are collected first so that they can be started
+      # concurrently.
+      to_start = []
+      new_instance_counts = []
       for version_key, assigned_ports in self._assignments.items():
         try:
           version = self._projects_manager.version_from_key(version_key)
@@ -563,15 +613,25 @@ class InstanceManager(object):
                          if instance.version_key == version_key]
         for port in assigned_ports:
           if port != -1 and port not in running_ports:
-            yield self._start_instance(version, port)
+            to_start.append((version, port))
 
         # Start new assignments that don't have a match.
         candidates = [instance for instance in self._running_instances
                       if instance.version_key == version_key
                       and instance.port not in assigned_ports]
-        to_start = max(new_assignment_count - len(candidates), 0)
-        for _ in range(to_start):
-          yield self._start_instance(version, self._get_lowest_port())
+        new_instance_counts.append(
+          (version, max(new_assignment_count - len(candidates), 0)))
+
+      # Choose ports for new instances after all assigned ports are known.
+      reserved_ports = {port for _, port in to_start}
+      for version, count in new_instance_counts:
+        for _ in range(count):
+          port = self._get_lowest_port(reserved_ports)
+          reserved_ports.add(port)
+          to_start.append((version, port))
+
+      # Each instance is registered as soon as it passes a health check.
+      yield [self._start_instance(version, port) for version, port in to_start]
 
   @gen.coroutine
   def _enforce_instance_details(self):
@@ -15,7 +15,13 @@ from appscale.common.appscale_utils import get_md5
 from appscale.common.appscale_info import get_secret
 from appscale.common.async_retrying import retry_children_watch_coroutine
 from appscale.common.constants import VERSION_PATH_SEPARATOR
-from .utils import fetch_file
+from .archive_fetcher import ChunkedArchiveFetch, ChunkUnavailable
+from .constants import (
+  EXTRACTED_SOURCES_CACHE,
+  EXTRACTED_SOURCES_CACHE_SIZE,
+  SOURCE_MD5_FILE
+)
+from .utils import fetch_file, link_tree
 from ..constants import (
   DASHBOARD_APP_ID,
   InvalidSource,
@@ -109,17 +115,15 @@ class SourceManager(object):
         self.fetched_revisions.add(revision_key)
 
   @gen.coroutine
-  def fetch_archive(self, revision_key, source_location):
-    """ Copies the source archive from a machine that has it.
+  def find_hosters(self, revision_key):
+    """ Determines which machines have a revision's source archive.
 
     Args:
       revision_key: A string specifying a revision key.
-      source_location: A string specifying the location of the version's
-        source archive.
+    Returns:
+      A tuple containing a list of hosts and the archive's MD5 hex digest.
     Raises:
-      AlreadyHoster if local machine is hosting archive.
-      InvalidSource if digest of fetched archive does not match record.
-      SourceUnavailable if unable to obtain source archive.
+      SourceUnavailable if no machine has the archive.
     """
     hosts_with_archive = yield self.thread_pool.submit(
       self.zk_client.get_children, '/apps/{}'.format(revision_key))
@@ -130,7 +134,27 @@ class SourceManager(object):
     host_node = '/apps/{}/{}'.format(revision_key, host)
     desired_md5, _ = yield self.thread_pool.submit(
       self.zk_client.get, host_node)
+    raise gen.Return((hosts_with_archive, desired_md5))
 
+  @gen.coroutine
+  def fetch_archive(self, revision_key, source_location, hosts_with_archive,
+                    desired_md5):
+    """ Copies the source archive from machines that have it.
+
+    The archive is downloaded in chunks from all of the other hosters at once.
+    If that fails, it's copied from a single hoster with scp.
+
+    Args:
+      revision_key: A string specifying a revision key.
+      source_location: A string specifying the location of the version's
+        source archive.
+      hosts_with_archive: A list of strings specifying hosters.
+      desired_md5: A string specifying the archive's MD5 hex digest.
+    Raises:
+      AlreadyHoster if local machine is hosting archive.
+      InvalidSource if digest of fetched archive does not match record.
+      SourceUnavailable if unable to obtain source archive.
+    """
     @gen.coroutine
     def valid_local_archive():
       if not os.path.isfile(source_location):
@@ -139,14 +163,28 @@ class SourceManager(object):
       md5 = yield self.thread_pool.submit(get_md5, source_location)
       raise gen.Return(md5 == desired_md5)
 
-    valid_local = yield valid_local_archive()
-    if options.private_ip in hosts_with_archive and valid_local:
-      raise AlreadyHoster('{} already exists'.format(source_location))
+    if options.private_ip in hosts_with_archive:
+      valid_local = yield valid_local_archive()
+      if valid_local:
+        raise AlreadyHoster('{} already exists'.format(source_location))
+
+    remote_hosts = [host for host in hosts_with_archive
+                    if host != options.private_ip]
+    if not remote_hosts:
+      raise SourceUnavailable('{} has no other hosters'.format(revision_key))
 
-    yield self.thread_pool.submit(fetch_file, host, source_location)
-    valid_local = yield valid_local_archive()
-    if not valid_local:
-      raise InvalidSource('Source MD5 does not match')
+    random.shuffle(remote_hosts)
+    try:
+      yield ChunkedArchiveFetch(remote_hosts, source_location,
+                                desired_md5).run()
+    except (ChunkUnavailable, InvalidSource) as error:
+      logger.warning('Unable to fetch {} in chunks: {}'.format(
+        source_location, error))
+      yield self.thread_pool.submit(fetch_file, remote_hosts[0],
+                                    source_location)
+      valid_local = yield valid_local_archive()
+      if not valid_local:
+        raise InvalidSource('Source MD5 does not match')
 
     yield self.register_as_hoster(revision_key, desired_md5)
 
@@ -175,16 +213,28 @@ class SourceManager(object):
         archive.
       runtime: A string specifying the revision's runtime.
     """
-    source_extracted = False
-    try:
-      yield self.fetch_archive(revision_key, location)
-    except AlreadyHoster as already_hoster_err:
-      logger.info(already_hoster_err)
-      source_extracted = os.path.isdir(os.path.join(UNPACK_ROOT, revision_key))
-
-    if not source_extracted:
-      yield self.thread_pool.submit(extract_source, revision_key, location,
-                                    runtime)
+    hosts_with_archive, desired_md5 = yield self.find_hosters(revision_key)
+    revision_base = os.path.join(UNPACK_ROOT, revision_key)
+    if read_source_md5(revision_base) == desired_md5:
+      logger.info('Source for {} is already prepared'.format(revision_key))
+    else:
+      from_cache = yield self.thread_pool.submit(
+        restore_cached_source, revision_base, desired_md5, runtime)
+      if from_cache:
+        logger.info('Using cached source for {}'.format(revision_key))
+      else:
+        try:
+          yield self.fetch_archive(revision_key, location, hosts_with_archive,
+                                   desired_md5)
+        except AlreadyHoster as already_hoster_err:
+          logger.info(already_hoster_err)
+
+        yield self.thread_pool.submit(extract_source, revision_key, location,
+                                      runtime)
+        yield self.thread_pool.submit(
+          cache_source, revision_base, desired_md5, runtime)
+
+      write_source_md5(revision_base, desired_md5)
 
     project_id = revision_key.split(VERSION_PATH_SEPARATOR)[0]
     if project_id == DASHBOARD_APP_ID:
@@ -247,6 +297,8 @@ class SourceManager(object):
     for revision_key in futures_to_clear:
       del self.source_futures[revision_key]
 
+    clean_source_cache()
+
   @staticmethod
   def update_secret(revision_key):
     """ Ensures the revision's secret matches the deployment secret. """
@@ -258,5 +310,110 @@ class SourceManager(object):
       if revision_secret == deployment_secret:
         return
 
-    with open(secret_module, 'w') as secret_file:
+    # Replace the file rather than writing to it since it may be linked to
+    # the extracted sources cache.
+    new_secret_module = '{}.new'.format(secret_module)
+    with open(new_secret_module, 'w') as secret_file:
       secret_file.write("GLOBAL_SECRET_KEY = '{}'".format(deployment_secret))
+
+    os.rename(new_secret_module, secret_module)
+
+
+def read_source_md5(revision_base):
+  """ Retrieves the digest of the archive that a revision was extracted from.
+
+  Args:
+    revision_base: A string specifying the revision's directory.
+  Returns:
+    A string specifying the MD5 hex digest or None.
+  """
+  try:
+    with open(os.path.join(revision_base, SOURCE_MD5_FILE)) as md5_file:
+      return md5_file.read().strip()
+  except IOError:
+    return None
+
+
+def write_source_md5(revision_base, md5):
+  """ Records the digest of the archive that a revision was extracted from.
+
+  Args:
+    revision_base: A string specifying the revision's directory.
+    md5: A string specifying the MD5 hex digest.
+  """
+  md5_location = os.path.join(revision_base, SOURCE_MD5_FILE)
+  new_md5_location = '{}.new'.format(md5_location)
+  with open(new_md5_location, 'w') as md5_file:
+    md5_file.write(md5)
+
+  os.rename(new_md5_location, md5_location)
+
+
+def cached_source_location(md5, runtime):
+  """ Determines where an extracted source tree is cached.
+
+  Args:
+    md5: A string specifying the archive's MD5 hex digest.
+    runtime: A string specifying the revision's runtime.
+  Returns:
+    A string specifying the cached source location.
+  """
+  return os.path.join(EXTRACTED_SOURCES_CACHE, '{}-{}'.format(md5, runtime))
+
+
+def restore_cached_source(revision_base, md5, runtime):
+  """ Populates a revision's directory from the extracted sources cache.
+
+  Args:
+    revision_base: A string specifying the revision's directory.
+    md5: A string specifying the archive's MD5 hex digest.
+    runtime: A string specifying the revision's runtime.
+  Returns:
+    A boolean indicating whether or not the source was cached.
+  """
+  cached_location = cached_source_location(md5, runtime)
+  if not os.path.isdir(cached_location):
+    return False
+
+  shutil.rmtree(revision_base, ignore_errors=True)
+  link_tree(cached_location, revision_base)
+
+  # Keep track of recently used entries.
+  os.utime(cached_location, None)
+  return True
+
+
+def cache_source(revision_base, md5, runtime):
+  """ Adds an extracted revision to the extracted sources cache.
+
+  Args:
+    revision_base: A string specifying the revision's directory.
+    md5: A string specifying the archive's MD5 hex digest.
+    runtime: A string specifying the revision's runtime.
+  """
+  cached_location = cached_source_location(md5, runtime)
+  if os.path.isdir(cached_location):
+    return
+
+  # Populate the entry under a temporary name so that partial trees are
+  # never used.
+  partial_location = '{}.partial'.format(cached_location)
+  shutil.rmtree(partial_location, ignore_errors=True)
+  link_tree(revision_base, partial_location)
+  os.rename(partial_location, cached_location)
+
+
+def clean_source_cache():
+  """ Removes the least recently used entries from the sources cache. """
+  try:
+    entries = [os.path.join(EXTRACTED_SOURCES_CACHE, entry)
+               for entry in os.listdir(EXTRACTED_SOURCES_CACHE)]
+  except OSError as error:
+    if error.errno != errno.ENOENT:
+      raise
+
+    return
+
+  entries.sort(key=os.path.getmtime, reverse=True)
+  for entry in entries[EXTRACTED_SOURCES_CACHE_SIZE:]:
+    shutil.rmtree(entry, ignore_errors=True)
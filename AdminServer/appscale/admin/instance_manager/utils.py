@@ -1,5 +1,6 @@
 """ Common functions for managing AppServer instances. """
 
+import errno
 import fnmatch
 import glob
 import logging
@@ -30,6 +31,34 @@ def fetch_file(host, location):
   subprocess.check_call(scp_cmd)
 
 
+def link_tree(source, destination):
+  """ Recreates a directory tree with hard links to the original files.
+
+  Args:
+    source: A string specifying the directory to link from.
+    destination: A string specifying the directory to create.
+  """
+  for root, dirs, files in os.walk(source):
+    target_root = os.path.normpath(
+      os.path.join(destination, os.path.relpath(root, source)))
+    if not os.path.isdir(target_root):
+      os.makedirs(target_root)
+
+    for name in dirs + files:
+      path = os.path.join(root, name)
+      target = os.path.join(target_root, name)
+      if os.path.islink(path):
+        os.symlink(os.readlink(path), target)
+      elif os.path.isfile(path):
+        try:
+          os.link(path, target)
+        except OSError as error:
+          if error.errno != errno.EXDEV:
+            raise
+
+          shutil.copy2(path, target)
+
+
 def find_web_inf(source_path):
   """ Returns the location of a Java revision's WEB-INF directory.
 
@@ -4,8 +4,11 @@ import logging
 import monotonic
 import os
 import pkgutil
+import socket
+from datetime import timedelta
 
-from tornado import gen
+from tornado import gen, locks
+from tornado.iostream import IOStream, StreamClosedError
 
 from appscale.common import service_helper
 from appscale.common.appscale_info import get_private_ip
@@ -39,11 +42,17 @@ class InvalidConfig(Exception):
   pass
 
 
+class RuntimeAPIError(Exception):
+  """ Indicates that a command could not be applied through the stats
+  socket. """
+  pass
+
+
 class HAProxyListenBlock(object):
   """ Represents an HAProxy configuration block. """
 
   # The template for a server config line.
-  SERVER_TEMPLATE = ('server {block_id}-{location} {location} '
+  SERVER_TEMPLATE = ('server {name} {location} '
                      'maxconn {max_connections} check')
 
   # The template for a listen block.
@@ -66,6 +75,16 @@ class HAProxyListenBlock(object):
 
     self._private_ip = get_private_ip()
 
+  def server_name(self, location):
+    """ Generates the name that HAProxy uses for a server.
+
+    Args:
+      location: A string specifying the server location.
+    Returns:
+      A string specifying the server name.
+    """
+    return '{}-{}'.format(self.block_id, location)
+
   def __repr__(self):
     """ Returns a print-friendly representation of the version config. """
     return 'HAProxyListenBlock({!r}, {!r}, {!r}, {!r})'.format(
@@ -82,7 +101,8 @@ class HAProxyListenBlock(object):
       return None
 
     server_lines = [
-      self.SERVER_TEMPLATE.format(block_id=self.block_id, location=server,
+      self.SERVER_TEMPLATE.format(name=self.server_name(server),
+                                  location=server,
                                   max_connections=self.max_connections)
       for server in self.servers]
     server_lines.sort()
@@ -111,6 +131,15 @@ class HAProxy(object):
   # The minimum number of seconds to wait between each reload operation.
   RELOAD_COOLDOWN = .1
 
+  # The seconds without new changes to wait for before applying a reload.
+  RELOAD_QUIET_PERIOD = .5
+
+  # The max seconds a requested reload can be postponed by ongoing changes.
+  MAX_RELOAD_DELAY = 3
+
+  # The seconds to wait for a response from the stats socket.
+  RUNTIME_API_TIMEOUT = 5
+
   def __init__(self, instance, config_location, stats_socket):
     """ Creates a new HAProxy operator. """
     self.connect_timeout_ms = self.DEFAULT_CONNECT_TIMEOUT * 1000
@@ -119,13 +148,32 @@ class HAProxy(object):
     self.blocks = {}
     self.reload_future = None
 
+    # Ensures that only one reload applies changes at a time.
+    self._reload_lock = locks.Lock()
+
+    # The number of reload requests which were applied by a single reload.
+    self.coalesced_requests = 0
+
     self._instance = instance
     self._config_location = config_location
     self._stats_socket = stats_socket
 
     # Given the arbitrary base of the monotonic clock, it doesn't make sense
-    # for outside functions to access this attribute.
+    # for outside functions to access these attributes.
     self._last_reload = monotonic.monotonic()
+    self._first_request = None
+    self._last_request = None
+
+    # The content of the config file as of the last reload. It's None until
+    # the file is read for the first time.
+    self._applied_content = None
+
+    # The layout and servers that the running process was started with. Each
+    # server keeps its slot until the next reload, so servers that come back
+    # can be enabled without a reload.
+    self._running_layout = None
+    self._running_servers = {}
+    self._disabled_servers = {}
 
   @property
   def config(self):
@@ -157,12 +205,154 @@ class HAProxy(object):
 
   @gen.coroutine
   def reload(self):
-    """ Groups closely-timed reload operations. """
+    """ Groups closely-timed reload operations.
+
+    The configuration is rendered once changes stop arriving for
+    RELOAD_QUIET_PERIOD seconds or MAX_RELOAD_DELAY seconds after the first
+    pending request, whichever comes first. All callers that requested a
+    reload in the meantime wait for the same operation.
+    """
+    self._last_request = monotonic.monotonic()
     if self.reload_future is None or self.reload_future.done():
+      self._first_request = self._last_request
+      self.coalesced_requests = 0
       self.reload_future = self._reload()
 
+    self.coalesced_requests += 1
     yield self.reload_future
 
+  @property
+  def _layout(self):
+    """ Represents everything except for the server membership of blocks.
+
+    Returns:
+      A tuple that only changes when a reload is required.
+    """
+    blocks = tuple(sorted(
+      (block_id, block.port, block.max_connections)
+      for block_id, block in self.blocks.items() if block.servers))
+    return (self.connect_timeout_ms, self.client_timeout_ms,
+            self.server_timeout_ms, blocks)
+
+  @property
+  def _membership(self):
+    """ Takes a snapshot of the server membership of blocks.
+
+    Returns:
+      A dictionary mapping block IDs to sets of server locations.
+    """
+    return {block_id: set(block.servers)
+            for block_id, block in self.blocks.items() if block.servers}
+
+  def _record_running_state(self, layout, membership):
+    """ Keeps track of the servers that the running process knows about.
+
+    Args:
+      layout: A tuple representing the layout the process was started with.
+      membership: A dictionary mapping block IDs to sets of server locations.
+    """
+    self._running_layout = layout
+    self._running_servers = membership
+    self._disabled_servers = {}
+
+  def _membership_commands(self, layout, membership):
+    """ Generates runtime API commands that bring the running process in line
+    with the given server membership.
+
+    Args:
+      layout: A tuple representing the layout to apply.
+      membership: A dictionary mapping block IDs to sets of server locations.
+    Returns:
+      A tuple containing a list of command strings and a dictionary of
+      servers that are disabled after the commands are run. None is returned
+      if a reload is required.
+    """
+    if self._running_layout is None or layout != self._running_layout:
+      return None
+
+    commands = []
+    new_disabled = {}
+    for block_id, running_servers in self._running_servers.items():
+      block = self.blocks[block_id]
+      servers = membership[block_id]
+      if not servers.issubset(running_servers):
+        return None
+
+      disabled = self._disabled_servers.get(block_id, set())
+      for location in sorted(servers & disabled):
+        commands.append('enable server {}/{}'.format(
+          block_id, block.server_name(location)))
+
+      for location in sorted(running_servers - servers - disabled):
+        commands.append('disable server {}/{}'.format(
+          block_id, block.server_name(location)))
+
+      new_disabled[block_id] = running_servers - servers
+
+    return commands, new_disabled
+
+  @gen.coroutine
+  def _run_commands(self, commands):
+    """ Sends commands to the HAProxy runtime API.
+
+    Args:
+      commands: A list of command strings.
+    Raises:
+      RuntimeAPIError if HAProxy rejects a command or can't be reached.
+    """
+    stream = IOStream(socket.socket(socket.AF_UNIX, socket.SOCK_STREAM))
+
+    @gen.coroutine
+    def exchange():
+      yield stream.connect(self._stats_socket)
+      yield stream.write(('; '.join(commands) + '\n').encode('utf-8'))
+      response = yield stream.read_until_close()
+      raise gen.Return(response)
+
+    try:
+      response = yield gen.with_timeout(
+        timedelta(seconds=self.RUNTIME_API_TIMEOUT), exchange())
+    except gen.TimeoutError:
+      raise RuntimeAPIError('No response from {}'.format(self._stats_socket))
+    except (StreamClosedError, socket.error) as error:
+      raise RuntimeAPIError(str(getattr(error, 'real_error', None) or error))
+    finally:
+      stream.close()
+
+    # Successful enable and disable commands don't produce any output.
+    response = response.decode('utf-8').strip()
+    if response:
+      raise RuntimeAPIError(response)
+
+  @gen.coroutine
+  def _update_servers(self, layout, membership):
+    """ Applies server membership changes without reloading HAProxy.
+
+    Args:
+      layout: A tuple representing the layout to apply.
+      membership: A dictionary mapping block IDs to sets of server locations.
+    Returns:
+      A boolean indicating whether or not the changes were applied.
+    """
+    # The blocks can change while the commands are in flight, so the new
+    # state is derived from the same snapshot as the commands.
+    update = self._membership_commands(layout, membership)
+    if update is None:
+      raise gen.Return(False)
+
+    commands, new_disabled = update
+
+    if commands:
+      try:
+        yield self._run_commands(commands)
+      except RuntimeAPIError as error:
+        logger.warning('Unable to update {} HAProxy servers at runtime: '
+                       '{}'.format(self._instance, error))
+        raise gen.Return(False)
+
+    self._disabled_servers = new_disabled
+    raise gen.Return(True)
+
   @property
   def _service(self):
     return 'appscale-haproxy@{}.service'.format(self._instance)
@@ -176,14 +366,43 @@ class HAProxy(object):
       if error.errno != errno.ENOENT:
         raise
 
+  def _reload_deadline(self):
+    """ Calculates when pending changes should be applied.
+
+    Returns:
+      A float specifying a monotonic clock value.
+    """
+    deadline = min(self._last_request + self.RELOAD_QUIET_PERIOD,
+                   self._first_request + self.MAX_RELOAD_DELAY)
+    return max(deadline, self._last_reload + self.RELOAD_COOLDOWN)
+
   @gen.coroutine
   def _reload(self):
     """ Updates the routing entries if they've changed. """
-    time_since_reload = monotonic.monotonic() - self._last_reload
-    wait_time = max(self.RELOAD_COOLDOWN - time_since_reload, 0)
-    yield gen.sleep(wait_time)
+    # Keep waiting while new changes are arriving.
+    while True:
+      wait_time = self._reload_deadline() - monotonic.monotonic()
+      if wait_time <= 0:
+        break
+
+      yield gen.sleep(wait_time)
+
+    # Requests made from this point on can't be covered by this reload since
+    # the blocks are rendered below.
+    self.reload_future = None
     self._last_reload = monotonic.monotonic()
+    if self.coalesced_requests > 1:
+      logger.debug('Applying {} {} HAProxy changes at once'.format(
+        self.coalesced_requests, self._instance))
 
+    # A slow runtime API call can outlast the quiet period, so a later reload
+    # waits for the current one to finish before rendering the blocks.
+    with (yield self._reload_lock.acquire()):
+      yield self._apply()
+
+  @gen.coroutine
+  def _apply(self):
+    """ Brings the HAProxy process in line with the current blocks. """
     try:
       new_content = self.config
     except InvalidConfig as error:
@@ -192,24 +411,44 @@ class HAProxy(object):
 
     # Ensure process is not running if there is nothing to route.
     if new_content is None:
-      self._stop()
+      if self._applied_content != '':
+        self._stop()
+        self._applied_content = ''
+
+      self._running_layout = None
       return
 
-    try:
-      with open(self._config_location, 'r') as config_file:
-        existing_content = config_file.read()
-    except IOError as error:
-      if error.errno != errno.ENOENT:
-        raise
+    if self._applied_content is None:
+      try:
+        with open(self._config_location, 'r') as config_file:
+          self._applied_content = config_file.read()
+      except IOError as error:
+        if error.errno != errno.ENOENT:
+          raise
+
+        self._applied_content = ''
 
-      existing_content = ''
+    layout = self._layout
+    membership = self._membership
+    if new_content == self._applied_content:
+      if self._running_layout is None:
+        self._record_running_state(layout, membership)
 
-    if new_content == existing_content:
       return
 
+    # The file is kept up to date even when the process is not reloaded so
+    # that a restart picks up the current servers.
+    hitless = yield self._update_servers(layout, membership)
     with open(self._config_location, 'w') as config_file:
       config_file.write(new_content)
 
+    self._applied_content = new_content
+    if hitless:
+      logger.info('Updated {} HAProxy servers without a reload'.format(
+        self._instance))
+      return
+
     service_helper.reload(self._service)
+    self._record_running_state(layout, membership)
 
     logger.info('Updated {} HAProxy config'.format(self._instance))
@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+
+from mock import MagicMock, patch
+from tornado import gen
+from tornado.netutil import bind_unix_socket
+from tornado.tcpserver import TCPServer
+from tornado.testing import AsyncTestCase, gen_test
+
+from appscale.admin.routing import haproxy
+from appscale.admin.routing.haproxy import (
+  HAProxy, HAProxyListenBlock, RuntimeAPIError)
+
+
+class TestHAProxyReload(AsyncTestCase):
+  def setUp(self):
+    super(TestHAProxyReload, self).setUp()
+    patchers = [
+      patch.object(haproxy, 'get_private_ip', return_value='10.0.0.1'),
+      patch.object(HAProxy, 'BASE_TEMPLATE', '{listen_blocks}'),
+      patch.object(HAProxyListenBlock, 'BLOCK_TEMPLATE',
+                   'listen {block_id}\n  bind {bind_location}\n  {servers}'),
+      patch.object(HAProxy, 'RELOAD_QUIET_PERIOD', .05),
+      patch.object(HAProxy, 'MAX_RELOAD_DELAY', .2),
+      patch.object(HAProxy, 'RELOAD_COOLDOWN', 0)
+    ]
+    for patcher in patchers:
+      patcher.start()
+      self.addCleanup(patcher.stop)
+
+    helper_patcher = patch.object(haproxy, 'service_helper')
+    self.service_helper = helper_patcher.start()
+    self.addCleanup(helper_patcher.stop)
+
+    config_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, config_dir)
+    self.haproxy = HAProxy('app', config_dir + '/app.cfg', 'stats')
+
+    @gen.coroutine
+    def run_commands(commands):
+      pass
+
+    self.haproxy._run_commands = MagicMock(side_effect=run_commands)
+
+  def _set_servers(self, block_id, port, servers):
+    self.haproxy.blocks[block_id] = HAProxyListenBlock(
+      block_id, port, 10, servers)
+    return self.haproxy.reload()
+
+  @gen_test
+  def test_concurrent_changes_are_coalesced(self):
+    yield [self._set_servers('version-{}'.format(index), 20000 + index,
+                             ['10.0.0.2:{}'.format(index)])
+           for index in range(50)]
+
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+    with open(self.haproxy._config_location) as config_file:
+      content = config_file.read()
+
+    self.assertIn('version-49-10.0.0.2:49', content)
+
+  @gen_test
+  def test_identical_config_is_not_reloaded(self):
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+
+    yield self._set_servers('version', 20000, ['10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 2)
+
+  @gen_test
+  def test_continuous_changes_are_applied_after_max_delay(self):
+    reload_future = self._set_servers('version', 20000, ['10.0.0.2:1'])
+    for index in range(2, 20):
+      yield gen.sleep(.02)
+      if reload_future.done():
+        break
+
+      self._set_servers('version', 20000, ['10.0.0.2:{}'.format(index)])
+
+    self.assertTrue(reload_future.done())
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+
+  @gen_test
+  def test_removed_servers_are_disabled_at_runtime(self):
+    yield self._set_servers('version', 20000, ['10.0.0.2:1', '10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+    self.haproxy._run_commands.assert_called_once_with(
+      ['disable server version/version-10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+    with open(self.haproxy._config_location) as config_file:
+      self.assertNotIn('10.0.0.2:2', config_file.read())
+
+    # A server that comes back reuses its slot.
+    self.haproxy._run_commands.reset_mock()
+    yield self._set_servers('version', 20000, ['10.0.0.2:1', '10.0.0.2:2'])
+    self.haproxy._run_commands.assert_called_once_with(
+      ['enable server version/version-10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+
+  @gen_test
+  def test_changes_during_runtime_api_call(self):
+    yield self._set_servers('version', 20000, ['10.0.0.2:1', '10.0.0.2:2'])
+    pending_reloads = []
+
+    @gen.coroutine
+    def slow_run_commands(commands):
+      if not pending_reloads:
+        # The removed server comes back while the command is in flight.
+        pending_reloads.append(self._set_servers(
+          'version', 20000, ['10.0.0.2:1', '10.0.0.2:2']))
+
+      yield gen.sleep(HAProxy.RELOAD_QUIET_PERIOD * 2)
+
+    self.haproxy._run_commands.side_effect = slow_run_commands
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+    yield pending_reloads
+
+    self.assertEqual(
+      [call[0][0] for call in self.haproxy._run_commands.call_args_list],
+      [['disable server version/version-10.0.0.2:2'],
+       ['enable server version/version-10.0.0.2:2']])
+    self.assertEqual(self.haproxy._disabled_servers, {'version': set()})
+    self.assertEqual(self.service_helper.reload.call_count, 1)
+    with open(self.haproxy._config_location) as config_file:
+      self.assertIn('10.0.0.2:2', config_file.read())
+
+  @gen_test
+  def test_structural_changes_are_reloaded(self):
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+
+    # New server locations don't have a slot.
+    yield self._set_servers('version', 20000, ['10.0.0.2:1', '10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 2)
+
+    # Port changes affect the listen block.
+    yield self._set_servers('version', 20001, ['10.0.0.2:1', '10.0.0.2:2'])
+    self.assertEqual(self.service_helper.reload.call_count, 3)
+    self.haproxy._run_commands.assert_not_called()
+
+  @gen_test
+  def test_runtime_api_failure_falls_back_to_reload(self):
+    yield self._set_servers('version', 20000, ['10.0.0.2:1', '10.0.0.2:2'])
+    self.haproxy._run_commands.side_effect = RuntimeAPIError('No such server.')
+    yield self._set_servers('version', 20000, ['10.0.0.2:1'])
+    self.assertEqual(self.service_helper.reload.call_count, 2)
+
+
+class TestRuntimeAPI(AsyncTestCase):
+  def setUp(self):
+    super(TestRuntimeAPI, self).setUp()
+    socket_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, socket_dir)
+    self.socket_path = os.path.join(socket_dir, 'stats')
+    self.received = []
+    self.reply = b''
+
+    test_case = self
+
+    class FakeStatsSocket(TCPServer):
+      @gen.coroutine
+      def handle_stream(self, stream, address):
+        test_case.received.append((yield stream.read_until(b'\n')))
+        yield stream.write(test_case.reply)
+        stream.close()
+
+    self.server = FakeStatsSocket()
+    self.server.add_socket(bind_unix_socket(self.socket_path))
+
+    with patch.object(haproxy, 'get_private_ip', return_value='10.0.0.1'):
+      self.haproxy = HAProxy('app', os.path.join(socket_dir, 'app.cfg'),
+                             self.socket_path)
+
+  def tearDown(self):
+    self.server.stop()
+    super(TestRuntimeAPI, self).tearDown()
+
+  @gen_test
+  def test_commands_are_sent(self):
+    yield self.haproxy._run_commands(['disable server a/b', 'enable server a/c'])
+    self.assertEqual(self.received,
+                     [b'disable server a/b; enable server a/c\n'])
+
+  @gen_test
+  def test_rejected_command(self):
+    self.reply = b'No such server.\n\n'
+    with self.assertRaises(RuntimeAPIError):
+      yield self.haproxy._run_commands(['disable server a/b'])
+
+  @gen_test
+  def test_unreachable_socket(self):
+    self.haproxy._stats_socket = self.socket_path + '-missing'
+    with self.assertRaises(RuntimeAPIError):
+      yield self.haproxy._run_commands(['disable server a/b'])
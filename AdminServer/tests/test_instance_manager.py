@@ -5,17 +5,18 @@ import os
 import subprocess
 import time
 import unittest
-import urllib2
 
 from flexmock import flexmock
 from tornado import gen
 from tornado.gen import Future
 from tornado.httpclient import HTTPError
+from tornado.locks import Event
 from tornado.options import options
 from tornado.testing import AsyncTestCase
 from tornado.testing import gen_test
 
-from appscale.admin.instance_manager.constants import START_APP_TIMEOUT
+from appscale.admin.instance_manager.constants import (
+  MAX_CONCURRENT_HEALTH_CHECKS, START_APP_TIMEOUT)
 from appscale.admin.instance_manager import (
   instance_manager as instance_manager_module)
 from appscale.admin.instance_manager import InstanceManager
@@ -281,10 +282,11 @@ class TestInstanceManager(AsyncTestCase):
     port = 20000
     ip = '127.0.0.1'
     testing.disable_logging()
-    fake_opener = flexmock(
-      open=lambda url, timeout: flexmock(code=200,
-                                         headers=flexmock(headers=[])))
-    flexmock(urllib2).should_receive('build_opener').and_return(fake_opener)
+    response = Future()
+    response.set_result(flexmock(code=200))
+    fake_client = flexmock(fetch=lambda url, **kwargs: response)
+    flexmock(instance_manager_module).should_receive('AsyncHTTPClient').\
+      and_return(fake_client)
     flexmock(appscale_info).should_receive('get_private_ip').and_return(ip)
 
     instance_manager = InstanceManager(
@@ -299,9 +301,92 @@ class TestInstanceManager(AsyncTestCase):
     response = Future()
     response.set_result(None)
     flexmock(gen).should_receive('sleep').and_return(response)
-    fake_opener.should_receive('open').and_raise(IOError)
+    failed_response = Future()
+    failed_response.set_exception(IOError())
+    fake_client.should_receive('fetch').and_return(failed_response)
     instance_started = yield instance_manager._wait_for_app(port)
     self.assertEqual(False, instance_started)
 
+  @gen_test
+  def test_instance_healthy(self):
+    instance_manager = InstanceManager(
+      None, None, None, None, None, None, None, None, None)
+    instance_manager._private_ip = '127.0.0.1'
+    fake_client = flexmock()
+    flexmock(instance_manager_module).should_receive('AsyncHTTPClient').\
+      and_return(fake_client)
+
+    for error, expected_health in [(HTTPError(302), True),
+                                   (HTTPError(404), True),
+                                   (HTTPError(500), True),
+                                   (HTTPError(503), False),
+                                   (HTTPError(599), False),
+                                   (HTTPError(599, 'Timeout in request queue'),
+                                    None)]:
+      response = Future()
+      response.set_exception(error)
+      fake_client.should_receive('fetch').and_return(response)
+      healthy = yield instance_manager._instance_healthy(20000)
+      self.assertEqual(healthy, expected_health)
+
+  @gen_test
+  def test_health_checks_are_limited(self):
+    instance_manager = InstanceManager(
+      None, None, None, None, None, None, None, None, None)
+    instance_manager._private_ip = '127.0.0.1'
+    in_flight = []
+    max_in_flight = []
+
+    @gen.coroutine
+    def fetch(url, **kwargs):
+      in_flight.append(url)
+      max_in_flight.append(len(in_flight))
+      yield gen.moment
+      in_flight.remove(url)
+      raise gen.Return(flexmock(code=200))
+
+    flexmock(instance_manager_module).should_receive('AsyncHTTPClient').\
+      and_return(flexmock(fetch=fetch))
+    health = yield [instance_manager._instance_healthy(20000 + index)
+                    for index in range(MAX_CONCURRENT_HEALTH_CHECKS * 3)]
+    self.assertTrue(all(health))
+    self.assertEqual(max(max_in_flight), MAX_CONCURRENT_HEALTH_CHECKS)
+
+  @gen_test
+  def test_fulfill_assignments_concurrently(self):
+    instance_manager = InstanceManager(
+      None, None, None, None, None, None, None, None, None)
+    instance_manager._login_server = '127.0.0.1'
+    instance_manager._assignments = {'test_default_v1': [-1] * 6}
+    version = flexmock(version_key='test_default_v1')
+    instance_manager._projects_manager = flexmock(
+      version_from_key=lambda version_key: version)
+
+    starting = []
+    max_starting = [0]
+    ready = Event()
+
+    @gen.coroutine
+    def fake_launch(version, port):
+      starting.append(port)
+      max_starting[0] = max(max_starting[0], len(starting))
+      if len(starting) == instance_manager_module.MAX_CONCURRENT_STARTS:
+        ready.set()
+
+      yield ready.wait()
+      starting.remove(port)
+      instance_manager._running_instances.add(
+        instance.Instance('test_default_v1_revid', port))
+
+    instance_manager._launch_instance = fake_launch
+    yield instance_manager._fulfill_assignments()
+
+    self.assertEqual(max_starting[0],
+                     instance_manager_module.MAX_CONCURRENT_STARTS)
+    self.assertEqual(
+      sorted(instance_.port
+             for instance_ in instance_manager._running_instances),
+      list(range(20000, 20006)))
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+from tornado import web
+from tornado.options import options
+from tornado.testing import AsyncHTTPTestCase, gen_test
+
+from appscale.admin.constants import InvalidSource
+from appscale.admin.instance_manager import archive_fetcher, source_manager
+from appscale.admin.instance_manager.archive_fetcher import (
+  ChunkedArchiveFetch, ChunkUnavailable)
+
+if not hasattr(options, 'secret'):
+  options.define('secret', 'secret')
+
+
+class TestChunkedArchiveFetch(AsyncHTTPTestCase):
+  def setUp(self):
+    self.source_dir = tempfile.mkdtemp()
+    self.target_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.source_dir)
+    self.addCleanup(shutil.rmtree, self.target_dir)
+    self.archive = os.urandom(1000)
+    with open(os.path.join(self.source_dir, 'rev.tar.gz'), 'wb') as archive:
+      archive.write(self.archive)
+
+    super(TestChunkedArchiveFetch, self).setUp()
+    port_patcher = patch.object(archive_fetcher, 'DEFAULT_PORT',
+                                self.get_http_port())
+    port_patcher.start()
+    self.addCleanup(port_patcher.stop)
+
+  def get_app(self):
+    return web.Application([
+      ('/sources/(.*)', web.StaticFileHandler, {'path': self.source_dir})])
+
+  @gen_test
+  def test_fetch_in_chunks(self):
+    location = os.path.join(self.target_dir, 'rev.tar.gz')
+    md5 = hashlib.md5(self.archive).hexdigest()
+    fetch = ChunkedArchiveFetch(['127.0.0.1', 'localhost'], location, md5,
+                                chunk_size=64, concurrency=3)
+    yield fetch.run()
+    with open(location, 'rb') as archive:
+      self.assertEqual(archive.read(), self.archive)
+
+  @gen_test
+  def test_fetch_single_chunk(self):
+    location = os.path.join(self.target_dir, 'rev.tar.gz')
+    md5 = hashlib.md5(self.archive).hexdigest()
+    yield ChunkedArchiveFetch(['127.0.0.1'], location, md5,
+                              chunk_size=4096).run()
+    with open(location, 'rb') as archive:
+      self.assertEqual(archive.read(), self.archive)
+
+  @gen_test
+  def test_invalid_digest(self):
+    location = os.path.join(self.target_dir, 'rev.tar.gz')
+    fetch = ChunkedArchiveFetch(['127.0.0.1'], location, 'invalid',
+                                chunk_size=64)
+    with self.assertRaises(InvalidSource):
+      yield fetch.run()
+
+    self.assertEqual(os.listdir(self.target_dir), [])
+
+  @gen_test
+  def test_missing_archive(self):
+    location = os.path.join(self.target_dir, 'other.tar.gz')
+    with self.assertRaises(ChunkUnavailable):
+      yield ChunkedArchiveFetch(['127.0.0.1'], location, 'md5').run()
+
+
+class TestExtractedSourcesCache(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.root)
+    cache_patcher = patch.object(source_manager, 'EXTRACTED_SOURCES_CACHE',
+                                 os.path.join(self.root, 'cache'))
+    cache_patcher.start()
+    self.addCleanup(cache_patcher.stop)
+
+  def test_cache_round_trip(self):
+    revision_base = os.path.join(self.root, 'rev1')
+    os.makedirs(os.path.join(revision_base, 'app', 'lib'))
+    with open(os.path.join(revision_base, 'app', 'app.yaml'), 'w') as config:
+      config.write('runtime: python27')
+
+    os.symlink('app.yaml', os.path.join(revision_base, 'app', 'link.yaml'))
+    self.assertFalse(source_manager.restore_cached_source(
+      revision_base, 'abc', 'python27'))
+
+    source_manager.cache_source(revision_base, 'abc', 'python27')
+    source_manager.write_source_md5(revision_base, 'abc')
+
+    other_base = os.path.join(self.root, 'rev2')
+    self.assertTrue(source_manager.restore_cached_source(
+      other_base, 'abc', 'python27'))
+    self.assertTrue(os.path.isdir(os.path.join(other_base, 'app', 'lib')))
+    self.assertEqual(os.readlink(os.path.join(other_base, 'app', 'link.yaml')),
+                     'app.yaml')
+    with open(os.path.join(other_base, 'app', 'app.yaml')) as config:
+      self.assertEqual(config.read(), 'runtime: python27')
+
+    # The digest of the restored revision must not affect the cached one.
+    source_manager.write_source_md5(other_base, 'def')
+    self.assertEqual(source_manager.read_source_md5(revision_base), 'abc')
+
+  def test_clean_source_cache(self):
+    cache_dir = os.path.join(self.root, 'cache')
+    for index in range(source_manager.EXTRACTED_SOURCES_CACHE_SIZE + 2):
+      entry = os.path.join(cache_dir, 'md5{}-python27'.format(index))
+      os.makedirs(entry)
+      os.utime(entry, (index, index))
+
+    source_manager.clean_source_cache()
+    remaining = os.listdir(cache_dir)
+    self.assertEqual(len(remaining),
+                     source_manager.EXTRACTED_SOURCES_CACHE_SIZE)
+    self.assertNotIn('md50-python27', remaining)
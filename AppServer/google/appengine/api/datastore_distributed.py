@@ -31,6 +31,8 @@ import sys
 import threading
 import warnings
 
+from concurrent import futures
+
 try:
   from urllib3 import HTTPConnectionPool
   from urllib3.exceptions import MaxRetryError
@@ -38,6 +40,7 @@ try:
 except ImportError:
   POOL_CONNECTIONS = False
 
+from google.appengine.api import apiproxy_rpc
 from google.appengine.api import apiproxy_stub
 from google.appengine.api import apiproxy_stub_map
 from google.appengine.api import datastore_errors
@@ -83,6 +86,15 @@ LOAD_BALANCERS_FILE = "/etc/appscale/load_balancer_ips"
 # The port on the load balancer that serves datastore requests.
 PROXY_PORT = 8888
 
+# The max number of datastore requests that are made at once by each stub.
+MAX_CONCURRENT_REQUESTS = 8
+
+# The number of seconds to wait for other Gets that can share a request.
+GET_BATCH_WINDOW = .001
+
+# The max number of keys to fetch in a single batched Get request.
+MAX_BATCH_GET_KEYS = 1000
+
 
 def get_random_lb_host():
   """ Selects a random host from the load balancers file.
@@ -94,6 +106,192 @@ def get_random_lb_host():
     return random.choice(line.strip() for line in lb_file)
 
 
+class DatastoreRPC(apiproxy_rpc.RPC):
+  """ An RPC that runs on the datastore stub's thread pool.
+
+  The future attribute is set when the call is made, so callers can wait on
+  several calls at once or add callbacks to them.
+  """
+  def __init__(self, stub=None):
+    """ Creates a new DatastoreRPC.
+
+    Args:
+      stub: A DatastoreDistributed instance that handles the actual call.
+    """
+    super(DatastoreRPC, self).__init__(stub=stub)
+    self.future = None
+
+  def _MakeCallImpl(self):
+    """ Submits the call to the stub's thread pool. """
+    self.future = self.stub.MakeCallAsync(self.package, self.call,
+                                          self.request, self.response)
+    self._state = apiproxy_rpc.RPC.RUNNING
+
+  def _WaitImpl(self):
+    """ Waits for the call to finish. """
+    try:
+      self._exception = self.future.exception()
+      self._traceback = getattr(self._exception, '__traceback__', None)
+    finally:
+      self._state = apiproxy_rpc.RPC.FINISHING
+      self._Callback()
+
+    return True
+
+
+class _PendingGet(object):
+  """ A Get request waiting to be sent as part of a batch. """
+  def __init__(self, request, response):
+    self.request = request
+    self.response = response
+    self.exc_info = None
+    self.done = threading.Event()
+
+
+class _GetBatcher(object):
+  """ Combines concurrent Get requests into a single datastore request.
+
+  The runtime splits Gets by entity group and issues a separate RPC for each
+  group. A Get is sent right away unless another request with the same read
+  options is in flight. In that case, it waits for the batch window, and
+  requests that arrive within the window are merged. The response is split
+  back among the callers.
+  """
+  def __init__(self, send, window=GET_BATCH_WINDOW,
+               max_keys=MAX_BATCH_GET_KEYS):
+    """ Creates a new _GetBatcher.
+
+    Args:
+      send: A function with the same signature as
+        DatastoreDistributed._RemoteSend.
+      window: A float specifying how long to wait for other requests.
+      max_keys: An integer specifying the max number of keys in a batch.
+    """
+    self._send = send
+    self._window = window
+    self._max_keys = max_keys
+    self._lock = threading.Lock()
+    self._batches = {}
+    self._in_flight = {}
+
+  def get(self, request, response, tag, request_id=None):
+    """ Populates a Get response, possibly sharing a request with others.
+
+    Args:
+      request: A datastore_pb.GetRequest without a transaction.
+      response: A datastore_pb.GetResponse to populate.
+      tag: A string identifying the app and user making the request.
+      request_id: A string specifying the request ID.
+    """
+    batch_key = (tag, request.has_failover_ms(), request.failover_ms(),
+                 request.has_strong(), request.strong(),
+                 request.allow_deferred())
+    pending = _PendingGet(request, response)
+    with self._lock:
+      batch = self._batches.get(batch_key)
+      should_wait = self._in_flight.get(batch_key, 0) > 0
+      if (batch is not None and
+          sum(other.request.key_size() for other in batch) +
+          request.key_size() <= self._max_keys):
+        batch.append(pending)
+        is_leader = False
+      else:
+        batch = [pending]
+        # Only batches that wait for the window can be joined.
+        if should_wait:
+          self._batches[batch_key] = batch
+
+        self._in_flight[batch_key] = self._in_flight.get(batch_key, 0) + 1
+        is_leader = True
+
+    if is_leader:
+      try:
+        if should_wait:
+          time.sleep(self._window)
+          with self._lock:
+            if self._batches.get(batch_key) is batch:
+              del self._batches[batch_key]
+
+        self._dispatch(batch, tag, request_id)
+      finally:
+        with self._lock:
+          self._in_flight[batch_key] -= 1
+          if not self._in_flight[batch_key]:
+            del self._in_flight[batch_key]
+    else:
+      pending.done.wait()
+
+    if pending.exc_info is not None:
+      raise pending.exc_info[0], pending.exc_info[1], pending.exc_info[2]
+
+  def _dispatch(self, batch, tag, request_id):
+    """ Sends a batch of requests and notifies the callers.
+
+    Args:
+      batch: A list of _PendingGet objects.
+      tag: A string identifying the app and user making the request.
+      request_id: A string specifying the request ID.
+    """
+    try:
+      if len(batch) == 1:
+        self._send_one(batch[0], tag, request_id)
+        return
+
+      combined_request = datastore_pb.GetRequest()
+      combined_request.CopyFrom(batch[0].request)
+      for pending in batch[1:]:
+        combined_request.key_list().extend(pending.request.key_list())
+
+      combined_response = datastore_pb.GetResponse()
+      try:
+        self._send(combined_request, combined_response, 'Get', request_id,
+                   tag)
+      except apiproxy_errors.ApplicationError as error:
+        # An invalid key should only fail the request that contains it.
+        if error.application_error != datastore_pb.Error.BAD_REQUEST:
+          raise
+
+        combined_response = None
+
+      entities = None
+      if (combined_response is not None and
+          not combined_response.deferred_size() and
+          combined_response.entity_size() == combined_request.key_size()):
+        entities = combined_response.entity_list()
+
+      if entities is None:
+        for pending in batch:
+          self._send_one(pending, tag, request_id)
+
+        return
+
+      position = 0
+      for pending in batch:
+        end = position + pending.request.key_size()
+        pending.response.entity_list().extend(entities[position:end])
+        position = end
+    except Exception:
+      exc_info = sys.exc_info()
+      for pending in batch:
+        pending.exc_info = exc_info
+    finally:
+      for pending in batch:
+        pending.done.set()
+
+  def _send_one(self, pending, tag, request_id):
+    """ Sends a single request from a batch.
+
+    Args:
+      pending: A _PendingGet object.
+      tag: A string identifying the app and user making the request.
+      request_id: A string specifying the request ID.
+    """
+    try:
+      self._send(pending.request, pending.response, 'Get', request_id, tag)
+    except Exception:
+      pending.exc_info = sys.exc_info()
+
+
 class InternalCursor():
   """ Keeps track of where we are in a query. Used for when queries are done
   in batches.
@@ -176,7 +374,8 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
                app_id,
                datastore_location,
                service_name='datastore_v3',
-               trusted=False):
+               trusted=False,
+               get_batch_window=GET_BATCH_WINDOW):
     """Constructor.
 
     Args:
@@ -185,6 +384,8 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
       service_name: Service name expected for all calls.
       trusted: bool, default False.  If True, this stub allows an app to
         access the data of another app.
+      get_batch_window: float, the number of seconds to wait for concurrent
+        Gets that can be sent in the same request. 0 disables batching.
     """
     super(DatastoreDistributed, self).__init__(service_name)
 
@@ -197,7 +398,15 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
     if POOL_CONNECTIONS:
       host, port = datastore_location.split(':')
       port = int(port)
-      self._ds_pool = HTTPConnectionPool(host, port, maxsize=8)
+      self._ds_pool = HTTPConnectionPool(host, port,
+                                         maxsize=MAX_CONCURRENT_REQUESTS)
+
+    self._executor = futures.ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS)
+    self._local = threading.local()
+
+    self._get_batcher = None
+    if get_batch_window > 0:
+      self._get_batcher = _GetBatcher(self._RemoteSend, get_batch_window)
 
     self._service_id = os.environ.get('CURRENT_MODULE_ID', 'default')
     self._version_id = os.environ.get('CURRENT_VERSION_ID', 'v1').split('.')[0]
@@ -316,6 +525,40 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
                                                 request_id)
     self.assertPbIsInitialized(response)
 
+  def CreateRPC(self):
+    """ Creates an RPC that runs on the stub's thread pool. """
+    return DatastoreRPC(stub=self)
+
+  def MakeCallAsync(self, service, call, request, response, request_id=None):
+    """ Starts a call on the stub's thread pool.
+
+    Args:
+      service: A string specifying the API service.
+      call: A string specifying the service method to call.
+      request: A ProtocolMessage instance that specifies request properties.
+      response: A ProtocolMessage instance that the response populates.
+      request_id: A string specifying the request ID.
+    Returns:
+      A futures.Future that completes when the response is populated.
+    """
+    # The user is looked up in the calling thread's environment.
+    return self._executor.submit(self._MakeTaggedCall, self._GetTag(),
+                                 service, call, request, response, request_id)
+
+  def _MakeTaggedCall(self, tag, service, call, request, response,
+                      request_id=None):
+    """ Makes a call from a pool thread on behalf of another thread. """
+    self._local.tag = tag
+    try:
+      self.MakeSyncCall(service, call, request, response, request_id)
+    except Exception as error:
+      # Python 2 exceptions don't keep their traceback, and futures only
+      # keeps the exception.
+      error.__traceback__ = sys.exc_info()[2]
+      raise
+    finally:
+      self._local.tag = None
+
   def assertPbIsInitialized(self, pb):
     """Raises an exception if the given PB is not initialized and valid."""
     explanation = []
@@ -349,7 +592,7 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
 
       logging.exception('Failed to make datastore call')
       self._ds_pool = HTTPConnectionPool(get_random_lb_host(), PROXY_PORT,
-                                         maxsize=8)
+                                         maxsize=MAX_CONCURRENT_REQUESTS)
       backoff_ms = 500 * 3 ** (2 - retries)  # 0.5s, 1.5s, 4.5s
       time.sleep(float(backoff_ms) / 1000)
       return self._request_with_pool(payload, headers, retries - 1)
@@ -372,8 +615,12 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
 
     return api_response
 
-  def _RemoteSend(self, request, response, method, request_id=None):
-    """Sends a request remotely to the datstore server. """
+  def _GetTag(self):
+    """ AppScale: Identifies the app and user making the request. """
+    tag = getattr(self._local, 'tag', None)
+    if tag is not None:
+      return tag
+
     tag = self.project_id
     self._maybeSetDefaultAuthDomain() 
     user = users.GetCurrentUser()
@@ -381,6 +628,13 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
       tag += ":" + user.email()
       tag += ":" + user.nickname()
       tag += ":" + user.auth_domain()
+    return tag
+
+  def _RemoteSend(self, request, response, method, request_id=None, tag=None):
+    """Sends a request remotely to the datstore server. """
+    if tag is None:
+      tag = self._GetTag()
+
     api_request = remote_api_pb.Request()
     api_request.set_method(method)
     api_request.set_service_name("datastore_v3")
@@ -412,7 +666,11 @@ class DatastoreDistributed(apiproxy_stub.APIProxyStub):
 
   def _Dynamic_Get(self, get_request, get_response, request_id=None):
     """Send a get request to the datastore server. """
-    self._RemoteSend(get_request, get_response, "Get", request_id)
+    if self._get_batcher is None or get_request.has_transaction():
+      self._RemoteSend(get_request, get_response, "Get", request_id)
+    else:
+      self._get_batcher.get(get_request, get_response, self._GetTag(),
+                            request_id)
     return get_response
 
 
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+#
+# Copyright 2007 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Tests for google.appengine.api.datastore_distributed."""
+
+import sys
+import threading
+import time
+import traceback
+import unittest
+
+from concurrent import futures
+
+from google.appengine.api import datastore_distributed
+from google.appengine.datastore import datastore_pb
+from google.appengine.runtime import apiproxy_errors
+
+
+def make_request(*names):
+  request = datastore_pb.GetRequest()
+  for name in names:
+    key = request.add_key()
+    key.set_app('guestbook')
+    element = key.mutable_path().add_element()
+    element.set_type('Greeting')
+    element.set_name(name)
+  return request
+
+
+def key_name(key):
+  return key.path().element(0).name()
+
+
+class FakeDatastore(object):
+  """Answers Gets like the datastore server and records the calls."""
+
+  def __init__(self):
+    self.calls = []
+    # Requests containing the 'slow' key block until this event is set.
+    self.release = threading.Event()
+
+  def send(self, request, response, method, request_id=None, tag=None):
+    names = [key_name(key) for key in request.key_list()]
+    self.calls.append(names)
+    if 'slow' in names:
+      self.release.wait(5)
+
+    if 'bad' in names:
+      raise apiproxy_errors.ApplicationError(
+        datastore_pb.Error.BAD_REQUEST, 'Invalid key')
+
+    for key in request.key_list():
+      group = response.add_entity()
+      if key_name(key) != 'missing':
+        group.mutable_entity().mutable_key().CopyFrom(key)
+        group.mutable_entity().mutable_entity_group().add_element().CopyFrom(
+          key.path().element(0))
+
+
+class GetBatcherTest(unittest.TestCase):
+
+  def setUp(self):
+    self.datastore = FakeDatastore()
+    self.batcher = datastore_distributed._GetBatcher(self.datastore.send,
+                                                     window=0.2)
+    self.results = {}
+
+  def tearDown(self):
+    self.datastore.release.set()
+
+  def _get(self, names):
+    response = datastore_pb.GetResponse()
+    try:
+      self.batcher.get(make_request(*names), response, 'guestbook')
+    except apiproxy_errors.ApplicationError as error:
+      self.results[tuple(names)] = error
+      return
+
+    self.results[tuple(names)] = [
+      key_name(group.entity().key()) if group.has_entity() else None
+      for group in response.entity_list()]
+
+  def _get_concurrently(self, requests):
+    """Makes Gets while another Get with the same options is in flight."""
+    slow = threading.Thread(target=self._get, args=(['slow'],))
+    slow.start()
+    while not self.datastore.calls:
+      time.sleep(0.01)
+
+    threads = [threading.Thread(target=self._get, args=(names,))
+               for names in requests]
+    for thread in threads:
+      thread.start()
+
+    time.sleep(0.05)
+    self.datastore.release.set()
+    for thread in threads + [slow]:
+      thread.join(5)
+
+  def test_get_is_sent_without_waiting(self):
+    self.batcher = datastore_distributed._GetBatcher(self.datastore.send,
+                                                     window=10)
+    start = time.time()
+    self._get(['a'])
+    self.assertLess(time.time() - start, 1)
+    self.assertEqual(self.datastore.calls, [['a']])
+    self.assertEqual(self.results, {('a',): ['a']})
+
+  def test_concurrent_gets_are_merged(self):
+    self._get_concurrently([['a', 'b'], ['c'], ['missing', 'd']])
+    self.assertEqual(len(self.datastore.calls), 2)
+    self.assertEqual(self.datastore.calls[0], ['slow'])
+    self.assertEqual(sorted(self.datastore.calls[1]),
+                     ['a', 'b', 'c', 'd', 'missing'])
+    self.assertEqual(self.results, {
+      ('slow',): ['slow'],
+      ('a', 'b'): ['a', 'b'],
+      ('c',): ['c'],
+      ('missing', 'd'): [None, 'd'],
+    })
+
+  def test_bad_request_only_fails_its_caller(self):
+    self._get_concurrently([['a'], ['bad'], ['c']])
+    # The merged request fails, so each request is retried on its own.
+    self.assertEqual(sorted(self.datastore.calls[1]), ['a', 'bad', 'c'])
+    self.assertEqual(sorted(self.datastore.calls[2:]),
+                     [['a'], ['bad'], ['c']])
+    self.assertEqual(self.results[('a',)], ['a'])
+    self.assertEqual(self.results[('c',)], ['c'])
+    self.assertIsInstance(self.results[('bad',)],
+                          apiproxy_errors.ApplicationError)
+
+  def test_batch_size_is_limited(self):
+    self.batcher = datastore_distributed._GetBatcher(
+      self.datastore.send, window=0.2, max_keys=3)
+    self._get_concurrently([['a', 'b'], ['c', 'd']])
+    self.assertEqual(len(self.datastore.calls), 3)
+    self.assertEqual(self.results[('a', 'b')], ['a', 'b'])
+    self.assertEqual(self.results[('c', 'd')], ['c', 'd'])
+
+
+class DatastoreDistributedTest(unittest.TestCase):
+
+  def setUp(self):
+    self.stub = datastore_distributed.DatastoreDistributed(
+      'guestbook', 'localhost:8888')
+    self.stub._local.tag = 'guestbook'
+    self.sent = []
+    self.batched = []
+    self.stub._RemoteSend = (
+      lambda request, response, method, request_id=None, tag=None:
+        self.sent.append(request))
+    self.stub._get_batcher.get = (
+      lambda request, response, tag, request_id=None:
+        self.batched.append(request))
+
+  def test_transactional_get_is_not_batched(self):
+    request = make_request('a')
+    request.mutable_transaction().set_app('guestbook')
+    request.mutable_transaction().set_handle(1)
+    self.stub._Dynamic_Get(request, datastore_pb.GetResponse())
+    self.assertEqual(self.sent, [request])
+    self.assertEqual(self.batched, [])
+
+  def test_get_is_batched(self):
+    request = make_request('a')
+    self.stub._Dynamic_Get(request, datastore_pb.GetResponse())
+    self.assertEqual(self.sent, [])
+    self.assertEqual(self.batched, [request])
+
+  def test_rpc_keeps_traceback(self):
+    def fail_in_pool(service, call, request, response, request_id=None):
+      raise apiproxy_errors.ApplicationError(
+        datastore_pb.Error.INTERNAL_ERROR, 'Datastore failure')
+
+    self.stub.MakeSyncCall = fail_in_pool
+    rpc = self.stub.CreateRPC()
+    rpc.MakeCall('datastore_v3', 'Get', make_request('a'),
+                 datastore_pb.GetResponse())
+    rpc.Wait()
+    try:
+      rpc.CheckSuccess()
+    except apiproxy_errors.ApplicationError:
+      frames = traceback.extract_tb(sys.exc_info()[2])
+      self.assertEqual(frames[-1][2], 'fail_in_pool')
+    else:
+      self.fail('ApplicationError not raised')
+
+  def test_rpc_reports_failed_future(self):
+    failed_future = futures.Future()
+    failed_future.set_exception(RuntimeError('Executor is shut down'))
+    self.stub.MakeCallAsync = lambda *args: failed_future
+    rpc = self.stub.CreateRPC()
+    rpc.MakeCall('datastore_v3', 'Get', make_request('a'),
+                 datastore_pb.GetResponse())
+    rpc.Wait()
+    self.assertRaises(RuntimeError, rpc.CheckSuccess)
+
+if __name__ == '__main__':
+  unittest.main()
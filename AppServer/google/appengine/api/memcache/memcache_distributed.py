@@ -19,12 +19,16 @@
 Uses the pymemcache library to interface with memcached.
 """
 import base64
+import collections
 import hashlib
 import os
 import socket
+import threading
+import time
 
 import six
 from pymemcache.exceptions import MemcacheError, MemcacheClientError
+from pymemcache.client.base import _readline
 from pymemcache.client.hash import HashClient
 
 from google.appengine.api import apiproxy_stub
@@ -58,6 +62,9 @@ INTACT_MARKER = b'\x02'
 # Indicates that a memcache key was hashed.
 HASHED_MARKER = b'\x03'
 
+# The default number of seconds an item can be served from the near cache.
+DEFAULT_NEAR_CACHE_TTL = 1
+
 
 def encode_key(project_id, namespace, key):
   """ Encodes a key for memcached.
@@ -118,6 +125,85 @@ def deserializer(key, value, flags):
   return value, flags
 
 
+class NearCache(object):
+  """ A bounded LRU cache of items recently read from memcached.
+
+  Items are kept for a short time, so values changed by other instances can be
+  served for up to ttl seconds. Changes made through this instance invalidate
+  the affected keys right away.
+  """
+  def __init__(self, max_items, ttl):
+    """ Initializer.
+
+    Args:
+      max_items: An int specifying the maximum number of items to keep.
+      ttl: A number specifying how many seconds an item can be served for.
+    """
+    self.max_items = max_items
+    self.ttl = ttl
+    self.hits = 0
+    self.misses = 0
+    # Incremented on every invalidation, so that values fetched before an
+    # invalidation are not cached.
+    self.generation = 0
+    self._items = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def get(self, encoded_key):
+    """ Retrieves an item.
+
+    Args:
+      encoded_key: A bytestring specifying the encoded memcached key.
+    Returns:
+      A tuple in the form of (value: bytestring, flags: int) or None.
+    """
+    with self._lock:
+      entry = self._items.pop(encoded_key, None)
+      if entry is None or entry[0] < time.time():
+        self.misses += 1
+        return None
+
+      self._items[encoded_key] = entry
+      self.hits += 1
+      return entry[1]
+
+  def put(self, items, generation):
+    """ Adds items fetched from memcached.
+
+    Args:
+      items: A dictionary mapping encoded keys to (value, flags) tuples.
+      generation: The value of generation before the items were fetched.
+    """
+    expires = time.time() + self.ttl
+    with self._lock:
+      if generation != self.generation:
+        return
+
+      for encoded_key, value_and_flags in six.iteritems(items):
+        self._items.pop(encoded_key, None)
+        self._items[encoded_key] = (expires, value_and_flags)
+
+      while len(self._items) > self.max_items:
+        self._items.popitem(last=False)
+
+  def invalidate(self, encoded_keys):
+    """ Removes items that have been changed.
+
+    Args:
+      encoded_keys: A list of encoded memcached keys.
+    """
+    with self._lock:
+      self.generation += 1
+      for encoded_key in encoded_keys:
+        self._items.pop(encoded_key, None)
+
+  def clear(self):
+    """ Removes all items. """
+    with self._lock:
+      self.generation += 1
+      self._items.clear()
+
+
 class MemcacheService(apiproxy_stub.APIProxyStub):
   """Python only memcache service.
 
@@ -129,13 +215,22 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
   # An AppScale file which has a list of IPs running memcached.
   APPSCALE_MEMCACHE_FILE = "/etc/appscale/memcache_ips"
 
-  def __init__(self, project_id, service_name='memcache'):
+  def __init__(self, project_id, service_name='memcache', near_cache_size=0,
+               near_cache_ttl=DEFAULT_NEAR_CACHE_TTL):
     """Initializer.
 
     Args:
       service_name: Service name expected for all calls.
+      near_cache_size: The number of items to keep in the near cache. The near
+        cache is disabled if this is 0.
+      near_cache_ttl: The number of seconds an item can be served from the
+        near cache.
     """
     super(MemcacheService, self).__init__(service_name)
+    self._near_cache = None
+    if near_cache_size > 0:
+      self._near_cache = NearCache(near_cache_size, near_cache_ttl)
+
     self._memcache = None
     self.setupMemcacheClient()
     self._methods = {MemcacheSetRequest.SET: self._memcache.set,
@@ -175,14 +270,32 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       encode_key(self._project_id, request.name_space(), key): key
       for key in request.key_list()}
 
-    try:
-      backend_response = self._memcache.get_many(
-        original_keys.keys(), gets=request.for_cas())
-    except MemcacheClientError as error:
-      raise apiproxy_errors.ApplicationError(INVALID_VALUE, str(error))
-    except TRANSIENT_ERRORS as error:
-      raise apiproxy_errors.ApplicationError(
-        UNSPECIFIED_ERROR, 'Transient memcache error: {}'.format(error))
+    # CAS IDs are not cached, so those requests always go to memcached.
+    use_near_cache = self._near_cache is not None and not request.for_cas()
+    cached = {}
+    if use_near_cache:
+      generation = self._near_cache.generation
+      for encoded_key in original_keys:
+        value_tuple = self._near_cache.get(encoded_key)
+        if value_tuple is not None:
+          cached[encoded_key] = value_tuple
+
+    keys_to_fetch = [encoded_key for encoded_key in original_keys
+                     if encoded_key not in cached]
+    backend_response = {}
+    if keys_to_fetch:
+      try:
+        backend_response = self._memcache.get_many(
+          keys_to_fetch, gets=request.for_cas())
+      except MemcacheClientError as error:
+        raise apiproxy_errors.ApplicationError(INVALID_VALUE, str(error))
+      except TRANSIENT_ERRORS as error:
+        raise apiproxy_errors.ApplicationError(
+          UNSPECIFIED_ERROR, 'Transient memcache error: {}'.format(error))
+
+    if use_near_cache:
+      self._near_cache.put(backend_response, generation)
+      backend_response.update(cached)
 
     for encoded_key, value_tuple in six.iteritems(backend_response):
       item = response.add_item()
@@ -212,35 +325,184 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       raise apiproxy_errors.ApplicationError(
         INVALID_VALUE, 'All CAS items must have a cas_id')
 
+    encoded_keys = []
     for item in request.item_list():
       try:
-        encoded_key = encode_key(self._project_id, namespace, item.key())
+        encoded_keys.append(encode_key(self._project_id, namespace, item.key()))
       except apiproxy_errors.ApplicationError:
-        response.add_set_status(MemcacheSetResponse.ERROR)
+        encoded_keys.append(None)
+
+    statuses = [MemcacheSetResponse.ERROR] * len(encoded_keys)
+    if all(item.set_policy() == MemcacheSetRequest.SET
+           for item in request.item_list()):
+      self._SetMany(request.item_list(), encoded_keys, statuses)
+    else:
+      for index, item in enumerate(request.item_list()):
+        if encoded_keys[index] is not None:
+          statuses[index] = self._SetItem(item, encoded_keys[index])
+
+    self._Invalidate(encoded_keys)
+    for status in statuses:
+      response.add_set_status(status)
+
+  def _SetItem(self, item, encoded_key):
+    """ Stores a single item.
+
+    Args:
+      item: A MemcacheSetRequest_Item.
+      encoded_key: A bytestring specifying the encoded memcached key.
+    Returns:
+      A MemcacheSetResponse status.
+    """
+    args = {'key': encoded_key,
+            'value': (item.value(), item.flags()),
+            'expire': int(item.expiration_time())}
+    is_cas = item.set_policy() == MemcacheSetRequest.CAS
+    if is_cas:
+      args['cas'] = six.binary_type(item.cas_id())
+
+    try:
+      backend_response = self._methods[item.set_policy()](**args)
+    except (TRANSIENT_ERRORS + (MemcacheClientError,)):
+      return MemcacheSetResponse.ERROR
+
+    if backend_response:
+      return MemcacheSetResponse.STORED
+
+    if is_cas and backend_response is False:
+      return MemcacheSetResponse.EXISTS
+
+    return MemcacheSetResponse.NOT_STORED
+
+  def _SetMany(self, items, encoded_keys, statuses):
+    """ Stores items with the SET policy using one pipelined command per
+    memcached server and expiration time.
+
+    Args:
+      items: A list of MemcacheSetRequest_Item objects.
+      encoded_keys: A list of encoded keys (None for invalid keys).
+      statuses: A list to fill with MemcacheSetResponse statuses.
+    """
+    batches = collections.defaultdict(collections.OrderedDict)
+    for index, item in enumerate(items):
+      if encoded_keys[index] is None:
         continue
 
-      args = {'key': encoded_key,
-              'value': (item.value(), item.flags()),
-              'expire': int(item.expiration_time())}
-      is_cas = item.set_policy() == MemcacheSetRequest.CAS
-      if is_cas:
-        args['cas'] = six.binary_type(item.cas_id())
+      # Later items overwrite earlier ones with the same key, which matches
+      # the result of storing them one by one.
+      batch = batches[int(item.expiration_time())]
+      batch[encoded_keys[index]] = (item.value(), item.flags())
 
+    for expire, values in six.iteritems(batches):
       try:
-        backend_response = self._methods[item.set_policy()](**args)
+        failed_keys = set(self._memcache.set_many(values, expire=expire))
       except (TRANSIENT_ERRORS + (MemcacheClientError,)):
-        response.add_set_status(MemcacheSetResponse.ERROR)
+        # The batch may have been partially stored, so the items are retried
+        # individually to get a status for each of them.
+        for index, item in enumerate(items):
+          if (encoded_keys[index] is not None and
+              int(item.expiration_time()) == expire):
+            statuses[index] = self._SetItem(item, encoded_keys[index])
+
         continue
 
-      if backend_response:
-        response.add_set_status(MemcacheSetResponse.STORED)
+      for index, item in enumerate(items):
+        if (encoded_keys[index] is not None and
+            int(item.expiration_time()) == expire):
+          statuses[index] = (MemcacheSetResponse.NOT_STORED
+                             if encoded_keys[index] in failed_keys
+                             else MemcacheSetResponse.STORED)
+
+  def _Invalidate(self, encoded_keys):
+    """ Removes changed keys from the near cache.
+
+    Args:
+      encoded_keys: A list of encoded memcached keys (None for invalid keys).
+    """
+    if self._near_cache is not None:
+      self._near_cache.invalidate(
+        [encoded_key for encoded_key in encoded_keys if encoded_key is not None])
+
+  def _SendCommands(self, client, commands, command_name):
+    """ Sends commands to a memcached server in a single write and reads one
+    reply per command.
+
+    Args:
+      client: A PooledClient for the server.
+      commands: A list of bytestrings, each containing a command line.
+      command_name: A bytestring used in error messages.
+    Returns:
+      A list containing a reply line or a MemcacheError for each command.
+    """
+    with client.client_pool.get_and_release(destroy_on_fail=True) as conn:
+      if conn.sock is None:
+        conn._connect()
+
+      try:
+        conn.sock.sendall(b''.join(commands))
+        replies = []
+        buf = b''
+        for _ in commands:
+          buf, line = _readline(conn.sock, buf)
+          # An error reply only affects its own command, so the remaining
+          # replies are still read.
+          try:
+            conn._raise_errors(line, command_name)
+          except MemcacheError as error:
+            line = error
+
+          replies.append(line)
+      except Exception:
+        conn.close()
+        raise
+
+    return replies
+
+  def _RunPipelined(self, encoded_keys, commands, command_name):
+    """ Sends commands using one round trip per memcached server.
+
+    Args:
+      encoded_keys: A list of encoded memcached keys (None for invalid keys).
+      commands: A list of command bytestrings matching encoded_keys.
+      command_name: A bytestring used in error messages.
+    Returns:
+      A list containing a reply line, an exception, or None (for invalid keys)
+      for each key.
+    """
+    replies = [None] * len(encoded_keys)
+    batches = collections.OrderedDict()
+    for index, encoded_key in enumerate(encoded_keys):
+      if encoded_key is None:
         continue
 
-      if is_cas and backend_response is False:
-        response.add_set_status(MemcacheSetResponse.EXISTS)
+      try:
+        client = self._memcache._get_client(encoded_key)
+      except MemcacheError as error:
+        replies[index] = error
         continue
 
-      response.add_set_status(MemcacheSetResponse.NOT_STORED)
+      batches.setdefault(client, []).append(index)
+
+    for client, indexes in six.iteritems(batches):
+      try:
+        # This keeps track of failed servers like other HashClient calls.
+        server_replies = self._memcache._safely_run_func(
+          client, self._SendCommands, None, client,
+          [commands[index] for index in indexes], command_name)
+      except TRANSIENT_ERRORS as error:
+        server_replies = None
+        unavailable = error
+      else:
+        unavailable = MemcacheError(
+          'Server {} is unavailable'.format(client.server))
+
+      if server_replies is None:
+        server_replies = [unavailable] * len(indexes)
+
+      for index, reply in zip(indexes, server_replies):
+        replies[index] = reply
+
+    return replies
 
   def _Dynamic_Delete(self, request, response):
     """Implementation of delete in memcache.
@@ -249,18 +511,27 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       request: A MemcacheDeleteRequest protocol buffer.
       response: A MemcacheDeleteResponse protocol buffer.
     """
-    for item in request.item_list():
-      encoded_key = encode_key(self._project_id, request.name_space(),
-                               item.key())
-      try:
-        key_existed = self._memcache.delete(encoded_key)
-      except MemcacheClientError as error:
-        raise apiproxy_errors.ApplicationError(INVALID_VALUE, str(error))
-      except TRANSIENT_ERRORS as error:
+    encoded_keys = [
+      encode_key(self._project_id, request.name_space(), item.key())
+      for item in request.item_list()]
+    commands = [b'delete ' + encoded_key + b'\r\n'
+                for encoded_key in encoded_keys]
+    try:
+      replies = self._RunPipelined(encoded_keys, commands, b'delete')
+    finally:
+      self._Invalidate(encoded_keys)
+
+    for reply in replies:
+      if isinstance(reply, MemcacheClientError):
+        raise apiproxy_errors.ApplicationError(INVALID_VALUE, str(reply))
+
+      if isinstance(reply, Exception):
         raise apiproxy_errors.ApplicationError(
-          UNSPECIFIED_ERROR, 'Transient memcache error: {}'.format(error))
+          UNSPECIFIED_ERROR, 'Transient memcache error: {}'.format(reply))
 
-      response.add_delete_status(MemcacheDeleteResponse.DELETED if key_existed
+    for reply in replies:
+      response.add_delete_status(MemcacheDeleteResponse.DELETED
+                                 if reply == b'DELETED'
                                  else MemcacheDeleteResponse.NOT_FOUND)
 
   def _Increment(self, namespace, request):
@@ -296,8 +567,20 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
     if response is not None:
       return response
 
-    # If the key was not present and an initial value was provided, perform
-    # the mutation client-side and set the key if it still doesn't exist.
+    return self._SetInitialValue(encoded_key, request)
+
+  def _SetInitialValue(self, encoded_key, request):
+    """ Performs the mutation client-side for a key that was not present and
+    sets the key if it still doesn't exist.
+
+    Args:
+      encoded_key: A bytestring specifying the encoded memcached key.
+      request: A MemcacheIncrementRequest with an initial value.
+    Returns:
+      An integer indicating the new value.
+    Raises:
+      ApplicationError if unable to set the value.
+    """
     flags = 0
     if request.has_initial_flags():
       flags = request.initial_flags()
@@ -328,7 +611,13 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       request: A MemcacheIncrementRequest protocol buffer.
       response: A MemcacheIncrementResponse protocol buffer.
     """
-    new_value = self._Increment(request.name_space(), request)
+    encoded_key = encode_key(self._project_id, request.name_space(),
+                             request.key())
+    try:
+      new_value = self._Increment(request.name_space(), request)
+    finally:
+      self._Invalidate([encoded_key])
+
     response.set_new_value(new_value)
 
   def _Dynamic_BatchIncrement(self, request, response):
@@ -338,20 +627,60 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
       request: A MemcacheBatchIncrementRequest protocol buffer.
       response: A MemcacheBatchIncrementResponse protocol buffer.
     """
-    for request_item in request.item_list():
-      item = response.add_item()
+    request_items = request.item_list()
+    response_items = [response.add_item() for _ in request_items]
+    encoded_keys = []
+    for request_item in request_items:
       try:
-        new_value = self._Increment(request.name_space(), request_item)
-      except apiproxy_errors.ApplicationError as error:
-        if error.application_error == INVALID_VALUE:
+        encoded_keys.append(encode_key(self._project_id, request.name_space(),
+                                       request_item.key()))
+      except apiproxy_errors.ApplicationError:
+        # Items with invalid keys are reported as not changed.
+        encoded_keys.append(None)
+
+    commands = []
+    for request_item, encoded_key in zip(request_items, encoded_keys):
+      command = b'incr'
+      if request_item.direction() == MemcacheIncrementRequest.DECREMENT:
+        command = b'decr'
+
+      # Commands for invalid keys are not sent.
+      commands.append(b' '.join([command, encoded_key or b'',
+                                 six.binary_type(request_item.delta())]) +
+                      b'\r\n')
+
+    try:
+      replies = self._RunPipelined(encoded_keys, commands, b'incr')
+      for index, reply in enumerate(replies):
+        item = response_items[index]
+        request_item = request_items[index]
+        if encoded_keys[index] is None or isinstance(reply,
+                                                     MemcacheClientError):
           item.set_increment_status(MemcacheIncrementResponse.NOT_CHANGED)
-        else:
-          item.set_increment_status(MemcacheIncrementResponse.ERROR)
+          continue
 
-        continue
+        if isinstance(reply, Exception):
+          item.set_increment_status(MemcacheIncrementResponse.ERROR)
+          continue
+
+        if reply == b'NOT_FOUND':
+          if not request_item.has_initial_value():
+            item.set_increment_status(MemcacheIncrementResponse.ERROR)
+            continue
+
+          try:
+            new_value = self._SetInitialValue(encoded_keys[index],
+                                              request_item)
+          except apiproxy_errors.ApplicationError:
+            item.set_increment_status(MemcacheIncrementResponse.ERROR)
+            continue
+        else:
+          new_value = int(reply)
 
-      item.set_increment_status(MemcacheIncrementResponse.OK)
-      item.set_new_value(new_value)
+        item.set_increment_status(MemcacheIncrementResponse.OK)
+        item.set_new_value(new_value)
+    finally:
+      self._Invalidate(encoded_keys)
 
   def _Dynamic_FlushAll(self, request, response):
     """Implementation of MemcacheService::FlushAll().
@@ -362,6 +691,8 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
     """
     # TODO: Prevent a project from clearing another project's namespace.
     self._memcache.flush_all()
+    if self._near_cache is not None:
+      self._near_cache.clear()
 
   def _Dynamic_Stats(self, request, response):
     """Implementation of MemcacheService::Stats().
@@ -393,6 +724,10 @@ class MemcacheService(apiproxy_stub.APIProxyStub):
                                if key.endswith(':age'))
       oldest_item_age = max(oldest_item_age, oldest_server_item)
 
+    # Reads served by the near cache never reach memcached.
+    if self._near_cache is not None:
+      hits += self._near_cache.hits
+
     stats = response.mutable_stats()
     stats.set_hits(hits)
     stats.set_misses(misses)
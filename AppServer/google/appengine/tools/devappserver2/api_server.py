@@ -579,9 +579,14 @@ def setup_stubs(
                                 enable_sendmail=mail_enable_sendmail,
                                 show_mail_body=mail_show_mail_body))
 
+  near_cache_ttl = float(os.environ.get(
+      'MEMCACHE_NEAR_CACHE_TTL', memcache_distributed.DEFAULT_NEAR_CACHE_TTL))
   apiproxy_stub_map.apiproxy.RegisterStub(
       'memcache',
-      memcache_distributed.MemcacheService(app_id))
+      memcache_distributed.MemcacheService(
+          app_id,
+          near_cache_size=int(os.environ.get('MEMCACHE_NEAR_CACHE_SIZE', 0)),
+          near_cache_ttl=near_cache_ttl))
 
   apiproxy_stub_map.apiproxy.RegisterStub(
       'search',
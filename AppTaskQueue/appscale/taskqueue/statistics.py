@@ -65,12 +65,14 @@ CUMULATIVE_COUNTERS = {
   "all": samples.summarize_all,
   "failed": summarize_failed_request,
   "pb_reqs": summarize_protobuffer_request,
-  "rest_reqs": summarize_rest_request
+  "rest_reqs": summarize_rest_request,
+  "latency_percentiles": samples.LatencyPercentiles()
 }
 METRICS_CONFIG = {
   "all": samples.count_all,
   "failed": count_failed_requests,
   "avg_latency": samples.count_avg_latency,
+  "latency_percentiles": samples.LatencyPercentiles(),
   "pb_reqs": count_protobuff_requests,
   "rest_reqs": count_rest_requests,
   ("by_pb_method", categorize_by_pb_method): samples.count_all,
@@ -134,6 +134,10 @@ class TestServiceStatistics(AsyncHTTPTestCase):
     self.assertGreater(stats['recent_stats'].pop('from'), 0)
     self.assertGreater(stats['recent_stats'].pop('to'), 0)
     self.assertGreaterEqual(stats['recent_stats'].pop('avg_latency'), 0)
+    for percentiles in (stats['cumulative_counters'].pop('latency_percentiles'),
+                        stats['recent_stats'].pop('latency_percentiles')):
+      self.assertEqual(set(percentiles), {'p50', 'p95', 'p99'})
+      self.assertLessEqual(percentiles['p50'], percentiles['p99'])
 
     # Verify other fields
     self.assertEqual(stats, {
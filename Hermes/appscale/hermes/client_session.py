@@ -0,0 +1,119 @@
+""" Long-lived HTTP client session shared by Hermes fan-out requests. """
+import asyncio
+import bisect
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# The max number of simultaneous connections opened by the shared session.
+MAX_CONNECTIONS = 200
+
+# The max number of simultaneous connections to a single node.
+MAX_CONNECTIONS_PER_HOST = 8
+
+# The number of seconds to keep an idle connection open.
+KEEPALIVE_TIMEOUT = 120
+
+# Upper bounds (in seconds) of latency histogram buckets.
+LATENCY_BUCKETS = (
+  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+_session = None
+_session_loop = None
+
+
+def get_session():
+  """ Returns an HTTP client session bound to the current event loop.
+
+  Session is created lazily and kept open during Hermes life, so connections
+  to other nodes are reused between requests. Response bodies compressed with
+  gzip or deflate are decoded by the session transparently.
+
+  Returns:
+    An instance of aiohttp.ClientSession.
+  """
+  global _session, _session_loop
+  loop = asyncio.get_event_loop()
+  if _session is None or _session.closed or _session_loop is not loop:
+    connector = aiohttp.TCPConnector(
+      limit=MAX_CONNECTIONS, limit_per_host=MAX_CONNECTIONS_PER_HOST,
+      keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    _session = aiohttp.ClientSession(connector=connector)
+    _session_loop = loop
+  return _session
+
+
+async def close_session(app=None):
+  """ Closes shared session if it was opened.
+  Can be used as aiohttp application on_cleanup signal handler.
+
+  Args:
+    app: An instance of aiohttp.web.Application (unused).
+  """
+  global _session, _session_loop
+  if _session is not None and not _session.closed:
+    await _session.close()
+  _session = None
+  _session_loop = None
+
+
+class LatencyHistogram(object):
+  """ Cumulative histogram of request latencies. """
+
+  def __init__(self, buckets=LATENCY_BUCKETS):
+    """ Initializes an empty histogram.
+
+    Args:
+      buckets: A sorted tuple of bucket upper bounds (in seconds).
+    """
+    self.buckets = buckets
+    # The last counter is used for values greater than the biggest bucket.
+    self.counts = [0] * (len(buckets) + 1)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, latency):
+    """ Registers single latency value.
+
+    Args:
+      latency: A float - number of seconds.
+    """
+    self.counts[bisect.bisect_left(self.buckets, latency)] += 1
+    self.count += 1
+    self.sum += latency
+
+  def quantile(self, q):
+    """ Estimates latency quantile as upper bound of matching bucket.
+
+    Args:
+      q: A float in range [0, 1].
+    Returns:
+      A float - number of seconds, or None if nothing was registered.
+    """
+    if not self.count:
+      return None
+    rank = q * self.count
+    accumulated = 0
+    for bound, bucket_count in zip(self.buckets, self.counts):
+      accumulated += bucket_count
+      if accumulated >= rank:
+        return bound
+    return float('inf')
+
+  def cumulative_counts(self):
+    """ Lists (upper bound, number of values <= upper bound) pairs.
+
+    Returns:
+      A list of tuples, the last tuple has infinite upper bound.
+    """
+    result = []
+    accumulated = 0
+    for bound, bucket_count in zip(self.buckets + (float('inf'),),
+                                   self.counts):
+      accumulated += bucket_count
+      result.append((bound, accumulated))
+    return result
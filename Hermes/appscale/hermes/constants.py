@@ -14,6 +14,26 @@ REMOTE_REQUEST_TIMEOUT = 60
 # Stats which were produce less than X seconds ago is considered as current
 ACCEPTABLE_STATS_AGE = 10
 
+# The number of seconds between samples recorded to local stats history.
+HISTORY_SAMPLING_INTERVAL = 10
+
+# Resolutions of local stats history as (step, capacity) pairs:
+# 10 seconds for the last hour and 1 minute for the last day.
+HISTORY_RESOLUTIONS = ((10, 360), (60, 1440))
+
+# The maximum number of series kept in local stats history
+# (every series takes about 43KB with default resolutions).
+MAX_HISTORY_SERIES = 500
+
+# The number of seconds between pushes of local stats to the head node.
+PUSH_INTERVAL = 10
+
+# Stats pushed by a node are forgotten if node stops pushing for X seconds.
+PUSHED_STATS_EXPIRATION = 6 * PUSH_INTERVAL
+
+# The route for receiving stats pushed by cluster nodes.
+PUSH_STATS_PATH = 'stats/push'
+
 # The ZooKeeper location for storing Hermes configurations
 NODES_STATS_CONFIGS_NODE = '/appscale/stats/profiling/nodes'
 PROCESSES_STATS_CONFIGS_NODE = '/appscale/stats/profiling/processes'
@@ -1,5 +1,5 @@
+import asyncio
 import http
-import inspect
 import logging
 import time
 from datetime import datetime
@@ -11,9 +11,23 @@ from appscale.hermes.constants import SECRET_HEADER, ACCEPTABLE_STATS_AGE
 from appscale.hermes.converter import (
   stats_to_dict, IncludeLists, WrongIncludeLists
 )
+from appscale.hermes.helper import get_current_snapshot
+from appscale.hermes.push_stats import InvalidStats, ResyncRequired
+from appscale.hermes.metrics import (
+  CONTENT_TYPE, render_latency_histograms, render_snapshots
+)
 
 logger = logging.getLogger(__name__)
 
+# The default time range of history requests.
+HOUR = 60 * 60
+
+# History requests can't refer to timestamps beyond this (year 2106).
+MAX_HISTORY_TIMESTAMP = 2 ** 32
+
+# The number of bytes to accumulate before writing metrics to response.
+METRICS_CHUNK_SIZE = 64 * 1024
+
 
 @web.middleware
 async def verify_secret_middleware(request, handler):
@@ -26,7 +40,11 @@ async def verify_secret_middleware(request, handler):
     403 Response if secret is incorrect,
     Response provided by handler otherwise.
   """
-  if request.headers.get(SECRET_HEADER) != appscale_info.get_secret():
+  secret = appscale_info.get_secret()
+  # Scrapers which can't set custom headers can pass secret as bearer token.
+  authorization = 'Bearer {}'.format(secret)
+  if (request.headers.get(SECRET_HEADER) != secret and
+      request.headers.get('Authorization') != authorization):
     logger.warn("Received bad secret from {client}"
                 .format(client=request.remote))
     return web.Response(status=http.HTTPStatus.FORBIDDEN,
@@ -34,6 +52,19 @@ async def verify_secret_middleware(request, handler):
   return await handler(request)
 
 
+def compressed(response):
+  """ Enables compression of response body. Encoding is picked
+  according to Accept-Encoding header of the request (if any).
+
+  Args:
+    response: an instance of Response.
+  Returns:
+    The same instance of Response.
+  """
+  response.enable_compression()
+  return response
+
+
 def get_default_include_lists():
   """ Creates an instance of IncludeLists with default values.
   It is not a constant because all model classes should be imported before
@@ -85,13 +116,15 @@ def get_default_include_lists():
 class LocalStatsHandler:
   """ Handler for getting current local stats of specific kind.
   """
-  def __init__(self, stats_source):
+  def __init__(self, stats_source, history=None):
     """ Initializes request handler for providing current stats.
 
     Args:
       stats_source: an object with method get_current.
+      history: an instance of StatsHistory sampling the same stats source.
     """
     self.stats_source = stats_source
+    self.history = history
     self.cached_snapshot = None
     self.default_include_lists = get_default_include_lists()
 
@@ -121,8 +154,26 @@ class LocalStatsHandler:
     else:
       include_lists = self.default_include_lists
 
+    snapshot = await self.get_snapshot(max_age)
+    return compressed(web.json_response(stats_to_dict(snapshot, include_lists)))
+
+  async def get_snapshot(self, max_age):
+    """ Returns cached snapshot if it is fresh enough or collects a new one.
+
+    Args:
+      max_age: An int - max age of cached snapshot to use (in seconds).
+    Returns:
+      An instance of stats snapshot.
+    """
     snapshot = None
 
+    # Snapshot recorded by history sampler is as good as cached one
+    if self.history and self.history.latest_snapshot:
+      if (not self.cached_snapshot or
+          self.history.latest_snapshot.utc_timestamp >
+          self.cached_snapshot.utc_timestamp):
+        self.cached_snapshot = self.history.latest_snapshot
+
     # Try to use cached snapshot
     if self.cached_snapshot:
       now = time.time()
@@ -133,25 +184,103 @@ class LocalStatsHandler:
                     .format(now-self.cached_snapshot.utc_timestamp))
 
     if not snapshot:
-      snapshot = self.stats_source.get_current()
-      if inspect.isawaitable(snapshot):
-        snapshot = await snapshot
+      snapshot = await get_current_snapshot(self.stats_source)
       self.cached_snapshot = snapshot
 
-    return web.json_response(stats_to_dict(snapshot, include_lists))
+    return snapshot
+
+
+class StatsHistoryHandler:
+  """ Handler for getting history of local stats of specific kind.
+  """
+
+  def __init__(self, history):
+    """ Initializes request handler for providing stats history.
+
+    Args:
+      history: an instance of StatsHistory.
+    """
+    self.history = history
+
+  async def __call__(self, request):
+    """ Handles HTTP request. Request payload should specify
+    list of series names (or patterns) to return, e.g.:
+    {"fields": ["cpu.percent", "memory.*"], "start": 1550000000,
+     "end": 1550003600, "step": 60}.
+    If start is omitted, the last hour is returned.
+
+    Args:
+      request: an instance of Request.
+    Returns:
+      An instance of Response.
+    """
+    if request.has_body:
+      try:
+        payload = await request.json()
+      except ValueError as err:
+        logger.warn("Bad request from {client} ({error})"
+                    .format(client=request.remote, error=err))
+        return web.Response(status=http.HTTPStatus.BAD_REQUEST,
+                            reason='Wrong payload', text=str(err))
+    else:
+      payload = {}
+    if not isinstance(payload, dict):
+      return web.Response(status=http.HTTPStatus.BAD_REQUEST,
+                          reason='Wrong payload',
+                          text='payload should be a JSON object')
+    fields = payload.get('fields', ['*'])
+    start = payload.get('start')
+    end = payload.get('end')
+    step = payload.get('step')
+
+    if (not isinstance(fields, list) or
+        not all(isinstance(field, str) for field in fields)):
+      logger.warn("Bad request from {client} (fields: {fields})"
+                  .format(client=request.remote, fields=fields))
+      return web.Response(status=http.HTTPStatus.BAD_REQUEST,
+                          reason='Wrong fields',
+                          text='fields should be a list of strings')
+
+    for name, value in (('start', start), ('end', end), ('step', step)):
+      if value is None:
+        continue
+      lower_bound = 0 if name != 'step' else 1
+      # NaN and infinity don't fit the range either.
+      if (isinstance(value, bool) or not isinstance(value, (int, float)) or
+          not lower_bound <= value <= MAX_HISTORY_TIMESTAMP):
+        logger.warn("Bad request from {client} ({name}: {value})"
+                    .format(client=request.remote, name=name, value=value))
+        return web.Response(
+          status=http.HTTPStatus.BAD_REQUEST,
+          reason='Wrong {}'.format(name),
+          text='{} should be a number between {} and {}'.format(
+            name, lower_bound, MAX_HISTORY_TIMESTAMP))
+
+    end = end or time.time()
+    start = start or end - HOUR
+
+    series = self.history.query(fields, start, end, step)
+    return compressed(web.json_response({
+      "start": start,
+      "end": end,
+      "series": series
+    }))
 
 
 class ClusterStatsHandler:
   """ Handler for getting current cluster stats of specific kind.
   """
 
-  def __init__(self, stats_source):
+  def __init__(self, stats_source, pushed_stats=None):
     """ Initializes request handler for providing current stats.
 
     Args:
       stats_source: an object with method get_current.
+      pushed_stats: an instance of PushedStatsAggregator (if stats pushed
+        by cluster nodes should be used).
     """
     self.stats_source = stats_source
+    self.pushed_stats = pushed_stats
     self.cached_snapshots = {}
     self.default_include_lists = get_default_include_lists()
 
@@ -181,15 +310,61 @@ class ClusterStatsHandler:
     else:
       include_lists = self.default_include_lists
 
+    snapshots, failures = await self.get_snapshots(max_age, include_lists)
+
+    rendered_snapshots = {
+      node_ip: stats_to_dict(snapshot, include_lists)
+      for node_ip, snapshot in snapshots.items()
+    }
+    body = {
+      "stats": rendered_snapshots,
+      "failures": failures
+    }
+    if self.pushed_stats:
+      now = time.time()
+      body["staleness"] = {
+        node_ip: max(now - snapshot.utc_timestamp, 0)
+        for node_ip, snapshot in snapshots.items()
+      }
+
+    return compressed(web.json_response(body))
+
+  async def get_snapshots(self, max_age, include_lists):
+    """ Collects snapshots from cluster nodes. Fresh cached snapshots
+    and snapshots pushed by nodes are used instead of remote calls
+    if they are good enough.
+
+    Args:
+      max_age: An int - max age of snapshot to use (in seconds).
+      include_lists: An instance of IncludeLists.
+    Returns:
+      A tuple (dict of snapshots per node IP, dict of failures per node IP).
+    """
     newer_than = time.mktime(datetime.now().timetuple()) - max_age
 
     if (not self.default_include_lists or
         include_lists.is_subset_of(self.default_include_lists)):
       # If user didn't specify any non-default fields we can use local cache
+      candidates = dict(self.cached_snapshots)
+      # Pushed snapshots are up to a push interval old when they arrive,
+      # so they are used until the aggregator expires them.
+      pushed_ips = set()
+      if self.pushed_stats:
+        cluster_ips = set(self.stats_source.ips_getter())
+        pushed_snapshots = self.pushed_stats.get_snapshots(
+          self.stats_source.method_path
+        )
+        for node_ip, snapshot in pushed_snapshots.items():
+          cached = candidates.get(node_ip)
+          if node_ip in cluster_ips and (
+              cached is None or cached.utc_timestamp < snapshot.utc_timestamp):
+            candidates[node_ip] = snapshot
+            pushed_ips.add(node_ip)
       fresh_local_snapshots = {
         node_ip: snapshot
-        for node_ip, snapshot in self.cached_snapshots.items()
-        if max_age and snapshot.utc_timestamp > newer_than
+        for node_ip, snapshot in candidates.items()
+        if max_age and (node_ip in pushed_ips
+                        or snapshot.utc_timestamp > newer_than)
       }
       if fresh_local_snapshots:
         logger.debug("Returning cluster stats with {} cached snapshots"
@@ -209,16 +384,150 @@ class ClusterStatsHandler:
 
     # Extend fetched snapshots dict with fresh local snapshots
     new_snapshots_dict.update(fresh_local_snapshots)
+    return new_snapshots_dict, failures
 
-    rendered_snapshots = {
-      node_ip: stats_to_dict(snapshot, include_lists)
-      for node_ip, snapshot in new_snapshots_dict.items()
-    }
 
-    return web.json_response({
-      "stats": rendered_snapshots,
-      "failures": failures
-    })
+class PushedStatsHandler:
+  """ Handler for receiving stats pushed by cluster nodes.
+  """
+
+  def __init__(self, pushed_stats):
+    """ Initializes request handler for receiving pushed stats.
+
+    Args:
+      pushed_stats: an instance of PushedStatsAggregator.
+    """
+    self.pushed_stats = pushed_stats
+
+  async def __call__(self, request):
+    """ Handles HTTP request. Payload is expected to be generated
+    by StatsPusher.
+
+    Args:
+      request: an instance of Request.
+    Returns:
+      An instance of Response listing kinds of stats which should be
+      pushed in full next time.
+    """
+    try:
+      payload = await request.json()
+      node_ip = payload['node']
+      versions = [
+        (kind, version['base'], version['seq'], version['delta'])
+        for kind, version in payload['kinds'].items()
+      ]
+    except (ValueError, KeyError, AttributeError, TypeError) as err:
+      logger.warn("Bad push from {client} ({error})"
+                  .format(client=request.remote, error=err))
+      return web.Response(status=http.HTTPStatus.BAD_REQUEST,
+                          reason='Wrong payload', text=str(err))
+
+    resync = []
+    for kind, base_seq, seq, delta in versions:
+      try:
+        self.pushed_stats.update(node_ip, kind, base_seq, seq, delta)
+      except InvalidStats as err:
+        logger.warning("Requesting full stats ({})".format(err))
+        resync.append(kind)
+      except ResyncRequired as err:
+        logger.info("Requesting full stats ({})".format(err))
+        resync.append(kind)
+    return web.json_response({"resync": resync})
+
+
+class MetricsHandler:
+  """ Handler for rendering stats in Prometheus text exposition format.
+  """
+
+  def __init__(self, local_stats_handlers, cluster_stats_handlers=None):
+    """ Initializes request handler for providing metrics.
+
+    Args:
+      local_stats_handlers: a list of (metric prefix, LocalStatsHandler) pairs.
+      cluster_stats_handlers: a list of (metric prefix, ClusterStatsHandler)
+        pairs. Cluster metrics are rendered only if this is specified.
+    """
+    self.local_stats_handlers = local_stats_handlers
+    self.cluster_stats_handlers = cluster_stats_handlers
+
+  async def __call__(self, request):
+    """ Handles HTTP request. Local metrics are rendered by default,
+    cluster metrics (labeled with node IP) are rendered if request
+    has 'cluster' query argument set to 1.
+
+    Args:
+      request: an instance of Request.
+    Returns:
+      An instance of StreamResponse.
+    """
+    cluster = request.query.get('cluster', '').lower() in ('1', 'true')
+    if cluster and not self.cluster_stats_handlers:
+      return web.Response(status=http.HTTPStatus.NOT_FOUND,
+                          reason='Only LB nodes provide cluster stats')
+
+    if cluster:
+      prefixes = [prefix for prefix, _ in self.cluster_stats_handlers]
+      results = await asyncio.gather(*[
+        handler.get_snapshots(ACCEPTABLE_STATS_AGE,
+                              handler.default_include_lists)
+        for _, handler in self.cluster_stats_handlers
+      ], return_exceptions=True)
+    else:
+      prefixes = [prefix for prefix, _ in self.local_stats_handlers]
+      results = await asyncio.gather(*[
+        handler.get_snapshot(ACCEPTABLE_STATS_AGE)
+        for _, handler in self.local_stats_handlers
+      ], return_exceptions=True)
+
+    response = compressed(
+      web.StreamResponse(headers={'Content-Type': CONTENT_TYPE}))
+    await response.prepare(request)
+
+    for prefix, result in zip(prefixes, results):
+      if isinstance(result, Exception):
+        logger.warning('Failed to prepare {} metrics ({})'
+                       .format(prefix, result))
+        continue
+      if cluster:
+        stats_per_node, failures = result
+        rows = [(snapshot, (('node', node_ip),))
+                for node_ip, snapshot in stats_per_node.items()]
+      else:
+        rows = [(result, ())]
+      await write_lines(response, render_snapshots(prefix, rows))
+
+    if cluster:
+      histograms = [
+        ((('path', handler.stats_source.method_path), ('node', node_ip)),
+         histogram)
+        for _, handler in self.cluster_stats_handlers
+        for node_ip, histogram in handler.stats_source.fetch_latency.items()
+      ]
+      await write_lines(response, render_latency_histograms(
+        'appscale_hermes_fetch_latency_seconds', histograms))
+
+    await response.write_eof()
+    return response
+
+
+async def write_lines(response, lines):
+  """ Writes lines to stream response in chunks.
+
+  Args:
+    response: an instance of StreamResponse.
+    lines: an iterable of strings.
+  """
+  chunk = []
+  chunk_size = 0
+  for line in lines:
+    chunk.append(line)
+    chunk_size += len(line)
+    if chunk_size >= METRICS_CHUNK_SIZE:
+      await response.write(''.join(chunk).encode())
+      chunk = []
+      chunk_size = 0
+  if chunk:
+    await response.write(''.join(chunk).encode())
 
 
 def not_found(reason):
@@ -1,6 +1,18 @@
 """ Helper functions for Hermes operations. """
+import asyncio
 import errno
+import inspect
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+# The number of threads used for collecting stats with blocking calls.
+STATS_EXECUTOR_WORKERS = 2
+
+# Executor for stats producers which use blocking calls (psutil, subprocess).
+stats_executor = ThreadPoolExecutor(max_workers=STATS_EXECUTOR_WORKERS)
+
+# Pending collections of snapshots for blocking stats sources.
+_pending_snapshots = {}
 
 class JSONTags(object):
   """ A class containing all JSON tags used for Hermes functionality. """
@@ -32,3 +44,32 @@ def ensure_directory(dir_path):
       pass
     else:
       raise
+
+
+async def get_current_snapshot(stats_source):
+  """ Gets current snapshot from stats source without blocking event loop.
+  Blocking stats sources (with regular get_current method) are called
+  in a background executor. If snapshot of such source is already
+  being collected, the same result is awaited instead of starting
+  another collection.
+
+  Args:
+    stats_source: An object with method get_current.
+  Returns:
+    An instance of stats snapshot.
+  """
+  if inspect.iscoroutinefunction(stats_source.get_current):
+    return await stats_source.get_current()
+
+  pending = _pending_snapshots.get(stats_source)
+  if pending is None or pending.done():
+    loop = asyncio.get_event_loop()
+    pending = loop.run_in_executor(stats_executor, stats_source.get_current)
+    _pending_snapshots[stats_source] = pending
+    pending.add_done_callback(
+      lambda future: _pending_snapshots.pop(stats_source, None))
+
+  snapshot = await asyncio.shield(pending)
+  if inspect.isawaitable(snapshot):
+    snapshot = await snapshot
+  return snapshot
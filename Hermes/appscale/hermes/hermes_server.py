@@ -2,6 +2,7 @@
 nodes, processes and services. """
 
 import argparse
+import asyncio
 import logging
 
 from aiohttp import web
@@ -10,9 +11,13 @@ from appscale.common import appscale_info
 from appscale.common.constants import LOG_FORMAT
 
 from appscale.hermes import constants
+from appscale.hermes.client_session import close_session
 from appscale.hermes.handlers import (
-  verify_secret_middleware, LocalStatsHandler, ClusterStatsHandler, not_found
+  verify_secret_middleware, LocalStatsHandler, ClusterStatsHandler,
+  StatsHistoryHandler, MetricsHandler, PushedStatsHandler, not_found
 )
+from appscale.hermes.history import StatsHistory
+from appscale.hermes.push_stats import PushedStatsAggregator, StatsPusher
 from appscale.hermes.producers.cluster_stats import (
   cluster_nodes_stats, cluster_processes_stats, cluster_proxies_stats,
   cluster_rabbitmq_stats, cluster_push_queues_stats, cluster_taskqueue_stats,
@@ -28,6 +33,32 @@ from appscale.hermes.producers.taskqueue_stats import TaskqueueStatsSource
 
 logger = logging.getLogger(__name__)
 
+# Local stats which are pushed to the head node in push mode.
+PUSHED_STATS_ROUTES = (
+  '/stats/local/node',
+  '/stats/local/processes',
+  '/stats/local/proxies',
+  '/stats/local/rabbitmq',
+)
+
+# Metric name prefixes for stats exposed through /metrics route.
+LOCAL_METRICS_PREFIXES = {
+  '/stats/local/node': 'appscale_node',
+  '/stats/local/processes': 'appscale_processes',
+  '/stats/local/proxies': 'appscale_proxies',
+  '/stats/local/rabbitmq': 'appscale_rabbitmq',
+  '/stats/local/push_queues': 'appscale_push_queues',
+  '/stats/local/taskqueue': 'appscale_taskqueue',
+}
+CLUSTER_METRICS_PREFIXES = {
+  '/stats/cluster/nodes': 'appscale_node',
+  '/stats/cluster/processes': 'appscale_processes',
+  '/stats/cluster/proxies': 'appscale_proxies',
+  '/stats/cluster/rabbitmq': 'appscale_rabbitmq',
+  '/stats/cluster/push_queues': 'appscale_push_queues',
+  '/stats/cluster/taskqueue': 'appscale_taskqueue',
+}
+
 
 def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
   """ Creates stats sources and API handlers for providing local stats.
@@ -43,24 +74,37 @@ def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
   """
 
   # Any node provides its node and processes stats
-  node_stats_handler = LocalStatsHandler(NodeStatsSource)
-  processes_stats_handler = LocalStatsHandler(ProcessesStatsSource)
+  node_history = StatsHistory(NodeStatsSource)
+  node_stats_handler = LocalStatsHandler(NodeStatsSource, node_history)
+  node_history_handler = StatsHistoryHandler(node_history)
+  processes_history = StatsHistory(ProcessesStatsSource)
+  processes_stats_handler = LocalStatsHandler(ProcessesStatsSource,
+                                              processes_history)
+  processes_history_handler = StatsHistoryHandler(processes_history)
   if is_lb_node:
     # Only LB nodes provide proxies and service stats
-    proxies_stats_handler = LocalStatsHandler(ProxiesStatsSource)
+    proxies_history = StatsHistory(ProxiesStatsSource)
+    proxies_stats_handler = LocalStatsHandler(ProxiesStatsSource,
+                                              proxies_history)
+    proxies_history_handler = StatsHistoryHandler(proxies_history)
     tq_stats_handler = LocalStatsHandler(TaskqueueStatsSource())
   else:
     # Stub handler for non-LB nodes
     proxies_stats_handler = not_found('Only LB nodes provides proxies stats')
+    proxies_history_handler = proxies_stats_handler
     tq_stats_handler = not_found('Only LB nodes provide TQ service stats')
 
   if is_tq_node:
     # Only TQ nodes provide RabbitMQ stats.
-    rabbitmq_stats_handler = LocalStatsHandler(RabbitMQStatsSource)
+    rabbitmq_history = StatsHistory(RabbitMQStatsSource)
+    rabbitmq_stats_handler = LocalStatsHandler(RabbitMQStatsSource,
+                                               rabbitmq_history)
+    rabbitmq_history_handler = StatsHistoryHandler(rabbitmq_history)
     push_queue_stats_handler = LocalStatsHandler(PushQueueStatsSource)
   else:
     # Stub handler for non-TQ nodes
     rabbitmq_stats_handler = not_found('Only TQ nodes provide RabbitMQ stats')
+    rabbitmq_history_handler = rabbitmq_stats_handler
     push_queue_stats_handler = not_found('Only TQ nodes provide queue stats')
 
   if is_db_node:
@@ -78,26 +122,35 @@ def get_local_stats_api_routes(is_lb_node, is_tq_node, is_db_node):
     ('/stats/local/push_queues', push_queue_stats_handler),
     ('/stats/local/taskqueue', tq_stats_handler),
     ('/stats/local/cassandra', cassandra_stats_handler),
+    ('/stats/local/node/history', node_history_handler),
+    ('/stats/local/processes/history', processes_history_handler),
+    ('/stats/local/proxies/history', proxies_history_handler),
+    ('/stats/local/rabbitmq/history', rabbitmq_history_handler),
   ]
 
 
-def get_cluster_stats_api_routes(is_lb):
+def get_cluster_stats_api_routes(is_lb, pushed_stats=None):
   """ Creates stats sources and API handlers for providing cluster nodes.
   If this node is not Load balancer,
   it creates stub handlers for cluster stats routes.
 
   Args:
     is_lb: A boolean indicating whether this node is load balancer.
+    pushed_stats: An instance of PushedStatsAggregator.
   Returns:
     A list of route-handler tuples.
   """
   if is_lb:
     # Only LB nodes provide cluster stats
-    node_stats_handler = ClusterStatsHandler(cluster_nodes_stats)
-    processes_stats_handler = ClusterStatsHandler(cluster_processes_stats)
-    proxies_stats_handler = ClusterStatsHandler(cluster_proxies_stats)
+    node_stats_handler = ClusterStatsHandler(cluster_nodes_stats,
+                                             pushed_stats)
+    processes_stats_handler = ClusterStatsHandler(cluster_processes_stats,
+                                                  pushed_stats)
+    proxies_stats_handler = ClusterStatsHandler(cluster_proxies_stats,
+                                                pushed_stats)
     taskqueue_stats_handler = ClusterStatsHandler(cluster_taskqueue_stats)
-    rabbitmq_stats_handler = ClusterStatsHandler(cluster_rabbitmq_stats)
+    rabbitmq_stats_handler = ClusterStatsHandler(cluster_rabbitmq_stats,
+                                                 pushed_stats)
     push_queue_stats_handler = ClusterStatsHandler(cluster_push_queues_stats)
     cassandra_stats_handler = ClusterStatsHandler(cluster_cassandra_stats)
   else:
@@ -122,6 +175,68 @@ def get_cluster_stats_api_routes(is_lb):
   ]
 
 
+def get_metrics_api_route(route_items):
+  """ Creates API handler which renders stats provided by local
+  and cluster stats handlers in Prometheus text exposition format.
+
+  Args:
+    route_items: A list of route-handler tuples for local and cluster stats.
+  Returns:
+    A route-handler tuple.
+  """
+  local_stats_handlers = [
+    (LOCAL_METRICS_PREFIXES[route], handler)
+    for route, handler in route_items
+    if route in LOCAL_METRICS_PREFIXES
+    and isinstance(handler, LocalStatsHandler)
+  ]
+  cluster_stats_handlers = [
+    (CLUSTER_METRICS_PREFIXES[route], handler)
+    for route, handler in route_items
+    if route in CLUSTER_METRICS_PREFIXES
+    and isinstance(handler, ClusterStatsHandler)
+  ]
+  handler = MetricsHandler(local_stats_handlers, cluster_stats_handlers)
+  return '/metrics', handler
+
+
+def get_stats_pusher(route_items):
+  """ Creates stats pusher which sends local stats to the head node.
+
+  Args:
+    route_items: A list of route-handler tuples for local stats.
+  Returns:
+    An instance of StatsPusher.
+  """
+  local_stats_handlers = [
+    (route.lstrip('/'), handler) for route, handler in route_items
+    if route in PUSHED_STATS_ROUTES and isinstance(handler, LocalStatsHandler)
+  ]
+  return StatsPusher(local_stats_handlers)
+
+
+def get_background_tasks_signals(coroutine_functions):
+  """ Creates aiohttp signal handlers which start and stop
+  background tasks (e.g. sampling of local stats history).
+
+  Args:
+    coroutine_functions: A list of coroutine functions to run in background.
+  Returns:
+    A tuple (on_startup handler, on_cleanup handler).
+  """
+  tasks = []
+
+  async def start_tasks(app):
+    for coroutine_function in coroutine_functions:
+      tasks.append(asyncio.ensure_future(coroutine_function()))
+
+  async def stop_tasks(app):
+    for task in tasks:
+      task.cancel()
+
+  return start_tasks, stop_tasks
+
+
 def main():
   """ Main. """
   parser = argparse.ArgumentParser()
@@ -129,6 +244,8 @@ def main():
                       help='Output debug-level logging')
   parser.add_argument('--port', type=int, default=constants.HERMES_PORT,
                       help='The port to listen on')
+  parser.add_argument('--push-stats', action='store_true',
+                      help='Push local stats to the head node periodically')
   args = parser.parse_args()
 
   logging.basicConfig(format=LOG_FORMAT, level=logging.INFO)
@@ -142,13 +259,38 @@ def main():
   is_db = (my_ip in appscale_info.get_db_ips())
 
   app = web.Application(middlewares=[verify_secret_middleware])
+  app.on_cleanup.append(close_session)
+
+  pushed_stats = None
+  if is_master:
+    pushed_stats = PushedStatsAggregator({
+      source.method_path: source.stats_model
+      for source in (cluster_nodes_stats, cluster_processes_stats,
+                     cluster_proxies_stats, cluster_rabbitmq_stats)
+    })
 
   route_items = []
   route_items += get_local_stats_api_routes(is_lb, is_tq, is_db)
-  route_items += get_cluster_stats_api_routes(is_master)
+  route_items += get_cluster_stats_api_routes(is_master, pushed_stats)
+  route_items.append(get_metrics_api_route(route_items))
   for route, handler in route_items:
     app.router.add_get(route, handler)
 
+  if is_master:
+    push_handler = PushedStatsHandler(pushed_stats)
+  else:
+    push_handler = not_found('Only head node receives pushed stats')
+  app.router.add_post('/{}'.format(constants.PUSH_STATS_PATH), push_handler)
+
+  background_tasks = [handler.history.run_sampler
+                      for route, handler in route_items
+                      if isinstance(handler, StatsHistoryHandler)]
+  if args.push_stats and not is_master:
+    background_tasks.append(get_stats_pusher(route_items).run)
+  start_tasks, stop_tasks = get_background_tasks_signals(background_tasks)
+  app.on_startup.append(start_tasks)
+  app.on_cleanup.append(stop_tasks)
+
   logger.info("Starting Hermes on port: {}.".format(args.port))
   web.run_app(app, port=args.port, access_log=logger,
               access_log_format='%a "%r" %s %bB %Tfs "%{User-Agent}i"')
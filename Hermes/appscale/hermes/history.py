@@ -0,0 +1,259 @@
+""" Fixed-memory time-series history of local stats snapshots. """
+import array
+import asyncio
+import fnmatch
+import logging
+import math
+import time
+
+import attr
+
+from appscale.hermes.constants import (
+  MISSED, HISTORY_RESOLUTIONS, HISTORY_SAMPLING_INTERVAL, MAX_HISTORY_SERIES
+)
+from appscale.hermes.converter import Meta
+from appscale.hermes.helper import get_current_snapshot
+from appscale.hermes.producers import process_stats, proxy_stats, rabbitmq_stats
+
+logger = logging.getLogger(__name__)
+
+# Attributes used to name items of nested entity lists in series keys.
+# Lists of entities which are not mentioned here are not recorded.
+LIST_ITEM_KEYS = {
+  process_stats.ProcessStats: 'monit_name',
+  proxy_stats.ProxyStats: 'name',
+  rabbitmq_stats.PushQueueStats: 'name',
+}
+
+# Numeric fields which do not make sense as time series.
+IGNORED_FIELDS = {'utc_timestamp', 'pid', 'port'}
+
+
+def flatten_stats(entity, prefix=''):
+  """ Walks stats entity and lists all its numeric values.
+  Nested entities are represented by dot-separated names, e.g.:
+  'cpu.percent', 'partitions_dict./.free' or
+  'processes_stats.datastore-4000.memory.resident'.
+
+  Args:
+    entity: An instance of stats model (@attr.s decorated class).
+    prefix: A string to prepend to series names.
+  Yields:
+    Tuples (series name, numeric value).
+  """
+  for att in attr.fields(entity.__class__):
+    value = getattr(entity, att.name)
+    if value is MISSED or value is None or att.name in IGNORED_FIELDS:
+      continue
+    name = prefix + att.name
+    if Meta.ENTITY in att.metadata:
+      yield from flatten_stats(value, name + '.')
+    elif Meta.ENTITY_DICT in att.metadata:
+      for key, nested in value.items():
+        yield from flatten_stats(nested, '{}.{}.'.format(name, key))
+    elif Meta.ENTITY_LIST in att.metadata:
+      key_attr = LIST_ITEM_KEYS.get(att.metadata[Meta.ENTITY_LIST])
+      if key_attr is None:
+        continue
+      for nested in value:
+        item_key = getattr(nested, key_attr)
+        yield from flatten_stats(nested, '{}.{}.'.format(name, item_key))
+    elif isinstance(value, (int, float)):
+      yield name, value
+
+
+class RingBuffer(object):
+  """ Array-backed ring buffer of values aggregated by time slots.
+  Memory used by the buffer is allocated once and doesn't grow.
+  """
+
+  def __init__(self, step, capacity):
+    """ Initializes ring buffer.
+
+    Args:
+      step: An int - length of time slot in seconds.
+      capacity: An int - number of time slots to keep.
+    """
+    self.step = step
+    self.capacity = capacity
+    # Start time of slot which is stored at each position (NaN if empty).
+    self._slots = array.array('d', [math.nan]) * capacity
+    self._sums = array.array('d', [0.0]) * capacity
+    self._counts = array.array('L', [0]) * capacity
+
+  @property
+  def retention(self):
+    return self.step * self.capacity
+
+  def add(self, timestamp, value):
+    """ Adds a value to the slot corresponding to timestamp.
+    Values which fall into the same slot are averaged.
+
+    Args:
+      timestamp: A float - UTC timestamp of the value.
+      value: A number to record.
+    """
+    slot = timestamp - timestamp % self.step
+    position = int(slot // self.step) % self.capacity
+    if self._slots[position] != slot:
+      self._slots[position] = slot
+      self._sums[position] = 0.0
+      self._counts[position] = 0
+    self._sums[position] += value
+    self._counts[position] += 1
+
+  def get_range(self, start, end):
+    """ Lists averaged values of slots within [start, end] range.
+
+    Args:
+      start: A float - UTC timestamp of the range start.
+      end: A float - UTC timestamp of the range end.
+    Returns:
+      A list of (slot start timestamp, average value) pairs ordered by time.
+    """
+    last_slot = end - end % self.step
+    # The buffer can't hold more than capacity slots.
+    first_slot = max(start - start % self.step,
+                     last_slot - (self.capacity - 1) * self.step)
+    slots_count = int((last_slot - first_slot) // self.step) + 1
+    result = []
+    for index in range(slots_count):
+      slot = first_slot + index * self.step
+      position = int(slot // self.step) % self.capacity
+      if self._slots[position] == slot:
+        result.append((slot, self._sums[position] / self._counts[position]))
+    return result
+
+
+class MetricSeries(object):
+  """ Multi-resolution history of a single metric. """
+
+  def __init__(self, resolutions):
+    """ Initializes series.
+
+    Args:
+      resolutions: A list of (step, capacity) pairs.
+    """
+    self.buffers = [RingBuffer(step, capacity)
+                    for step, capacity in resolutions]
+    self.last_update = None
+
+  def add(self, timestamp, value):
+    for buffer in self.buffers:
+      buffer.add(timestamp, value)
+    self.last_update = timestamp
+
+  def pick_buffer(self, start, end, step=None):
+    """ Chooses buffer which should be used for answering a query.
+
+    Args:
+      start: A float - UTC timestamp of the range start.
+      end: A float - UTC timestamp of the range end.
+      step: An int - desired resolution in seconds (optional).
+    Returns:
+      An instance of RingBuffer.
+    """
+    if step is not None:
+      # The finest resolution which is not finer than requested.
+      candidates = [buffer for buffer in self.buffers if buffer.step >= step]
+      if candidates:
+        return min(candidates, key=lambda buffer: buffer.step)
+      return max(self.buffers, key=lambda buffer: buffer.step)
+    # The finest resolution which covers the whole range.
+    for buffer in sorted(self.buffers, key=lambda buffer: buffer.step):
+      if end - buffer.retention <= start:
+        return buffer
+    return max(self.buffers, key=lambda buffer: buffer.retention)
+
+
+class StatsHistory(object):
+  """ Keeps history of numeric fields of local stats snapshots. """
+
+  def __init__(self, stats_source, resolutions=HISTORY_RESOLUTIONS,
+               max_series=MAX_HISTORY_SERIES):
+    """ Initializes history.
+
+    Args:
+      stats_source: An object with method get_current.
+      resolutions: A list of (step, capacity) pairs.
+      max_series: An int - the maximum number of series to keep.
+    """
+    self.stats_source = stats_source
+    self.resolutions = resolutions
+    self.max_series = max_series
+    self.series = {}
+    self.skipped_series = set()
+    self.latest_snapshot = None
+    self._retention = max(step * capacity for step, capacity in resolutions)
+
+  def add_snapshot(self, snapshot):
+    """ Records all numeric values of the snapshot.
+
+    Args:
+      snapshot: An instance of stats snapshot with utc_timestamp field.
+    """
+    timestamp = snapshot.utc_timestamp
+    # Forget about series which are not reported anymore
+    # (e.g. a process was stopped).
+    expired = [name for name, series in self.series.items()
+               if series.last_update < timestamp - self._retention]
+    for name in expired:
+      del self.series[name]
+
+    skipped = set()
+    for name, value in flatten_stats(snapshot):
+      series = self.series.get(name)
+      if series is None:
+        if len(self.series) >= self.max_series:
+          skipped.add(name)
+          continue
+        series = self.series[name] = MetricSeries(self.resolutions)
+      series.add(timestamp, value)
+    self.latest_snapshot = snapshot
+
+    if skipped - self.skipped_series:
+      logger.warning('Stats history is limited to {} series, {} series are '
+                     'not recorded'.format(self.max_series, len(skipped)))
+    self.skipped_series = skipped
+
+  def query(self, fields, start, end=None, step=None):
+    """ Lists values of selected series within a time range.
+
+    Args:
+      fields: A list of series names or shell-style patterns,
+        e.g.: ['cpu.percent', 'processes_stats.*.memory.unique'].
+      start: A float - UTC timestamp of the range start.
+      end: A float - UTC timestamp of the range end (now by default).
+      step: An int - desired resolution in seconds (optional).
+    Returns:
+      A dict where key is a series name and value is
+      a list of (timestamp, value) pairs.
+    """
+    if end is None:
+      end = time.time()
+    result = {}
+    for name, series in self.series.items():
+      if not any(fnmatch.fnmatchcase(name, pattern) for pattern in fields):
+        continue
+      buffer = series.pick_buffer(start, end, step)
+      result[name] = buffer.get_range(start, end)
+    return result
+
+  async def run_sampler(self, interval=HISTORY_SAMPLING_INTERVAL):
+    """ Periodically collects snapshots from stats source.
+
+    Args:
+      interval: A number of seconds between samples.
+    """
+    while True:
+      started = time.time()
+      try:
+        snapshot = await get_current_snapshot(self.stats_source)
+        self.add_snapshot(snapshot)
+      except asyncio.CancelledError:
+        raise
+      except Exception as err:
+        logger.warning('Failed to sample {} ({})'.format(
+          self.stats_source, err))
+      elapsed = time.time() - started
+      await asyncio.sleep(max(interval - elapsed, 0))
@@ -0,0 +1,196 @@
+""" Renders stats snapshots in Prometheus text exposition format.
+See https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+import re
+
+import attr
+
+from appscale.hermes.constants import MISSED
+from appscale.hermes.converter import Meta
+from appscale.hermes.producers import (
+  process_stats, proxy_stats, rabbitmq_stats, taskqueue_stats
+)
+
+# The content type of text exposition format.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Fields of nested list items which are used as labels of the item samples.
+# Lists of entities which are not mentioned here are not rendered.
+LIST_ITEM_LABELS = {
+  process_stats.ProcessStats: (
+    'monit_name', 'unified_service_name', 'application_id', 'port'),
+  proxy_stats.ProxyStats: ('name', 'unified_service_name', 'application_id'),
+  proxy_stats.HAProxyServerStats: ('svname',),
+  rabbitmq_stats.PushQueueStats: ('name',),
+  taskqueue_stats.InstanceStatsSnapshot: ('ip_port',),
+}
+
+# Label names used for keys of dictionaries.
+DICT_KEY_LABELS = {
+  'partitions_dict': 'mountpoint',
+  'by_pb_method': 'method',
+  'by_rest_method': 'method',
+  'by_pb_status': 'status',
+  'by_rest_status': 'status',
+}
+
+# Numeric fields which are not rendered as metrics.
+IGNORED_FIELDS = {'utc_timestamp', 'pid', 'port', 'iid', 'sid', 'type'}
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def metric_name(*parts):
+  """ Builds a valid metric name from name parts.
+
+  Args:
+    parts: Strings to join.
+  Returns:
+    A string - metric name.
+  """
+  return _INVALID_NAME_CHARS.sub('_', '_'.join(parts))
+
+
+def _escape(label_value):
+  return (str(label_value).replace('\\', r'\\')
+          .replace('\n', r'\n').replace('"', r'\"'))
+
+
+def _render_labels(labels):
+  if not labels:
+    return ''
+  return '{{{}}}'.format(','.join(
+    '{}="{}"'.format(name, _escape(value)) for name, value in labels
+  ))
+
+
+def _is_number(value):
+  return isinstance(value, (int, float)) and value is not MISSED
+
+
+def render_family(name, rows, field, dict_label='key'):
+  """ Renders a single metric family.
+
+  Args:
+    name: A string - metric name.
+    rows: A list of (entity, labels) pairs.
+    field: A string - name of entity attribute holding a number
+      or a dict of numbers.
+    dict_label: A string - label name for keys of dict value.
+  Yields:
+    Lines of text exposition format.
+  """
+  header_rendered = False
+  for entity, labels in rows:
+    value = getattr(entity, field)
+    if isinstance(value, dict):
+      samples = [
+        (labels + ((dict_label, key),), item_value)
+        for key, item_value in value.items() if _is_number(item_value)
+      ]
+    elif _is_number(value):
+      samples = [(labels, value)]
+    else:
+      continue
+    for sample_labels, sample_value in samples:
+      if not header_rendered:
+        yield '# TYPE {} gauge\n'.format(name)
+        header_rendered = True
+      # Booleans (e.g. alarms) are rendered as 0 or 1.
+      yield '{}{} {}\n'.format(name, _render_labels(sample_labels),
+                               float(sample_value))
+
+
+def render_rows(stats_class, rows, prefix):
+  """ Renders samples of multiple entities of the same stats class.
+  Samples are generated directly from entity attributes, so all values
+  of the same metric family are grouped together as the format requires.
+
+  Args:
+    stats_class: An @attr.s decorated class representing stats model.
+    rows: A list of (entity, labels) pairs, where labels
+      is a tuple of (name, value) pairs.
+    prefix: A string - name prefix for metrics of the class.
+  Yields:
+    Lines of text exposition format.
+  """
+  for att in attr.fields(stats_class):
+    if att.name in IGNORED_FIELDS:
+      continue
+    name = metric_name(prefix, att.name)
+    get_value = lambda entity, att_name=att.name: getattr(entity, att_name)
+
+    if Meta.ENTITY in att.metadata:
+      nested_rows = [
+        (get_value(entity), labels) for entity, labels in rows
+        if get_value(entity) not in (None, MISSED)
+      ]
+      yield from render_rows(att.metadata[Meta.ENTITY], nested_rows, name)
+
+    elif Meta.ENTITY_DICT in att.metadata:
+      label_name = DICT_KEY_LABELS.get(att.name, 'key')
+      nested_rows = [
+        (nested, labels + ((label_name, key),))
+        for entity, labels in rows
+        for key, nested in (get_value(entity) or {}).items()
+      ]
+      yield from render_rows(att.metadata[Meta.ENTITY_DICT], nested_rows,
+                             name)
+
+    elif Meta.ENTITY_LIST in att.metadata:
+      item_class = att.metadata[Meta.ENTITY_LIST]
+      label_fields = LIST_ITEM_LABELS.get(item_class)
+      if label_fields is None:
+        continue
+      nested_rows = [
+        (item, labels + tuple(
+          (field, getattr(item, field)) for field in label_fields
+          if getattr(item, field) not in (None, MISSED)
+        ))
+        for entity, labels in rows
+        for item in (get_value(entity) or [])
+      ]
+      item_prefix = metric_name(
+        'appscale', getattr(item_class, '_include_list_name', att.name))
+      yield from render_rows(item_class, nested_rows, item_prefix)
+
+    else:
+      yield from render_family(name, rows, att.name,
+                               DICT_KEY_LABELS.get(att.name, 'key'))
+
+
+def render_snapshots(prefix, snapshots):
+  """ Renders snapshots of the same kind (e.g. from different nodes).
+
+  Args:
+    prefix: A string - name prefix for metrics, e.g. 'appscale_node'.
+    snapshots: A list of (snapshot, labels) pairs.
+  Yields:
+    Lines of text exposition format.
+  """
+  if not snapshots:
+    return
+  yield from render_rows(type(snapshots[0][0]), snapshots, prefix)
+
+
+def render_latency_histograms(name, histograms):
+  """ Renders latency histograms.
+
+  Args:
+    name: A string - metric name.
+    histograms: A list of (labels, LatencyHistogram) pairs.
+  Yields:
+    Lines of text exposition format.
+  """
+  if not histograms:
+    return
+  yield '# TYPE {} histogram\n'.format(name)
+  for labels, histogram in histograms:
+    for bound, count in histogram.cumulative_counts():
+      bucket_labels = labels + (('le', '+Inf' if bound == float('inf')
+                                 else repr(bound)),)
+      yield '{}_bucket{} {}\n'.format(name, _render_labels(bucket_labels),
+                                      count)
+    yield '{}_sum{} {}\n'.format(name, _render_labels(labels), histogram.sum)
+    yield '{}_count{} {}\n'.format(name, _render_labels(labels),
+                                   histogram.count)
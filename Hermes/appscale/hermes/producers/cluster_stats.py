@@ -1,6 +1,6 @@
 """ Implementation of stats sources for cluster stats. """
 import asyncio
-import inspect
+import collections
 import logging
 import time
 import random
@@ -9,6 +9,8 @@ import aiohttp
 
 from appscale.common import appscale_info
 from appscale.hermes import constants, converter
+from appscale.hermes.client_session import get_session, LatencyHistogram
+from appscale.hermes.helper import get_current_snapshot
 from appscale.hermes.producers import (
   proxy_stats, node_stats, process_stats, rabbitmq_stats,
   taskqueue_stats, cassandra_stats
@@ -34,6 +36,8 @@ class ClusterStatsSource(object):
     self.method_path = method_path
     self.stats_model = stats_model
     self.local_stats_source = local_stats_source
+    # Per-node histograms of remote fetch latency.
+    self.fetch_latency = collections.defaultdict(LatencyHistogram)
 
   async def get_current(self, max_age=None, include_lists=None,
                         exclude_nodes=None):
@@ -90,10 +94,7 @@ class ClusterStatsSource(object):
     """
     if node_ip == appscale_info.get_private_ip():
       try:
-        snapshot = self.local_stats_source.get_current()
-        if inspect.isawaitable(snapshot):
-          snapshot = await snapshot
-        return snapshot
+        return await get_current_snapshot(self.local_stats_source)
       except Exception as err:
         logger.error("Failed to prepare local stats: {err}".format(err=err))
         raise RemoteHermesError(str(err))
@@ -125,26 +126,29 @@ class ClusterStatsSource(object):
     url = "http://{ip}:{port}/{path}".format(
       ip=node_ip, port=constants.HERMES_PORT, path=self.method_path)
 
+    session = get_session()
+    start = time.time()
     try:
-      async with aiohttp.ClientSession() as session:
-        awaitable_get = session.get(
-          url, headers=headers, json=arguments,
-          timeout=constants.REMOTE_REQUEST_TIMEOUT
-        )
-        async with awaitable_get as resp:
-          if resp.status >= 400:
-            err_message = 'HTTP {}: {}'.format(resp.status, resp.reason)
-            resp_text = await resp.text()
-            if resp_text:
-              err_message += '. {}'.format(resp_text)
-            logger.error("Failed to get {} ({})".format(url, err_message))
-            raise RemoteHermesError(err_message)
-          snapshot = await resp.json(content_type=None)
-          return converter.stats_from_dict(self.stats_model, snapshot)
-
+      awaitable_get = session.get(
+        url, headers=headers, json=arguments,
+        timeout=constants.REMOTE_REQUEST_TIMEOUT
+      )
+      async with awaitable_get as resp:
+        if resp.status >= 400:
+          err_message = 'HTTP {}: {}'.format(resp.status, resp.reason)
+          resp_text = await resp.text()
+          if resp_text:
+            err_message += '. {}'.format(resp_text)
+          logger.error("Failed to get {} ({})".format(url, err_message))
+          raise RemoteHermesError(err_message)
+        snapshot = await resp.json(content_type=None)
     except aiohttp.ClientError as err:
       logger.error("Failed to get {} ({})".format(url, err))
       raise RemoteHermesError(str(err))
+    finally:
+      self.fetch_latency[node_ip].observe(time.time() - start)
+
+    return converter.stats_from_dict(self.stats_model, snapshot)
 
 
 def get_random_lb_node():
@@ -108,6 +108,35 @@ PROCESS_ATTRS = (
   'connections', 'threads', 'cmdline'
 )
 
+# Long-lived process handles (PID -> psutil.Process). Reusing handles
+# makes cpu_percent meaningful: it is measured since the previous call.
+_process_handles = {}
+
+
+def _get_process(pid):
+  """ Returns cached handle for the process or creates a new one.
+
+  Args:
+    pid: An int - Process ID.
+  Returns:
+    An instance of psutil.Process.
+  Raises:
+    psutil.NoSuchProcess if process doesn't exist.
+  """
+  process = _process_handles.get(pid)
+  # is_running also detects if PID was reused by another process.
+  if process is None or not process.is_running():
+    process = psutil.Process(pid)
+    _process_handles[pid] = process
+  return process
+
+
+def _forget_stopped_processes():
+  """ Removes handles of processes which are not running anymore. """
+  for pid, process in list(_process_handles.items()):
+    if not process.is_running():
+      del _process_handles[pid]
+
 
 class ProcessesStatsSource(object):
 
@@ -121,6 +150,7 @@ class ProcessesStatsSource(object):
       An instance ofProcessesStatsSnapshot.
     """
     start = time.time()
+    _forget_stopped_processes()
     systemctl_show = subprocess.check_output(SYSTEMCTL_SHOW).decode()
     processes_stats = []
     private_ip = appscale_info.get_private_ip()
@@ -172,8 +202,8 @@ def _process_stats(pid, service, ext_name, private_ip):
     the specified process and its children.
   """
   # Get information about processes hierarchy (the process and its children)
-  process = psutil.Process(pid)
-  children_info = [child.as_dict(PROCESS_ATTRS)
+  process = _get_process(pid)
+  children_info = [_get_process(child.pid).as_dict(PROCESS_ATTRS)
                    for child in process.children()]
   process_info = process.as_dict(PROCESS_ATTRS)
 
@@ -18,6 +18,7 @@ from appscale.hermes.constants import (
   HAPROXY_SERVICES_CONFIGS_DIR, MISSED,
 )
 from appscale.hermes.converter import include_list_name, Meta
+from appscale.hermes.helper import stats_executor
 from appscale.hermes.unified_service_names import find_service_by_pxname
 
 logger = logging.getLogger(__name__)
@@ -601,6 +602,19 @@ def get_frontend_ip_port(configs_dir, proxy_name):
                             .format(proxy_name, configs_dir))
 
 
+def _in_maintenance(status):
+  """ Checks if server status indicates that server is in maintenance.
+  Servers removed from a running HAProxy are kept in maintenance
+  until the next reload.
+
+  Args:
+    status: A str - status of the server (e.g. 'UP', 'MAINT (via x/y)').
+  Returns:
+    True if server doesn't accept traffic because of maintenance.
+  """
+  return bool(status) and status.startswith('MAINT')
+
+
 def _convert_ints_and_missing(row):
   """ Converts cells containing numeric values (but as strings) to integers.
   It also appends MISSED if row does not contain all cell.
@@ -719,7 +733,9 @@ async def get_stats_from_one_haproxy(socket_path, configs_dir, net_connections):
       accurate_frontend_scur=max(psutil_connections, frontends[0].scur),
       frontend=frontends[0], backend=backends[0],
       servers=servers, listeners=listeners,
-      servers_count=len(servers), listeners_count=len(listeners)
+      servers_count=sum(1 for server in servers
+                        if not _in_maintenance(server.status)),
+      listeners_count=len(listeners)
     )
     proxy_stats_list.append(proxy_stats)
 
@@ -748,7 +764,9 @@ class ProxiesStatsSource(object):
     """
     start = time.time()
 
-    net_connections = psutil.net_connections()
+    loop = asyncio.get_event_loop()
+    net_connections = await loop.run_in_executor(stats_executor,
+                                                 psutil.net_connections)
     proxy_stats_list = []
     for haproxy_process_name, info in HAPROXY_PROCESSES.items():
       logger.debug("Processing {} haproxy stats".format(haproxy_process_name))
@@ -769,10 +787,13 @@ async def get_service_instances(stats_socket_path, pxname):
   safe_pxname = re.escape(pxname)
   ip_port_list = []
   ip_port_pattern = re.compile(
-    "\n{proxy},{proxy}-(?P<port_ip>[.\w]+:\d+)".format(proxy=safe_pxname)
+    "\n{proxy},{proxy}-(?P<port_ip>[.\w]+:\d+),(?P<row>[^\n]*)"
+    .format(proxy=safe_pxname)
   )
   stats_buf = await get_stats(stats_socket_path)
   stats_csv = stats_buf.read()
   for match in re.finditer(ip_port_pattern, stats_csv):
+    if _in_maintenance(match.group("row").split(",")[STATUS - QCUR]):
+      continue
     ip_port_list.append(match.group("port_ip"))
   return ip_port_list
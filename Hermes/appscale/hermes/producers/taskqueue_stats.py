@@ -7,6 +7,7 @@ import time
 import aiohttp
 import attr
 
+from appscale.hermes.client_session import get_session
 from appscale.hermes.constants import REMOTE_REQUEST_TIMEOUT
 from appscale.hermes.converter import include_list_name, Meta
 from appscale.hermes.producers import proxy_stats
@@ -89,11 +90,10 @@ class TaskqueueStatsSource(object):
       max_age=self.IGNORE_RECENT_OLDER_THAN
     )
     try:
-      async with aiohttp.ClientSession() as session:
-        awaitable_get = session.get(url, timeout=REMOTE_REQUEST_TIMEOUT)
-        async with awaitable_get as resp:
-          resp.raise_for_status()
-          stats_body = await resp.json(content_type=None)
+      awaitable_get = get_session().get(url, timeout=REMOTE_REQUEST_TIMEOUT)
+      async with awaitable_get as resp:
+        resp.raise_for_status()
+        stats_body = await resp.json(content_type=None)
     except aiohttp.ClientError as err:
       msg = "Failed to get {url} ({err})".format(url=url, err=err)
       logger.error(msg)
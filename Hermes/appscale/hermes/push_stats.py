@@ -0,0 +1,284 @@
+""" Push-based delivery of local stats to the Hermes on the head node.
+
+Every node which runs in push mode periodically sends its local stats
+to the head node. Only the difference from the previously sent version
+is sent, so regular pushes are compact. Head node keeps the latest
+version of stats of every node in memory and answers cluster stats
+requests using it.
+"""
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from appscale.common import appscale_info
+from appscale.hermes import constants
+from appscale.hermes.client_session import get_session
+from appscale.hermes.converter import stats_from_dict, stats_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Keys used in delta dictionaries. Stats fields never start with '$'.
+REMOVED_KEYS = '$removed'
+LIST_ITEMS = '$list'
+
+# A sentinel indicating that value wasn't changed.
+_UNCHANGED = object()
+
+
+class ResyncRequired(ValueError):
+  """ Indicates that delta can't be applied to the stored stats. """
+  pass
+
+
+class InvalidStats(ResyncRequired):
+  """ Indicates that pushed stats can't be converted to stats snapshot. """
+  pass
+
+
+def make_delta(old, new):
+  """ Encodes difference between two JSON-serializable values.
+
+  Args:
+    old: A previous version of value.
+    new: A current version of value.
+  Returns:
+    A delta which can be applied to old value by apply_delta
+    or _UNCHANGED sentinel if values are equal.
+  """
+  if isinstance(old, dict) and isinstance(new, dict):
+    delta = {}
+    for key, value in new.items():
+      if key not in old:
+        delta[key] = value
+        continue
+      value_delta = make_delta(old[key], value)
+      if value_delta is not _UNCHANGED:
+        delta[key] = value_delta
+    removed = [key for key in old if key not in new]
+    if removed:
+      delta[REMOVED_KEYS] = removed
+    return delta or _UNCHANGED
+
+  if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+    items = {}
+    for index, (old_item, new_item) in enumerate(zip(old, new)):
+      item_delta = make_delta(old_item, new_item)
+      if item_delta is not _UNCHANGED:
+        items[str(index)] = item_delta
+    return {LIST_ITEMS: items} if items else _UNCHANGED
+
+  return _UNCHANGED if old == new else new
+
+
+def apply_delta(base, delta):
+  """ Builds a new version of value by applying delta to base version.
+
+  Args:
+    base: A previous version of value.
+    delta: A delta generated by make_delta.
+  Returns:
+    A current version of value.
+  """
+  if isinstance(delta, dict):
+    if isinstance(base, list) and LIST_ITEMS in delta:
+      result = list(base)
+      for index, item_delta in delta[LIST_ITEMS].items():
+        result[int(index)] = apply_delta(result[int(index)], item_delta)
+      return result
+    if isinstance(base, dict):
+      result = dict(base)
+      for key in delta.get(REMOVED_KEYS, []):
+        result.pop(key, None)
+      for key, value_delta in delta.items():
+        if key == REMOVED_KEYS:
+          continue
+        if key in result:
+          result[key] = apply_delta(result[key], value_delta)
+        else:
+          result[key] = value_delta
+      return result
+  return delta
+
+
+class PushedNodeStats(object):
+  """ The latest version of stats of specific kind pushed by a node. """
+
+  def __init__(self, stats_dict, snapshot, seq):
+    self.stats_dict = stats_dict
+    self.snapshot = snapshot
+    self.seq = seq
+    self.received_at = time.time()
+
+
+class PushedStatsAggregator(object):
+  """ Keeps stats pushed by cluster nodes. """
+
+  def __init__(self, stats_models,
+               expiration=constants.PUSHED_STATS_EXPIRATION):
+    """ Initializes aggregator.
+
+    Args:
+      stats_models: A dict where key is kind of stats and value is
+        an @attr.s decorated class representing stats snapshot.
+      expiration: A number of seconds after which stats of a node
+        which stopped pushing are forgotten.
+    """
+    self.stats_models = stats_models
+    self.expiration = expiration
+    # Kind (local stats path) -> node IP -> PushedNodeStats.
+    self._stats = {}
+
+  def update(self, node_ip, kind, base_seq, seq, delta):
+    """ Applies stats pushed by a node.
+
+    Args:
+      node_ip: A string - IP of the node which pushed stats.
+      kind: A string - path of local stats route, e.g. 'stats/local/node'.
+      base_seq: An int - sequence number of the version delta is based on,
+        or None if delta contains full stats.
+      seq: An int - sequence number of the pushed version.
+      delta: A delta or full stats dictionary.
+    Raises:
+      ResyncRequired if stored version doesn't match base_seq.
+      InvalidStats if pushed stats can't be converted to stats snapshot.
+    """
+    stats_model = self.stats_models.get(kind)
+    if stats_model is None:
+      raise InvalidStats('Unknown kind of stats: {}'.format(kind))
+    stats_per_node = self._stats.setdefault(kind, {})
+    if base_seq is None:
+      stats_dict = delta
+    else:
+      stored = stats_per_node.get(node_ip)
+      if stored is None or stored.seq != base_seq:
+        raise ResyncRequired('{} stats of {} are not based on version {}'
+                             .format(kind, node_ip, base_seq))
+      try:
+        stats_dict = apply_delta(stored.stats_dict, delta)
+      except (IndexError, ValueError, TypeError, AttributeError) as err:
+        raise InvalidStats('Bad delta of {} stats of {} ({})'
+                           .format(kind, node_ip, err))
+
+    # Stats are converted right away, so a node which pushes stats
+    # of unexpected format doesn't break cluster stats of other nodes.
+    try:
+      snapshot = stats_from_dict(stats_model, stats_dict)
+    except (KeyError, ValueError, TypeError, AttributeError) as err:
+      if base_seq is None:
+        # Stored version doesn't reflect current state of the node anymore.
+        stats_per_node.pop(node_ip, None)
+      raise InvalidStats('Bad {} stats of {} ({})'
+                         .format(kind, node_ip, err))
+    stats_per_node[node_ip] = PushedNodeStats(stats_dict, snapshot, seq)
+
+  def get_snapshots(self, kind):
+    """ Lists the latest snapshots pushed by nodes.
+
+    Args:
+      kind: A string - path of local stats route, e.g. 'stats/local/node'.
+    Returns:
+      A dict where key is node IP and value is stats snapshot.
+    """
+    now = time.time()
+    stats_per_node = self._stats.get(kind, {})
+    expired = [node_ip for node_ip, stats in stats_per_node.items()
+               if now - stats.received_at > self.expiration]
+    for node_ip in expired:
+      del stats_per_node[node_ip]
+    return {
+      node_ip: stats.snapshot
+      for node_ip, stats in stats_per_node.items()
+    }
+
+
+class StatsPusher(object):
+  """ Periodically pushes local stats to the head node. """
+
+  def __init__(self, local_stats_handlers, interval=constants.PUSH_INTERVAL):
+    """ Initializes stats pusher.
+
+    Args:
+      local_stats_handlers: A list of (kind, LocalStatsHandler) pairs.
+      interval: A number of seconds between pushes.
+    """
+    self.local_stats_handlers = local_stats_handlers
+    self.interval = interval
+    # Kind -> (seq, stats dict) of the last version accepted by head node.
+    self._pushed = {}
+    self._seq = 0
+
+  async def _prepare_payload(self):
+    """ Collects local stats and encodes them as deltas from pushed versions.
+
+    Returns:
+      A tuple (payload dict, dict of new versions per kind).
+    """
+    self._seq += 1
+    kinds = {}
+    new_versions = {}
+    for kind, handler in self.local_stats_handlers:
+      try:
+        snapshot = await handler.get_snapshot(self.interval)
+      except Exception as err:
+        logger.warning('Failed to prepare {} for push ({})'.format(kind, err))
+        continue
+      stats_dict = stats_to_dict(snapshot, handler.default_include_lists)
+      new_versions[kind] = (self._seq, stats_dict)
+      pushed = self._pushed.get(kind)
+      if pushed is None:
+        kinds[kind] = {'base': None, 'seq': self._seq, 'delta': stats_dict}
+        continue
+      base_seq, base_dict = pushed
+      delta = make_delta(base_dict, stats_dict)
+      kinds[kind] = {
+        'base': base_seq, 'seq': self._seq,
+        'delta': {} if delta is _UNCHANGED else delta
+      }
+    payload = {'node': appscale_info.get_private_ip(), 'kinds': kinds}
+    return payload, new_versions
+
+  async def push(self):
+    """ Sends local stats to the head node. """
+    payload, new_versions = await self._prepare_payload()
+    url = 'http://{ip}:{port}/{path}'.format(
+      ip=appscale_info.get_headnode_ip(), port=constants.HERMES_PORT,
+      path=constants.PUSH_STATS_PATH)
+    headers = {constants.SECRET_HEADER: appscale_info.get_secret()}
+    try:
+      awaitable_post = get_session().post(
+        url, headers=headers, json=payload,
+        timeout=constants.REMOTE_REQUEST_TIMEOUT
+      )
+      async with awaitable_post as resp:
+        resp.raise_for_status()
+        result = await resp.json(content_type=None)
+    except aiohttp.ClientError as err:
+      # Next push will send full stats.
+      logger.warning('Failed to push stats to {} ({})'.format(url, err))
+      self._pushed = {}
+      return
+    except asyncio.TimeoutError:
+      logger.warning('Timed out pushing stats to {}'.format(url))
+      self._pushed = {}
+      return
+
+    self._pushed.update(new_versions)
+    for kind in result.get('resync', []):
+      self._pushed.pop(kind, None)
+
+  async def run(self):
+    """ Pushes local stats with fixed interval. """
+    while True:
+      started = time.time()
+      try:
+        await self.push()
+      except asyncio.CancelledError:
+        raise
+      except Exception as err:
+        logger.exception('Unexpected error while pushing stats ({})'
+                         .format(err))
+        self._pushed = {}
+      elapsed = time.time() - started
+      await asyncio.sleep(max(self.interval - elapsed, 0))
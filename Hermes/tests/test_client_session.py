@@ -0,0 +1,42 @@
+import pytest
+
+from appscale.hermes import client_session
+
+
+class TestSharedSession:
+
+  @staticmethod
+  @pytest.mark.asyncio
+  async def test_session_is_reused():
+    session = client_session.get_session()
+    assert client_session.get_session() is session
+    await client_session.close_session()
+    assert session.closed
+    new_session = client_session.get_session()
+    assert new_session is not session
+    await client_session.close_session()
+
+
+class TestLatencyHistogram:
+
+  @staticmethod
+  def test_observe():
+    histogram = client_session.LatencyHistogram(buckets=(0.1, 1.0))
+    for latency in (0.05, 0.1, 0.5, 0.7, 3.0):
+      histogram.observe(latency)
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(4.35)
+    assert histogram.counts == [2, 2, 1]
+    assert histogram.cumulative_counts() == [
+      (0.1, 2), (1.0, 4), (float('inf'), 5)
+    ]
+
+  @staticmethod
+  def test_quantile():
+    histogram = client_session.LatencyHistogram(buckets=(0.1, 1.0))
+    assert histogram.quantile(0.5) is None
+    for latency in (0.05, 0.06, 0.5, 5.0):
+      histogram.observe(latency)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == float('inf')
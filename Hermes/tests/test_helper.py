@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+
+from appscale.hermes import helper
+
+
+class BlockingSource(object):
+  calls = 0
+
+  @classmethod
+  def get_current(cls):
+    cls.calls += 1
+    return threading.current_thread()
+
+
+class AsyncSource(object):
+
+  @staticmethod
+  async def get_current():
+    return threading.current_thread()
+
+
+@pytest.mark.asyncio
+async def test_blocking_source_runs_in_executor():
+  snapshot = await helper.get_current_snapshot(BlockingSource)
+  assert snapshot is not threading.current_thread()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_collection():
+  BlockingSource.calls = 0
+  results = await asyncio.gather(*[
+    helper.get_current_snapshot(BlockingSource) for _ in range(5)
+  ])
+  assert BlockingSource.calls == 1
+  assert len(set(results)) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_source_runs_in_loop():
+  snapshot = await helper.get_current_snapshot(AsyncSource)
+  assert snapshot is threading.current_thread()
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+
+import attr
+import pytest
+from mock import MagicMock
+
+from appscale.hermes import converter
+from appscale.hermes.handlers import StatsHistoryHandler
+from appscale.hermes.history import flatten_stats, RingBuffer, StatsHistory
+from appscale.hermes.producers import node_stats, process_stats
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_DATA_DIR = os.path.join(CUR_DIR, 'test-data')
+
+
+def load_snapshot(json_file_name, stats_class, node_ip):
+  with open(os.path.join(TEST_DATA_DIR, json_file_name)) as json_file:
+    raw_dict = json.load(json_file)
+  return converter.stats_from_dict(stats_class, raw_dict[node_ip])
+
+
+class TestRingBuffer:
+
+  @staticmethod
+  def test_values_are_averaged_within_slot():
+    buffer = RingBuffer(step=10, capacity=6)
+    buffer.add(1000, 1)
+    buffer.add(1005, 3)
+    buffer.add(1010, 10)
+    assert buffer.get_range(1000, 1020) == [(1000, 2.0), (1010, 10.0)]
+
+  @staticmethod
+  def test_old_slots_are_overwritten():
+    buffer = RingBuffer(step=10, capacity=3)
+    for timestamp in range(1000, 1060, 10):
+      buffer.add(timestamp, timestamp)
+    assert buffer.get_range(0, 1050) == [
+      (1030, 1030.0), (1040, 1040.0), (1050, 1050.0)
+    ]
+
+  @staticmethod
+  def test_range_is_limited_by_capacity():
+    buffer = RingBuffer(step=10, capacity=6)
+    buffer.add(1000, 1)
+    assert buffer.get_range(1000, 1e20) == []
+    assert buffer.get_range(1e20 - 5000, 1e20) == []
+    assert buffer.get_range(0, 1050) == [(1000, 1.0)]
+
+
+class TestStatsHistory:
+
+  @staticmethod
+  def test_flatten_node_stats():
+    snapshot = load_snapshot('node-stats.json', node_stats.NodeStatsSnapshot,
+                             '192.168.33.10')
+    values = dict(flatten_stats(snapshot))
+    assert values['cpu.percent'] == 0.0
+    assert values['memory.available'] == 1157386240
+    assert values['partitions_dict./.free'] == 36059422720
+    assert 'utc_timestamp' not in values
+    assert 'private_ip' not in values
+
+  @staticmethod
+  def test_flatten_processes_stats():
+    snapshot = load_snapshot('processes-stats.json',
+                             process_stats.ProcessesStatsSnapshot,
+                             '192.168.33.10')
+    values = dict(flatten_stats(snapshot))
+    assert 'processes_stats.zookeeper.threads_num' in values
+    assert 'processes_stats.zookeeper.cpu.percent' in values
+    assert 'processes_stats.zookeeper.pid' not in values
+
+  @staticmethod
+  def test_query():
+    snapshot = load_snapshot('node-stats.json', node_stats.NodeStatsSnapshot,
+                             '192.168.33.10')
+    history = StatsHistory(None, resolutions=((10, 6), (60, 10)))
+    for delta, percent in ((0, 10.0), (10, 20.0), (20, 30.0), (30, 40.0)):
+      cpu = attr.evolve(snapshot.cpu, percent=percent)
+      history.add_snapshot(attr.evolve(
+        snapshot, utc_timestamp=1200 + delta, cpu=cpu))
+
+    series = history.query(['cpu.percent', 'memory.*'], start=1200, end=1230)
+    assert set(series) == {
+      'cpu.percent', 'memory.total', 'memory.available', 'memory.used'
+    }
+    assert series['cpu.percent'] == [
+      (1200, 10.0), (1210, 20.0), (1220, 30.0), (1230, 40.0)
+    ]
+
+    series = history.query(['cpu.percent'], start=1200, end=1230, step=60)
+    assert series['cpu.percent'] == [(1200, 25.0)]
+
+  @staticmethod
+  def test_number_of_series_is_limited():
+    snapshot = load_snapshot('processes-stats.json',
+                             process_stats.ProcessesStatsSnapshot,
+                             '192.168.33.10')
+    history = StatsHistory(None, resolutions=((10, 6),), max_series=5)
+    history.add_snapshot(snapshot)
+    assert len(history.series) == 5
+    recorded = set(history.series)
+
+    history.add_snapshot(attr.evolve(
+      snapshot, utc_timestamp=snapshot.utc_timestamp + 10))
+    assert set(history.series) == recorded
+
+    # Expired series give room to new ones.
+    history.add_snapshot(attr.evolve(
+      snapshot, processes_stats=snapshot.processes_stats[-1:],
+      utc_timestamp=snapshot.utc_timestamp + 100))
+    assert 0 < len(history.series) <= 5
+    assert set(history.series) != recorded
+
+
+@pytest.mark.asyncio
+async def test_history_handler_rejects_non_numeric_range():
+  history = StatsHistory(None, resolutions=((10, 6),))
+  handler = StatsHistoryHandler(history)
+  bad_payloads = [
+    {'start': 'yesterday'},
+    {'end': [1550003600]},
+    {'step': '60'},
+    {'start': True},
+    {'start': float('nan')},
+    {'end': float('inf')},
+    {'end': 1e20},
+    {'start': -1},
+    {'step': 0},
+    ['cpu.percent'],
+  ]
+  for payload in bad_payloads:
+    future = asyncio.Future()
+    future.set_result(payload)
+    request = MagicMock(has_body=True, json=MagicMock(return_value=future))
+    response = await handler(request)
+    assert response.status == 400
+
+  future = asyncio.Future()
+  future.set_exception(json.JSONDecodeError('Expecting value', '{', 1))
+  request = MagicMock(has_body=True, json=MagicMock(return_value=future))
+  response = await handler(request)
+  assert response.status == 400
@@ -0,0 +1,88 @@
+import json
+import os
+
+from appscale.hermes import converter, metrics
+from appscale.hermes.client_session import LatencyHistogram
+from appscale.hermes.producers import node_stats, process_stats
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_DATA_DIR = os.path.join(CUR_DIR, 'test-data')
+
+
+def load_snapshots(json_file_name, stats_class):
+  with open(os.path.join(TEST_DATA_DIR, json_file_name)) as json_file:
+    raw_dict = json.load(json_file)
+  return {
+    node_ip: converter.stats_from_dict(stats_class, snapshot)
+    for node_ip, snapshot in raw_dict.items()
+  }
+
+
+def test_render_node_stats():
+  snapshots = load_snapshots('node-stats.json', node_stats.NodeStatsSnapshot)
+  snapshot = snapshots['192.168.33.10']
+  lines = list(metrics.render_snapshots('appscale_node', [(snapshot, ())]))
+
+  assert '# TYPE appscale_node_cpu_percent gauge\n' in lines
+  assert 'appscale_node_cpu_percent 0.0\n' in lines
+  assert 'appscale_node_memory_available 1157386240.0\n' in lines
+  assert ('appscale_node_partitions_dict_free{mountpoint="/"} 36059422720.0\n'
+          in lines)
+  assert not any('utc_timestamp' in line for line in lines)
+  assert not any('private_ip' in line for line in lines)
+
+
+def test_families_are_grouped_across_nodes():
+  snapshots = load_snapshots('node-stats.json', node_stats.NodeStatsSnapshot)
+  rows = [(snapshot, (('node', node_ip),))
+          for node_ip, snapshot in sorted(snapshots.items())]
+  lines = list(metrics.render_snapshots('appscale_node', rows))
+
+  cpu_lines = [line for line in lines
+               if line.startswith('appscale_node_cpu_percent')]
+  assert len(cpu_lines) == 2
+  first = lines.index(cpu_lines[0])
+  assert lines[first + 1] == cpu_lines[1]
+  assert 'node="192.168.33.11"' in cpu_lines[1]
+  type_lines = [line for line in lines if line.startswith('# TYPE')]
+  assert len(type_lines) == len(set(type_lines))
+
+
+def test_render_processes_stats():
+  snapshots = load_snapshots('processes-stats.json',
+                             process_stats.ProcessesStatsSnapshot)
+  snapshot = snapshots['192.168.33.10']
+  lines = list(metrics.render_snapshots('appscale_processes',
+                                        [(snapshot, ())]))
+
+  threads_lines = [line for line in lines
+                   if line.startswith('appscale_process_threads_num{')]
+  assert len(threads_lines) == len(snapshot.processes_stats)
+  assert any('monit_name="zookeeper"' in line and
+             'unified_service_name="zookeeper"' in line
+             for line in threads_lines)
+  assert any(line.startswith('appscale_process_children_stats_sum_cpu_user{')
+             for line in lines)
+
+
+def test_render_latency_histograms():
+  histogram = LatencyHistogram(buckets=(0.1, 1.0))
+  histogram.observe(0.05)
+  histogram.observe(2.0)
+  lines = list(metrics.render_latency_histograms(
+    'latency', [((('node', '10.0.0.1'),), histogram)]
+  ))
+  assert lines == [
+    '# TYPE latency histogram\n',
+    'latency_bucket{node="10.0.0.1",le="0.1"} 1\n',
+    'latency_bucket{node="10.0.0.1",le="1.0"} 1\n',
+    'latency_bucket{node="10.0.0.1",le="+Inf"} 2\n',
+    'latency_sum{node="10.0.0.1"} 2.05\n',
+    'latency_count{node="10.0.0.1"} 2\n',
+  ]
+
+
+def test_label_values_are_escaped():
+  assert metrics._render_labels((('name', 'a"b\\c\nd'),)) == (
+    '{name="a\\"b\\\\c\\nd"}'
+  )
@@ -77,3 +77,10 @@ Id=appscale-proc-with-invalid-PID.service\n""".format(mypid=os.getpid()).encode(
   assert isinstance(stats.threads_num, int)
   assert isinstance(stats.children_stats_sum, process_stats.ProcessChildrenSum)
   assert isinstance(stats.children_num, int)
+
+
+def test_process_handles_are_reused():
+  process = process_stats._get_process(os.getpid())
+  assert process_stats._get_process(os.getpid()) is process
+  process_stats._forget_stopped_processes()
+  assert process_stats._process_handles[os.getpid()] is process
@@ -1,4 +1,5 @@
 import asyncio
+import io
 import os
 from os import path
 
@@ -406,3 +407,32 @@ class TestGetServiceInstances:
       'mocked', 'gae_not_running'
     )
     assert unknown == []
+
+
+@pytest.mark.asyncio
+async def test_servers_in_maintenance_are_skipped():
+  with open(path.join(DATA_DIR, 'haproxy-stats-v1.5.csv')) as stats_file:
+    stats_csv = stats_file.read()
+  # Servers removed at runtime stay in maintenance until HAProxy reloads
+  up_row = 'TaskQueue,TaskQueue-10.10.7.86:17448,0,0,0,0,1,0,0,0,,0,,0,0,0,0,UP'
+  assert up_row in stats_csv
+  stats_csv = stats_csv.replace(up_row, up_row[:-len('UP')] + 'MAINT')
+
+  async def fake_get_stats(socket_path):
+    return io.StringIO(stats_csv)
+
+  with patch.object(proxy_stats, 'get_stats', fake_get_stats):
+    taskqueue = await proxy_stats.get_service_instances('mocked', 'TaskQueue')
+    all_stats = await proxy_stats.get_stats_from_one_haproxy(
+      'mocked', 'mocked', []
+    )
+
+  assert taskqueue == [
+    '10.10.7.86:17447',
+    '10.10.7.86:17449',
+    '10.10.7.86:17450'
+  ]
+  taskqueue_stats = next(proxy for proxy in all_stats
+                         if proxy.name == 'TaskQueue')
+  assert taskqueue_stats.servers_count == 3
+  assert len(taskqueue_stats.servers) == 4
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import time
+
+import attr
+import pytest
+from mock import MagicMock
+
+from appscale.hermes import converter, push_stats
+from appscale.hermes.handlers import ClusterStatsHandler, PushedStatsHandler
+# All stats models should be imported before creating default include lists.
+from appscale.hermes.producers import cluster_stats, node_stats
+
+CUR_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_DATA_DIR = os.path.join(CUR_DIR, 'test-data')
+
+
+NODE_STATS_MODELS = {'stats/local/node': node_stats.NodeStatsSnapshot}
+
+
+@attr.s
+class FakeStats:
+  a = attr.ib()
+
+
+def future(value=None):
+  future_obj = asyncio.Future()
+  future_obj.set_result(value)
+  return future_obj
+
+
+class TestDelta:
+
+  @staticmethod
+  def test_roundtrip():
+    old = {
+      'cpu': {'percent': 10.0, 'count': 2},
+      'partitions_dict': {'/': {'free': 5}, '/mnt': {'free': 1}},
+      'processes': [{'name': 'a', 'cpu': 1}, {'name': 'b', 'cpu': 2}],
+      'name': 'node'
+    }
+    new = {
+      'cpu': {'percent': 12.0, 'count': 2},
+      'partitions_dict': {'/': {'free': 4}, '/data': {'free': 9}},
+      'processes': [{'name': 'a', 'cpu': 1}, {'name': 'b', 'cpu': 3}],
+      'name': 'node'
+    }
+    delta = push_stats.make_delta(old, new)
+    assert delta == {
+      'cpu': {'percent': 12.0},
+      'partitions_dict': {
+        '/': {'free': 4}, '/data': {'free': 9}, '$removed': ['/mnt']
+      },
+      'processes': {'$list': {'1': {'cpu': 3}}}
+    }
+    # Delta is applied after JSON serialization on the head node.
+    delta = json.loads(json.dumps(delta))
+    assert push_stats.apply_delta(old, delta) == new
+
+  @staticmethod
+  def test_list_length_change():
+    delta = push_stats.make_delta({'items': [1, 2]}, {'items': [1, 2, 3]})
+    assert delta == {'items': [1, 2, 3]}
+    assert push_stats.make_delta({'a': 1}, {'a': 1}) is push_stats._UNCHANGED
+
+
+class TestAggregator:
+
+  @staticmethod
+  def test_resync_required():
+    aggregator = push_stats.PushedStatsAggregator(
+      {'stats/local/node': FakeStats})
+    with pytest.raises(push_stats.ResyncRequired):
+      aggregator.update('10.0.0.2', 'stats/local/node', 1, 2, {})
+
+    aggregator.update('10.0.0.2', 'stats/local/node', None, 1, {'a': 1})
+    aggregator.update('10.0.0.2', 'stats/local/node', 1, 2, {'a': 2})
+    with pytest.raises(push_stats.ResyncRequired):
+      aggregator.update('10.0.0.2', 'stats/local/node', 1, 3, {'a': 3})
+
+  @staticmethod
+  def test_invalid_stats_are_not_stored():
+    aggregator = push_stats.PushedStatsAggregator(
+      {'stats/local/node': FakeStats})
+    aggregator.update('10.0.0.2', 'stats/local/node', None, 1, {'a': [1]})
+    # Unknown field (e.g. pushed by a node running another version).
+    with pytest.raises(push_stats.InvalidStats):
+      aggregator.update('10.0.0.2', 'stats/local/node', 1, 2, {'b': 2})
+    # Malformed list delta.
+    with pytest.raises(push_stats.InvalidStats):
+      aggregator.update('10.0.0.2', 'stats/local/node', 1, 2,
+                        {'a': {'$list': {'5': 2}}})
+    with pytest.raises(push_stats.InvalidStats):
+      aggregator.update('10.0.0.2', 'stats/local/node', 1, 2,
+                        {'a': {'$list': {'x': 2}}})
+    with pytest.raises(push_stats.InvalidStats):
+      aggregator.update('10.0.0.2', 'stats/local/unknown', None, 1, {'a': 1})
+    assert aggregator.get_snapshots('stats/local/node') == {
+      '10.0.0.2': FakeStats(a=[1])
+    }
+
+    # Full stats which can't be converted replace the stored version.
+    with pytest.raises(push_stats.InvalidStats):
+      aggregator.update('10.0.0.2', 'stats/local/node', None, 3, {'b': 1})
+    assert aggregator.get_snapshots('stats/local/node') == {}
+
+
+@pytest.mark.asyncio
+async def test_cluster_handler_uses_pushed_stats():
+  with open(os.path.join(TEST_DATA_DIR, 'node-stats.json')) as json_file:
+    raw_stats = json.load(json_file)
+  pushed_dict = dict(raw_stats['192.168.33.11'])
+  # Pushed snapshot can be older than max_age by the time it's requested.
+  pushed_dict['utc_timestamp'] = time.time() - 15
+
+  aggregator = push_stats.PushedStatsAggregator(NODE_STATS_MODELS)
+  aggregator.update('192.168.33.11', 'stats/local/node', None, 1, pushed_dict)
+
+  local_snapshot = converter.stats_from_dict(
+    node_stats.NodeStatsSnapshot, raw_stats['192.168.33.10'])
+  stats_source = MagicMock(
+    ips_getter=MagicMock(return_value=['192.168.33.10', '192.168.33.11']),
+    method_path='stats/local/node',
+    stats_model=node_stats.NodeStatsSnapshot,
+    get_current=MagicMock(return_value=future(
+      ({'192.168.33.10': local_snapshot}, {})
+    ))
+  )
+  handler = ClusterStatsHandler(stats_source, aggregator)
+
+  snapshots, failures = await handler.get_snapshots(
+    10, handler.default_include_lists)
+
+  stats_source.get_current.assert_called_once_with(
+    max_age=10, include_lists=handler.default_include_lists,
+    exclude_nodes=['192.168.33.11']
+  )
+  assert failures == {}
+  assert snapshots['192.168.33.10'] is local_snapshot
+  assert snapshots['192.168.33.11'].utc_timestamp == (
+    pushed_dict['utc_timestamp'])
+  assert snapshots['192.168.33.11'].cpu.count == 1
+
+
+@pytest.mark.asyncio
+async def test_malformed_push_is_rejected():
+  aggregator = push_stats.PushedStatsAggregator(NODE_STATS_MODELS)
+  handler = PushedStatsHandler(aggregator)
+  bad_payloads = [
+    {'node': '10.0.0.2', 'kinds': {'stats/local/node': {'base': None}}},
+    {'node': '10.0.0.2', 'kinds': {'stats/local/node': 5}},
+    {'node': '10.0.0.2', 'kinds': []},
+    ['10.0.0.2'],
+  ]
+  for payload in bad_payloads:
+    request = MagicMock(json=MagicMock(return_value=future(payload)))
+    response = await handler(request)
+    assert response.status == 400
+
+  assert aggregator.get_snapshots('stats/local/node') == {}
+
+
+@pytest.mark.asyncio
+async def test_push_with_unknown_field_requests_resync():
+  aggregator = push_stats.PushedStatsAggregator(NODE_STATS_MODELS)
+  handler = PushedStatsHandler(aggregator)
+  payload = {
+    'node': '10.0.0.2',
+    'kinds': {'stats/local/node': {
+      'base': None, 'seq': 1, 'delta': {'unknown_field': 1}
+    }}
+  }
+  request = MagicMock(json=MagicMock(return_value=future(payload)))
+  response = await handler(request)
+  assert response.status == 200
+  assert json.loads(response.text) == {'resync': ['stats/local/node']}
+  assert aggregator.get_snapshots('stats/local/node') == {}
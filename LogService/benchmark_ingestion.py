@@ -0,0 +1,72 @@
+""" Measures how fast the log server ingests records from a client.
+
+Usage: python benchmark_ingestion.py [--records N] [--chunk-size BYTES]
+"""
+import argparse
+import shutil
+import struct
+import tempfile
+import time
+
+import capnp  # pylint: disable=unused-import
+import logging_capnp
+
+from logserver import LogServerFactory
+
+
+class NullTransport(object):
+  def write(self, data):
+    pass
+
+  def loseConnection(self):
+    pass
+
+
+def frame(action, payload):
+  return '%s%s%s' % (action, struct.pack('I', len(payload)), payload)
+
+
+def make_stream(record_count):
+  records = []
+  for index in range(record_count):
+    request_log = logging_capnp.RequestLog.new_message()
+    request_log.requestId = struct.pack('>Q', index) + 'ab'
+    request_log.versionId = 'v1.1'
+    request_log.startTime = index
+    request_log.endTime = index + 1
+    request_log.combined = 'GET /resource/%d HTTP/1.1 200' % index
+    app_logs = request_log.init('appLogs', 2)
+    for app_log in app_logs:
+      app_log.level = 1
+      app_log.message = 'Handled request %d' % index
+    records.append(frame('l', request_log.to_bytes()))
+  return frame('a', 'benchmark') + ''.join(records)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--records', type=int, default=100000)
+  parser.add_argument('--chunk-size', type=int, default=64 * 1024,
+                      help='Size of chunks passed to dataReceived')
+  args = parser.parse_args()
+
+  stream = make_stream(args.records)
+  path = tempfile.mkdtemp()
+  try:
+    protocol = LogServerFactory(path, 2).buildProtocol(None)
+    protocol.transport = NullTransport()
+    start = time.time()
+    for position in xrange(0, len(stream), args.chunk_size):
+      protocol.dataReceived(stream[position:position + args.chunk_size])
+    elapsed = time.time() - start
+  finally:
+    shutil.rmtree(path)
+
+  print('Ingested {} records ({:.1f} MB) in {:.2f}s: {:.0f} records/s, '
+        '{:.1f} MB/s'.format(args.records, len(stream) / 1e6, elapsed,
+                             args.records / elapsed,
+                             len(stream) / 1e6 / elapsed))
+
+
+if __name__ == '__main__':
+  main()
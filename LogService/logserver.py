@@ -1,13 +1,16 @@
 
+import bisect
 import capnp  # pylint: disable=unused-import
 import logging_capnp
+import mmap
 import os
 import re
 import struct
 import time
+import zlib
 
 from cStringIO import StringIO
-from twisted.internet import protocol
+from twisted.internet import defer, protocol, threads
 from twisted.python import log
 
 MAX_LOG_FILE_SIZE = 1024 * 1024 * 1024
@@ -16,6 +19,11 @@ _I_SIZE = struct.calcsize('I')
 _qI_SIZE = struct.calcsize('qI')
 _PAGE_SIZE = 1000
 _ONE_BINARY = struct.pack('I', 1)
+_REQUEST_ID_SIZE = 10
+_RIDX_ENTRY_SIZE = _REQUEST_ID_SIZE + _I_SIZE
+# Block index entries hold the position of the block's first record in the
+# uncompressed segment, the offset of the compressed block and its length.
+_ZIDX_ENTRY_SIZE = struct.calcsize('III')
 
 def readLogRecord(handle, parse=False):
   buf = handle.read(_I_SIZE)
@@ -25,6 +33,54 @@ def readLogRecord(handle, parse=False):
   buf = handle.read(length)
   return (buf, logging_capnp.RequestLog.from_bytes(buf)) if parse else buf
 
+def buildSortedRequestIdIndex(unsorted_filename, sorted_filename):
+  """ Rewrites an append-only request id index sorted by request id, so
+  lookups can binary search it. Entries keep their order of appearance for
+  equal request ids. """
+  with open(unsorted_filename, 'rb') as fh:
+    buf = fh.read()
+  entries = [buf[i:i+_RIDX_ENTRY_SIZE]
+             for i in xrange(0, len(buf) - _RIDX_ENTRY_SIZE + 1,
+                             _RIDX_ENTRY_SIZE)]
+  entries.sort(key=lambda entry: entry[:_REQUEST_ID_SIZE])
+  tmp_filename = '%s.tmp' % sorted_filename
+  with open(tmp_filename, 'wb') as fh:
+    fh.write(''.join(entries))
+  os.rename(tmp_filename, sorted_filename)
+  os.unlink(unsorted_filename)
+
+def compressSegment(filename, page_index_filename, compressed_filename,
+                    block_index_filename):
+  """ Writes a zlib compressed copy of a closed segment. Each page of the
+  page index is compressed as an independent block, so a page can be read
+  without decompressing the rest of the segment. The block index is renamed
+  into place before the compressed segment, so an existing compressed
+  segment is always complete. """
+  with open(page_index_filename, 'rb') as fh:
+    pages = fh.read()
+  positions = [struct.unpack('qI', pages[pos:pos+_qI_SIZE])[1]
+               for pos in xrange(0, len(pages) - _qI_SIZE + 1, _qI_SIZE)]
+  if not positions or positions[0] != 0:
+    positions.insert(0, 0)
+  tmp_compressed_filename = '%s.tmp' % compressed_filename
+  tmp_block_index_filename = '%s.tmp' % block_index_filename
+  offset = 0
+  with open(filename, 'rb') as source, \
+       open(tmp_compressed_filename, 'wb') as compressed, \
+       open(tmp_block_index_filename, 'wb') as block_index:
+    for i, position in enumerate(positions):
+      source.seek(position)
+      if i + 1 < len(positions):
+        buf = source.read(positions[i+1] - position)
+      else:
+        buf = source.read()
+      block = zlib.compress(buf)
+      compressed.write(block)
+      block_index.write(struct.pack('III', position, offset, len(block)))
+      offset += len(block)
+  os.rename(tmp_block_index_filename, block_index_filename)
+  os.rename(tmp_compressed_filename, compressed_filename)
+
 def calculateOffset(log_file_id, position):
   return struct.pack('HI', log_file_id, position)
 
@@ -40,82 +96,278 @@ class AppLogFile(object):
     self.log_file_id = log_file_id
     self._filename = os.path.join(root_path, 'logservice_%s.%s.log' % (app_id, log_file_id))
     self._requestIdIndexFilename = '%s.ridx' % self._filename
+    self._sortedRequestIdIndexFilename = '%s.sridx' % self._filename
     self._pageIndexFilename = '%s.pidx' % self._filename
+    self._compressedFilename = '%s.z' % self._filename
+    self._blockIndexFilename = '%s.zidx' % self._filename
+    self._requestIdIndexHandle = None
+    self._requestIdIndex = None
+    self._unsortedRequestIdIndex = None
+    self._sortedRequestIdIndex = None
+    self._sortedRequestIdIndexHandle = None
+    self._map = None
+    # Positions of the first record of each compressed block and the offset
+    # and length of the block in the compressed segment.
+    self._blocks = None
+    self._cachedBlock = (None, None)
     if mode == AppLogFile.MODE_WRITE:
       self._handle = open(self._filename, 'ab')
       self._pageIndexHandle = open(self._pageIndexFilename, 'ab')
       self._requestIdIndexHandle = open(self._requestIdIndexFilename, 'ab')
+      self._indexSize = self._requestIdIndexHandle.tell() / _RIDX_ENTRY_SIZE
+      # The active segment answers lookups from memory.
+      self._requestIdIndex = dict()
+      with open(self._requestIdIndexFilename, 'rb') as fh:
+        buf = fh.read()
+      for i in xrange(0, len(buf) - _RIDX_ENTRY_SIZE + 1, _RIDX_ENTRY_SIZE):
+        key = buf[i:i+_REQUEST_ID_SIZE]
+        if key not in self._requestIdIndex:
+          self._requestIdIndex[key], = struct.unpack(
+            'I', buf[i+_REQUEST_ID_SIZE:i+_RIDX_ENTRY_SIZE])
     else:
-      self._handle = open(self._filename, 'rb')
+      if os.path.exists(self._compressedFilename):
+        # The uncompressed segment is left behind if the server stopped right
+        # after compressing it.
+        if os.path.exists(self._filename):
+          os.unlink(self._filename)
+        self._openCompressed()
+      else:
+        self._handle = open(self._filename, 'rb')
       self._pageIndexHandle = open(self._pageIndexFilename, 'rb')
-      self._requestIdIndexHandle = open(self._requestIdIndexFilename, 'rb')
-    self._indexSize = self._requestIdIndexHandle.tell() / 14
+      self._indexSize = 0
+      # Recently closed segments, and segments written before sorted indexes
+      # existed, are searched with the unsorted index until sortRequestIdIndex
+      # has run.
+      if os.path.exists(self._requestIdIndexFilename):
+        self._openUnsortedRequestIdIndex()
+      else:
+        self._openSortedRequestIdIndex()
+
+  def _openUnsortedRequestIdIndex(self):
+    self._requestIdIndexHandle = open(self._requestIdIndexFilename, 'rb')
+    if os.fstat(self._requestIdIndexHandle.fileno()).st_size:
+      self._unsortedRequestIdIndex = mmap.mmap(
+        self._requestIdIndexHandle.fileno(), 0, access=mmap.ACCESS_READ)
+
+  def _openSortedRequestIdIndex(self):
+    self._sortedRequestIdIndexHandle = open(
+      self._sortedRequestIdIndexFilename, 'rb')
+    if os.fstat(self._sortedRequestIdIndexHandle.fileno()).st_size:
+      self._sortedRequestIdIndex = mmap.mmap(
+        self._sortedRequestIdIndexHandle.fileno(), 0,
+        access=mmap.ACCESS_READ)
+
+  def _openCompressed(self):
+    self._handle = open(self._compressedFilename, 'rb')
+    with open(self._blockIndexFilename, 'rb') as fh:
+      buf = fh.read()
+    self._blocks = [struct.unpack('III', buf[i:i+_ZIDX_ENTRY_SIZE])
+                    for i in xrange(0, len(buf) - _ZIDX_ENTRY_SIZE + 1,
+                                    _ZIDX_ENTRY_SIZE)]
+    self._blockPositions = [position for position, _, _ in self._blocks]
+
+  @property
+  def compressed(self):
+    return self._blocks is not None
+
+  def compress(self):
+    """ Writes a compressed copy of a closed segment. This only reads the
+    uncompressed segment, so it can run in a separate thread while the
+    segment is being searched. """
+    if self.mode != AppLogFile.MODE_SEARCH:
+      raise ValueError("Cannot compress AppLogFile in write mode")
+    compressSegment(self._filename, self._pageIndexFilename,
+                    self._compressedFilename, self._blockIndexFilename)
+
+  def useCompressed(self):
+    """ Switches to the compressed copy written by compress and removes the
+    uncompressed segment. """
+    if self._map:
+      self._map.close()
+      self._map = None
+    self._handle.close()
+    self._openCompressed()
+    os.unlink(self._filename)
+
+  def diskSize(self):
+    return os.fstat(self._handle.fileno()).st_size
+
+  @property
+  def indexSorted(self):
+    return self._requestIdIndexHandle is None
+
+  def sortRequestIdIndex(self):
+    """ Writes an index sorted by request id for a closed segment. This
+    only reads the unsorted index, so it can run in a separate thread while
+    the segment is being searched. """
+    if self.mode != AppLogFile.MODE_SEARCH:
+      raise ValueError("Cannot sort index of AppLogFile in write mode")
+    buildSortedRequestIdIndex(self._requestIdIndexFilename,
+                              self._sortedRequestIdIndexFilename)
+
+  def useSortedRequestIdIndex(self):
+    """ Switches lookups to the index written by sortRequestIdIndex. """
+    if self._unsortedRequestIdIndex:
+      self._unsortedRequestIdIndex.close()
+      self._unsortedRequestIdIndex = None
+    self._requestIdIndexHandle.close()
+    self._requestIdIndexHandle = None
+    self._openSortedRequestIdIndex()
 
   def close(self):
+    if self._map:
+      self._map.close()
     self._handle.close()
     self._pageIndexHandle.close()
-    self._requestIdIndexHandle.close()
+    if self._unsortedRequestIdIndex:
+      self._unsortedRequestIdIndex.close()
+    if self._requestIdIndexHandle:
+      self._requestIdIndexHandle.close()
+    if self._sortedRequestIdIndex:
+      self._sortedRequestIdIndex.close()
+    if self._sortedRequestIdIndexHandle:
+      self._sortedRequestIdIndexHandle.close()
 
   def delete(self):
-    os.unlink(self._filename)
-    os.unlink(self._requestIdIndexFilename)
-    os.unlink(self._pageIndexFilename)
+    for filename in (self._filename, self._compressedFilename,
+                     self._blockIndexFilename, self._requestIdIndexFilename,
+                     self._sortedRequestIdIndexFilename,
+                     self._pageIndexFilename):
+      if os.path.exists(filename):
+        os.unlink(filename)
 
   def write(self, buf):
+    written, _ = self.writeMany([buf])
+    return written[0] if written else None
+
+  def writeMany(self, bufs, max_position=None):
+    """ Writes records with a single write per file. Malformed records are
+    logged and skipped.
+
+    Args:
+      bufs: A list of serialized RequestLog records.
+      max_position: Stop after the first record written beyond this position.
+    Returns:
+      A tuple with a list of (position, requestLog, buf) tuples for the
+      records written and the number of records consumed from bufs.
+    """
     if self.mode != AppLogFile.MODE_WRITE:
       raise ValueError("Cannot write to AppLogFile in search mode")
     position = self._handle.tell()
-    offset = calculateOffset(self.log_file_id, position)
-    requestLog = logging_capnp.RequestLog.from_bytes(buf).as_builder()
-    requestLog.offset = offset
-    buf = requestLog.to_bytes()
-    self._handle.write('%s%s' % (struct.pack('I', len(buf)), buf))
-    # Index the new logline
-    if requestLog.requestId:
-      self._requestIdIndexHandle.write('%s%s' % (requestLog.requestId, struct.pack('I', position)))
-    if self._indexSize % _PAGE_SIZE == 0:
-      self._pageIndexHandle.write(struct.pack('qI', requestLog.endTime, position))
+    chunks = list()
+    index_chunks = list()
+    page_chunks = list()
+    written = list()
+    consumed = 0
+    for received in bufs:
+      consumed += 1
+      offset = calculateOffset(self.log_file_id, position)
+      try:
+        requestLog = logging_capnp.RequestLog.from_bytes(received).as_builder()
+        requestLog.offset = offset
+        buf = requestLog.to_bytes()
+        requestId = requestLog.requestId
+        endTime = requestLog.endTime
+      except Exception:
+        log.err(None, 'Dropping malformed log record')
+        continue
+      chunks.append(struct.pack('I', len(buf)))
+      chunks.append(buf)
+      # Index the new logline
+      if requestId:
+        index_chunks.append(requestId)
+        index_chunks.append(struct.pack('I', position))
+        if requestId not in self._requestIdIndex:
+          self._requestIdIndex[requestId] = position
+      if self._indexSize % _PAGE_SIZE == 0:
+        page_chunks.append(struct.pack('qI', endTime, position))
+      self._indexSize += 1
+      written.append((position, requestLog, received))
+      if max_position is not None and position > max_position:
+        break
+      position += _I_SIZE + len(buf)
+    self._handle.write(''.join(chunks))
+    self._requestIdIndexHandle.write(''.join(index_chunks))
+    if page_chunks:
+      self._pageIndexHandle.write(''.join(page_chunks))
       self._pageIndexHandle.flush()
       self._handle.flush()
       self._requestIdIndexHandle.flush()
-    self._indexSize += 1
-    return position, requestLog
+    return written, consumed
+
+  def _findPosition(self, requestId):
+    """ Returns the position of the first record with the request id or None.
+    """
+    if self.mode == AppLogFile.MODE_WRITE:
+      return self._requestIdIndex.get(requestId)
+    if not self.indexSorted:
+      return self._findUnsortedPosition(requestId)
+    index = self._sortedRequestIdIndex
+    if index is None:
+      return None
+    low, high = 0, len(index) // _RIDX_ENTRY_SIZE
+    while low < high:
+      middle = (low + high) // 2
+      entry = middle * _RIDX_ENTRY_SIZE
+      if index[entry:entry+_REQUEST_ID_SIZE] < requestId:
+        low = middle + 1
+      else:
+        high = middle
+    entry = low * _RIDX_ENTRY_SIZE
+    if index[entry:entry+_REQUEST_ID_SIZE] != requestId:
+      return None
+    position, = struct.unpack(
+      'I', index[entry+_REQUEST_ID_SIZE:entry+_RIDX_ENTRY_SIZE])
+    return position
+
+  def _findUnsortedPosition(self, requestId):
+    """ Scans the unsorted index for the first record with the request id.
+    """
+    index = self._unsortedRequestIdIndex
+    if index is None:
+      return None
+    start = 0
+    while True:
+      entry = index.find(requestId, start)
+      if entry < 0:
+        return None
+      # Request ids can also appear across entry boundaries.
+      if entry % _RIDX_ENTRY_SIZE == 0:
+        position, = struct.unpack(
+          'I', index[entry+_REQUEST_ID_SIZE:entry+_RIDX_ENTRY_SIZE])
+        return position
+      start = entry + 1
 
   def get(self, requestIds):
+    found = list()
+    for key in list(requestIds):
+      position = self._findPosition(key)
+      if position is not None:
+        requestIds.remove(key)
+        found.append((position, key))
+    if not found:
+      return
+    if self.compressed:
+      for position, key in sorted(found):
+        data, base = self._readBlock(
+          bisect.bisect_right(self._blockPositions, position) - 1)
+        length, = struct.unpack_from('I', data, position - base)
+        start = position - base + _I_SIZE
+        yield key, data[start:start+length]
+      return
     if self.mode == AppLogFile.MODE_WRITE:
-      self._requestIdIndexHandle.flush()
       self._handle.flush()
-      index_handle = open(self._requestIdIndexFilename, 'rb')
       handle = open(self._filename, 'rb')
     else:
-      index_handle = self._requestIdIndexHandle
       handle = self._handle
     try:
-      index_handle.seek(0)
-      while True:
-        buf = index_handle.read(14000)
-        if not buf:
-          break
-        i = 0
-        while True:
-          key = buf[i:i+10]
-          if not key:
-            break
-          if key in requestIds:
-            requestIds.remove(key)
-            position, = struct.unpack('I', buf[i+10:i+14])
-            handle.seek(position)
-            record = readLogRecord(handle, False)
-            yield key, record
-            if not requestIds:
-              break
-          i += 14
-          if not requestIds:
-            break
+      # Read records in file order to keep seeks short.
+      for position, key in sorted(found):
+        handle.seek(position)
+        yield key, readLogRecord(handle, False)
     finally:
       if self.mode == AppLogFile.MODE_WRITE:
         handle.close()
-        index_handle.close()
 
   def iterpages(self):
     if self.mode == AppLogFile.MODE_WRITE:
@@ -128,72 +380,170 @@ class AppLogFile(object):
     for pos in xrange(len(pages)-_qI_SIZE, -1, -_qI_SIZE):
       yield struct.unpack('qI', pages[pos:pos+_qI_SIZE])
 
-  def iterrecords(self, start_position, end_position):
+  def _mapping(self):
+    """ Returns a read-only mmap of the segment or None if it is empty. The
+    active segment keeps growing, so it is mapped again on every call. """
     if self.mode == AppLogFile.MODE_WRITE:
       self._handle.flush()
-      handle = open(self._filename, 'rb')
+      with open(self._filename, 'rb') as handle:
+        if not os.fstat(handle.fileno()).st_size:
+          return None
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if self._map is None:
+      if not os.fstat(self._handle.fileno()).st_size:
+        return None
+      self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+    return self._map
+
+  def _readBlock(self, block):
+    """ Returns a decompressed block and the position of its first record.
+    The last block read is kept, since lookups tend to hit the same page. """
+    if self._cachedBlock[0] != block:
+      position, offset, length = self._blocks[block]
+      self._handle.seek(offset)
+      self._cachedBlock = (block, zlib.decompress(self._handle.read(length)))
+    return self._cachedBlock[1], self._blocks[block][0]
+
+  def _span(self, start_position, end_position):
+    """ Returns a buffer containing the records between two positions and
+    the position of the buffer's first byte. """
+    if not self.compressed:
+      return self._mapping(), 0
+    first = bisect.bisect_right(self._blockPositions, start_position) - 1
+    if end_position == -1:
+      last = len(self._blocks)
     else:
-      handle = self._handle
-    try:
-      handle.seek(start_position)
-      if end_position != -1:
-        buf = handle.read(end_position - start_position)
-      else:
-        buf = handle.read()
-    finally:
-      if self.mode == AppLogFile.MODE_WRITE:
-        handle.close()
-    pos = 0
-    while pos < len(buf):
-      buf2 = buf[pos:pos+_I_SIZE]
-      pos += _I_SIZE
-      if not buf2:
+      last = bisect.bisect_left(self._blockPositions, end_position)
+    if first < 0 or last <= first:
+      return None, 0
+    if last - first == 1:
+      return self._readBlock(first)
+    data = ''.join(self._readBlock(block)[0] for block in xrange(first, last))
+    return data, self._blocks[first][0]
+
+  def iterrecords(self, start_position, end_position, reverse=False):
+    """ Iterates over records between two positions without reading them into
+    memory. Yielded buffers point into the mapped segment or the decompressed
+    block, so they have to be copied with str() to be kept around.
+
+    Args:
+      start_position: Position of the first record.
+      end_position: Position after the last record or -1 for end of file.
+      reverse: Iterate from the newest record to the oldest one.
+    """
+    mapping, base = self._span(start_position, end_position)
+    if mapping is None:
+      return
+    if end_position == -1 or end_position - base > len(mapping):
+      end_position = len(mapping)
+    else:
+      end_position -= base
+    positions = list()
+    pos = start_position - base
+    while pos + _I_SIZE <= end_position:
+      length, = struct.unpack_from('I', mapping, pos)
+      if pos + _I_SIZE + length > end_position:
         break
-      length, = struct.unpack('I', buf2)
-      buf2 = buf[pos:pos+length]
-      pos += length
-      yield buf2, logging_capnp.RequestLog.from_bytes(buf2)
+      positions.append((pos + _I_SIZE, length))
+      pos += _I_SIZE + length
+    if reverse:
+      positions.reverse()
+    for pos, length in positions:
+      buf = buffer(mapping, pos, length)
+      yield buf, logging_capnp.RequestLog.from_bytes(buf)
 
 class AppRegistry(object):
 
   def __init__(self, root_path, app_id, factory):
     self._factory = factory
     self._followers = dict()
+    # Followers grouped by (minimumLogLevel, versionIds).
+    self._followerGroups = dict()
     self._app_id = app_id
     self._root_path = root_path
     self._log_files = list()
-    ids = [0]
+    ids = set([0])
     for f in os.listdir(root_path):
-      m = re.match('^logservice_%s\\.(\\d+)\\.log$' % app_id, f)
+      m = re.match('^logservice_%s\\.(\\d+)\\.log(\\.z)?$' % app_id, f)
       if not m:
         continue
-      log_file_id = int(m.groups()[0])
-      ids.append(log_file_id)
+      ids.add(int(m.groups()[0]))
+    for log_file_id in sorted(ids - set([0])):
       self._log_files.append(AppLogFile(root_path, app_id, log_file_id,
                                         AppLogFile.MODE_SEARCH))
-    self._log_files.sort(key=lambda x: x.log_file_id)
     self._writer = AppLogFile(root_path, app_id, max(ids) + 1, AppLogFile.MODE_WRITE)
+    for alf in self._log_files:
+      if not alf.indexSorted or not alf.compressed:
+        self._seal(alf)
 
   def write(self, buf):
-    position, requestLog = self._writer.write(buf)
-    if position > MAX_LOG_FILE_SIZE:
-      self._writer.close()
-      self._log_files.append(AppLogFile(self._root_path, self._app_id,
-                                        self._writer.log_file_id,
-                                        AppLogFile.MODE_SEARCH))
-      self._writer = AppLogFile(self._root_path, self._app_id,
-                                self._writer.log_file_id + 1,
-                                AppLogFile.MODE_WRITE)
-      log_file_count = len(self._log_files) - 1
-      if log_file_count * MAX_LOG_FILE_SIZE > self._factory.size * 1024 ** 3:
-        lf = self._log_files.pop(0)
-        lf.close()
-        lf.delete()
-    self.broadcastToFollowers(requestLog, buf)
+    self.writeMany([buf])
+
+  def writeMany(self, bufs):
+    """ Writes records received together, rolling over to a new segment when
+    the current one is full. """
+    while bufs:
+      written, consumed = self._writer.writeMany(bufs, MAX_LOG_FILE_SIZE)
+      if written and written[-1][0] > MAX_LOG_FILE_SIZE:
+        self._rollOver()
+      for position, requestLog, buf in written:
+        self.broadcastToFollowers(requestLog, buf)
+      bufs = bufs[consumed:]
+
+  def _rollOver(self):
+    self._writer.close()
+    self._log_files.append(AppLogFile(self._root_path, self._app_id,
+                                      self._writer.log_file_id,
+                                      AppLogFile.MODE_SEARCH))
+    self._writer = AppLogFile(self._root_path, self._app_id,
+                              self._writer.log_file_id + 1,
+                              AppLogFile.MODE_WRITE)
+    self._enforceRetention()
+    self._seal(self._log_files[-1])
+
+  def _seal(self, alf):
+    """ Sorts the request id index of a closed segment and compresses it in
+    a separate thread, one segment at a time, so ingestion is not held up.
+    The segment is searched as it is until then. """
+    def seal(sort, compress):
+      if sort:
+        alf.sortRequestIdIndex()
+      if compress:
+        alf.compress()
+    def start():
+      if alf not in self._log_files:
+        return None
+      return threads.deferToThread(seal, not alf.indexSorted, not alf.compressed)
+    d = self._factory.compressionLock.run(start)
+    d.addCallback(lambda _: self._sealed(alf))
+    d.addErrback(log.err, 'Unable to seal log segment')
+
+  def _sealed(self, alf):
+    if alf not in self._log_files:
+      # The segment was removed while it was being sealed.
+      alf.delete()
+      return
+    if not alf.indexSorted:
+      alf.useSortedRequestIdIndex()
+    if not alf.compressed:
+      alf.useCompressed()
+    self._enforceRetention()
+
+  def _enforceRetention(self):
+    """ Removes the oldest segments once closed segments take more disk
+    space than the configured size. Like the active segment, the newest
+    closed segment is not counted, since it is only compressed later. """
+    limit = self._factory.size * 1024 ** 3
+    while (len(self._log_files) > 1 and
+           sum(alf.diskSize() for alf in self._log_files[:-1]) > limit):
+      lf = self._log_files.pop(0)
+      lf.close()
+      lf.delete()
 
   def iter(self):
+    """ Yields segments from the newest to the oldest one. """
     yield self._writer
-    for alf in self._log_files:
+    for alf in reversed(self._log_files):
       yield alf
 
   def get(self, requestIds):
@@ -210,63 +560,100 @@ class AppRegistry(object):
          yield endTime, position, alf
 
   def registerFollower(self, protocol, query):
-    self._followers[protocol] = query
+    """ Adds a follower. Followers are grouped by their filter, so the filter
+    is evaluated once per record for every distinct query. """
+    self.unregisterFollower(protocol)
+    followerFilter = (query.minimumLogLevel, frozenset(query.versionIds))
+    self._followers[protocol] = followerFilter
+    self._followerGroups.setdefault(followerFilter, set()).add(protocol)
 
   def unregisterFollower(self, protocol):
-    if protocol in self._followers:
-      del self._followers[protocol]
+    followerFilter = self._followers.pop(protocol, None)
+    if followerFilter is None:
+      return
+    group = self._followerGroups[followerFilter]
+    group.discard(protocol)
+    if not group:
+      del self._followerGroups[followerFilter]
 
   def broadcastToFollowers(self, record, buf):
-    for protocol, query in self._followers.iteritems():
-      if query.minimumLogLevel:
-        include = False
-        for appLog in record.appLogs:
-          if appLog.level >= query.minimumLogLevel:
-            include = True
-            break
-        if not include:
-          continue
-      versionIds = list(query.versionIds)
-      if record.versionId and not record.versionId.split('.', 1)[0] in versionIds:
+    if not self._followerGroups:
+      return
+    maxLevel = None
+    for appLog in record.appLogs:
+      if maxLevel is None or appLog.level > maxLevel:
+        maxLevel = appLog.level
+    version = None
+    if record.versionId:
+      version = record.versionId.split('.', 1)[0]
+    message = None
+    for (minimumLogLevel, versionIds), protocols in \
+        self._followerGroups.iteritems():
+      if minimumLogLevel and (maxLevel is None or maxLevel < minimumLogLevel):
         continue
-      protocol.transport.write('%s%s%s' % (_ONE_BINARY, struct.pack('I', len(buf)), buf))
+      if version is not None and version not in versionIds:
+        continue
+      if message is None:
+        message = '%s%s%s' % (_ONE_BINARY, struct.pack('I', len(buf)), buf)
+      for protocol in protocols:
+        protocol.transport.write(message)
 
 class Protocol(protocol.Protocol):
 
   def __init__(self):
-    self.buf = ''
+    self.buf = bytearray()
+    # Start of the first unprocessed action in buf.
+    self.offset = 0
+    self.pendingLogs = list()
     self.app_id = None
     self.app_registry = None
 
   def dataReceived(self, data):
-    self.buf += data
-    while self.processActions():
-      continue
+    self.buf.extend(data)
+    try:
+      while self.processActions():
+        continue
+    finally:
+      self.flushLogs()
+      # Processed actions are dropped once per call, so buffer handling
+      # stays linear in the number of bytes received.
+      del self.buf[:self.offset]
+      self.offset = 0
 
   def processActions(self):
-    buffer_size = len(self.buf)
+    buffer_size = len(self.buf) - self.offset
     if buffer_size < 5:
       return False
-    action = self.buf[0]
+    action = chr(self.buf[self.offset])
     if not self.app_id and action != 'a': # First command should set_app_id
       log.err("Received unknown action %s", action)
       self.transport.loseConnection()
       return False
-    query_length, = struct.unpack('I', self.buf[1:5])
+    query_length, = struct.unpack_from('I', self.buf, self.offset + 1)
     query_end = query_length + 5;
     if buffer_size < query_end:
       return False
-    query = self.buf[5:query_end]
+    query = str(self.buf[self.offset + 5:self.offset + query_end])
     processor = self.ACTIONS.get(action)
     if processor:
+      # Log records are written in batches, but other actions must see
+      # everything received before them.
+      if action != 'l':
+        self.flushLogs()
       processor(self, query)
     else:
       log.err("Received unknown action %s", action)
       self.transport.loseConnection()
       return False
-    self.buf = self.buf[query_end:]
+    self.offset += query_end
     return True
 
+  def flushLogs(self):
+    if self.pendingLogs:
+      logs = self.pendingLogs
+      self.pendingLogs = list()
+      self.app_registry.writeMany(logs)
+
   def processSetAppId(self, query):
     # Set our app_id
     self.app_id = query
@@ -277,7 +664,7 @@ class Protocol(protocol.Protocol):
     self.factory.apps[self.app_id] = self.app_registry
 
   def processActionLog(self, query):
-    self.app_registry.write(query)
+    self.pendingLogs.append(query)
 
   def processActionQuery(self, query):
     query = logging_capnp.Query.from_bytes(query)
@@ -305,15 +692,18 @@ class Protocol(protocol.Protocol):
         if alf.log_file_id == query_log_file_id and position > query_position:
           continue
       end_position = previousPosition if alf == previousALF else -1
-      for buf, record in alf.iterrecords(position, end_position):
+      # Records are visited newest first, so the loop can stop as soon as
+      # enough records are found.
+      for buf, record in alf.iterrecords(position, end_position, True):
         if not oldestRecord or oldestRecord.startTime > record.startTime:
           oldestRecord = record
         if query.endTime and query.endTime < endTime:
           break
         if query.offset:
-          log_file_id, position = parseOffset(record.offset)
-          if log_file_id == query_log_file_id and position >= query_position:
-            break
+          log_file_id, record_position = parseOffset(record.offset)
+          if (log_file_id == query_log_file_id and
+              record_position >= query_position):
+            continue
         if query.minimumLogLevel:
           include = False
           for appLog in record.appLogs:
@@ -326,8 +716,11 @@ class Protocol(protocol.Protocol):
           continue
         if query.startTime and query.startTime > record.startTime:
           continue
-        results.append((buf, record))
-      if query.startTime and oldestRecord.endTime < query.startTime:
+        results.append((str(buf), record))
+        if query.count and len(results) >= query.count:
+          break
+      if (query.startTime and oldestRecord and
+          oldestRecord.endTime < query.startTime):
         break
       if len(results) >= query.count:
         break
@@ -380,3 +773,4 @@ class LogServerFactory(protocol.Factory):
         self.path = path
         self.size = size
         self.apps = dict()
+        self.compressionLock = defer.DeferredLock()
@@ -2,16 +2,16 @@
 Backup script for new Search Service.
 """
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
-import random
 
 from appscale.search.constants import SolrClientError
 from kazoo.client import KazooClient
-from tornado import gen, ioloop
+from tornado import gen, ioloop, queues
 from appscale.common.constants import LOG_FORMAT, ZK_PERSISTENT_RECONNECTS
 from appscale.search import solr_adapter, api_methods
-from appscale.search.backup_restore import storage
+from appscale.search.backup_restore import progress, storage
 
 from appscale.search.protocols import search_pb2
 
@@ -25,7 +25,7 @@ class IDRangesGenerator(object):
   """
 
   def __init__(self, solr_api, project_id, namespace, index,
-               page_size, max_retries):
+               page_size, max_retries, start_after_id='*'):
     """
     Args:
       solr_api: an instance of SolrAPI.
@@ -34,12 +34,13 @@ class IDRangesGenerator(object):
       index: a str - GAE Search index name.
       page_size: an int - max length of ID range.
       max_retries: an int - max attempts to perform before failing.
+      start_after_id: a str - ID after which ranges should start.
     """
     self.solr_api = solr_api
     self.collection = solr_adapter.get_collection_name(
       project_id, namespace, index
     )
-    self.last_seen_id = '*'
+    self.last_seen_id = start_after_id
     self.page_size = page_size
     self.max_retries = max_retries
 
@@ -94,13 +95,15 @@ class Exporter(object):
   max_retries = 10
   page_size = 100
 
-  def __init__(self, io_loop, zk_locations, target, max_concurrency):
+  def __init__(self, io_loop, zk_locations, target, max_concurrency,
+               manifest):
     """
     Args:
       io_loop: an instance of tornado IOLoop.
       zk_locations: a list - Zookeeper locations.
       target: an instance of export Target (e.g.: S3Target).
-      max_concurrency: an int - maximum number of concurrent jobs.
+      max_concurrency: an int - number of pages exported concurrently.
+      manifest: an instance of ProgressManifest.
     """
     zk_client = KazooClient(
       hosts=','.join(zk_locations),
@@ -113,18 +116,28 @@ class Exporter(object):
     self.status = 'Not started'
     self.finish_time = None
     self.solr_adapter = solr_adapter.SolrAdapter(zk_client)
-    self.scheduled_indexes = set()
     self.failed_indexes = set()
     self.succeeded_indexes = set()
-    self.scheduled_jobs = set()
     self.failed_jobs = set()
     self.succeeded_jobs = set()
     self.max_concurrency = max_concurrency
-    self.docs_exported = 0
+    self.manifest = manifest
+    # Index key -> ID before which all documents are exported
+    # (or True if the whole index is exported).
+    self.exported_ranges = manifest.data.setdefault('exported_ranges', {})
+    self.throughput = progress.ThroughputReporter('Export')
+    self.pages_queue = queues.Queue(maxsize=max_concurrency * 2)
+    # Blocking storage calls are done in threads (one per worker at most).
+    self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+  @property
+  def docs_exported(self):
+    return self.throughput.documents
 
   async def export(self):
-    """ Start concurrent export jobs for each Search index.
-    Waits for all export jobs to be completed.
+    """ Starts a pool of workers exporting pages and feeds it
+    with ID ranges of every Search index.
+    Waits for all pages to be exported.
     """
     self.start_time = self.ioloop.time()
     self.status = 'In progress'
@@ -133,21 +146,30 @@ class Exporter(object):
     if broken:
       logger.warning('There are {} broken collections: {}. It will be ignored.'
                      .format(len(broken), list(broken)))
+    indexes = []
     for collection_name in solr_collections:
       if not collection_name.startswith('appscale_'):
         logger.info('Collection {} does not belong to Search Service. Ignoring.'
                     .format(collection_name))
         continue
       _, project_id, namespace, index = collection_name.split('_')
-      self.scheduled_indexes.add((project_id, namespace, index))
-      self.ioloop.add_callback(self.export_index, project_id, namespace, index)
-
-    logger.info('Waiting for all export jobs to be completed')
-    while self.scheduled_indexes or self.scheduled_jobs:
-      await gen.sleep(0.25)
-
-    logger.info('Export has been finished and took {:.2f}s'
-                .format(self.ioloop.time() - self.start_time))
+      indexes.append((project_id, namespace, index))
+
+    self.ioloop.spawn_callback(self.throughput.run)
+    workers = [gen.convert_yielded(self.export_worker())
+               for _ in range(self.max_concurrency)]
+    await gen.multi([self.export_index(*index) for index in indexes])
+    await self.pages_queue.join()
+    for _ in workers:
+      await self.pages_queue.put(None)
+    await gen.multi(workers)
+    self.executor.shutdown(wait=False)
+    self.throughput.stop()
+    self.manifest.save()
+
+    logger.info('Export has been finished and took {:.2f}s ({:.1f} docs/s)'
+                .format(self.ioloop.time() - self.start_time,
+                        self.throughput.overall_rate))
 
     logger.info(' - {} jobs failed'
                 .format(len(self.failed_jobs)))
@@ -157,34 +179,63 @@ class Exporter(object):
     self.finish_time = self.ioloop.time()
 
   async def export_index(self, project_id, namespace, index):
-    """ Starts export of a particular Search index.
-    Initiates asynchronous jobs for each IDs range and waits
-    for all jobs to be completed.
+    """ Splits a particular Search index into ID ranges and puts
+    them to the queue of pages to export.
+    Export starts after the last ID recorded in progress manifest.
 
     Args:
       project_id: a str - GAE project ID.
       namespace: a str - namespace name.
       index: a str - search index name.
     """
-    logger.info('Starting export of index: {}/{}/{}'
-                .format(project_id, namespace, index))
+    index_key = '/'.join((project_id, namespace, index))
+    watermark = self.exported_ranges.get(index_key, '*')
+    if watermark is True:
+      logger.info('Index {} is already exported'.format(index_key))
+      return
+    logger.info('Starting export of index: {} (after ID "{}")'
+                .format(index_key, watermark))
     id_ranges_generator = IDRangesGenerator(
       self.solr_adapter.solr, project_id, namespace, index,
-      self.page_size, self.max_retries
+      self.page_size, self.max_retries, start_after_id=watermark
     )
+    completed_ranges = progress.CompletedRanges(watermark)
     try:
       async for left_id, right_id in id_ranges_generator:
-        while len(self.scheduled_jobs) > self.max_concurrency:
-          await gen.sleep(0.25 * (random.random() + 0.5))
-        page_key = project_id, namespace, index, left_id, right_id
-        self.scheduled_jobs.add(page_key)
-        self.ioloop.add_callback(self.export_page, *page_key)
-      self.scheduled_indexes.remove((project_id, namespace, index))
+        completed_ranges.start(left_id, right_id)
+        page = (index_key, completed_ranges,
+                (project_id, namespace, index, left_id, right_id))
+        await self.pages_queue.put(page)
+      # A fake last range makes watermark turn into True
+      # as soon as all real ranges are exported.
+      completed_ranges.start(None, True)
+      completed_ranges.complete(None)
+      self.exported_ranges[index_key] = completed_ranges.watermark
       self.succeeded_indexes.add((project_id, namespace, index))
     except Exception:
-      self.scheduled_indexes.remove((project_id, namespace, index))
+      logger.exception('Failed to list ID ranges of index {}'.format(index_key))
       self.failed_indexes.add((project_id, namespace, index))
-      raise
+
+  async def export_worker(self):
+    """ Exports pages from the queue until None is received. """
+    while True:
+      page = await self.pages_queue.get()
+      try:
+        if page is None:
+          return
+        index_key, completed_ranges, page_key = page
+        try:
+          await self.export_page(*page_key)
+        except Exception:
+          logger.exception('Failed to export page {}'.format(page_key))
+          continue
+        _, _, _, left_id, _ = page_key
+        completed_ranges.complete(left_id)
+        if self.exported_ranges.get(index_key) is not True:
+          self.exported_ranges[index_key] = completed_ranges.watermark
+        self.manifest.save(force=False)
+      finally:
+        self.pages_queue.task_done()
 
   async def export_page(self, project_id, namespace, index, left_id, right_id):
     """ Exports a single page of Search documents.
@@ -214,16 +265,21 @@ class Exporter(object):
           max_doc_id =right_id, include_max_doc=True,
           limit=self.page_size*2, keys_only=False
         )
+        del index_docs_pb.params.document[:]
         for doc in documents:
           document_pb = index_docs_pb.params.document.add()
           api_methods._fill_pb_document(document_pb, doc)
-        self.target.save(project_id, namespace, index, index_docs_pb)
+        # Storage calls are blocking, so they are done in a thread.
+        await self.ioloop.run_in_executor(
+          self.executor, self.target.save,
+          project_id, namespace, index, index_docs_pb
+        )
         # <<< --------------------------------------------- <<<
-        self.scheduled_jobs.remove(page_key)
         self.succeeded_jobs.add(page_key)
-        self.docs_exported += len(documents)
+        self.throughput.add(len(documents))
         break
       except SolrClientError:
+        self.failed_jobs.add(page_key)
         raise
       except Exception as err:
         logger.error(
@@ -235,7 +291,6 @@ class Exporter(object):
           logger.info('Retrying in {:.1f}s'.format(backoff))
           await gen.sleep(backoff)
         else:
-          self.scheduled_jobs.remove(page_key)
           self.failed_jobs.add(page_key)
           raise
 
@@ -260,25 +315,37 @@ def main():
   parser.add_argument(
     '--zk-locations', nargs='+', help='ZooKeeper location(s)', required=True)
   parser.add_argument(
-    '--max-concurrency', type=int, help='Max import concurrency', default=10)
+    '--max-concurrency', type=int, help='Max export concurrency', default=10)
+  parser.add_argument(
+    '--progress-file', help='Path to JSON file where export progress is '
+                            'recorded. Interrupted export is resumed '
+                            'if the file exists.')
+  parser.add_argument(
+    '--compression-level', type=int, default=6,
+    help='Gzip compression level of backup pages (0 to disable).')
   args = parser.parse_args()
 
   if args.verbose:
     logging.getLogger('appscale').setLevel(logging.DEBUG)
 
   io_loop = ioloop.IOLoop(make_current=False)
-  bucket_name = 'search-backup.{:%Y-%m-%d.%H-%M-%S}'.format(datetime.now())
+  manifest = progress.ProgressManifest(args.progress_file)
+  bucket_name = manifest.data.setdefault(
+    'bucket_name', 'search-backup.{:%Y-%m-%d.%H-%M-%S}'.format(datetime.now())
+  )
   export_target = storage.S3Target(
     endpoint_url=args.s3_location,
     bucket_name=bucket_name,
     access_key_id=args.s3_access_key_id,
-    secret_key=args.s3_secret_key
+    secret_key=args.s3_secret_key,
+    compression_level=args.compression_level
   )
   exporter = Exporter(
     io_loop=io_loop,
     zk_locations=args.zk_locations,
     target=export_target,
-    max_concurrency=args.max_concurrency
+    max_concurrency=args.max_concurrency,
+    manifest=manifest
   )
 
   try:
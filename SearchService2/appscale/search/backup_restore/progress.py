@@ -0,0 +1,138 @@
+"""
+Helpers for tracking progress of backup and restore.
+
+Progress is recorded to a JSON manifest file, so a run which was
+interrupted can be continued from the point where it stopped
+instead of starting from scratch.
+"""
+import collections
+import json
+import logging
+import os
+import time
+
+from tornado import gen
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressManifest(object):
+  """ A JSON document describing what has been done, stored on local disk. """
+
+  save_interval = 5
+
+  def __init__(self, path):
+    """
+    Args:
+      path: a str - path to manifest file (progress is not saved if None).
+    """
+    self.path = path
+    self.data = {}
+    self._last_save = 0.0
+    if path and os.path.exists(path):
+      with open(path) as manifest_file:
+        self.data = json.load(manifest_file)
+      logger.info('Loaded progress manifest from {}'.format(path))
+
+  def save(self, force=True):
+    """ Writes manifest to disk.
+
+    Args:
+      force: a bool - if False, manifest is written only if it wasn't
+        saved during last save_interval seconds.
+    """
+    if not self.path or not (force or self.is_save_due()):
+      return
+    # Write to a temporary file first so manifest is never left truncated.
+    tmp_path = '{}.tmp'.format(self.path)
+    with open(tmp_path, 'w') as manifest_file:
+      json.dump(self.data, manifest_file)
+    os.replace(tmp_path, self.path)
+    self._last_save = time.time()
+
+  def is_save_due(self):
+    """ Tells if save_interval has passed since the last save. """
+    return time.time() - self._last_save >= self.save_interval
+
+
+class CompletedRanges(object):
+  """ Tracks consecutive ID ranges which are processed out of order
+  and reports the max ID before which all ranges are completed.
+  """
+
+  def __init__(self, watermark):
+    """
+    Args:
+      watermark: a str - ID before which everything is already processed.
+    """
+    self.watermark = watermark
+    # Left ID of range -> (right ID of range, a bool indicating completion).
+    self._ranges = collections.OrderedDict()
+
+  @property
+  def pending(self):
+    return len(self._ranges)
+
+  def start(self, left_id, right_id):
+    self._ranges[left_id] = (right_id, False)
+
+  def complete(self, left_id):
+    """ Marks range as processed and moves watermark forward
+    if all preceding ranges are processed.
+
+    Args:
+      left_id: a str - left ID of completed range.
+    """
+    right_id, _ = self._ranges[left_id]
+    self._ranges[left_id] = (right_id, True)
+    while self._ranges:
+      first_left_id = next(iter(self._ranges))
+      first_right_id, completed = self._ranges[first_left_id]
+      if not completed:
+        break
+      self.watermark = first_right_id
+      del self._ranges[first_left_id]
+
+
+class ThroughputReporter(object):
+  """ Periodically logs number of processed documents and processing rate. """
+
+  report_interval = 10
+
+  def __init__(self, operation):
+    """
+    Args:
+      operation: a str - name of operation to mention in log messages.
+    """
+    self.operation = operation
+    self.documents = 0
+    self.pages = 0
+    self.start_time = None
+    self._stopped = False
+
+  def add(self, documents):
+    self.documents += documents
+    self.pages += 1
+
+  async def run(self):
+    """ Logs progress every report_interval seconds until stopped. """
+    self.start_time = time.time()
+    last_documents = 0
+    while not self._stopped:
+      await gen.sleep(self.report_interval)
+      recent_rate = (self.documents - last_documents) / self.report_interval
+      last_documents = self.documents
+      logger.info('{}: {} documents in {} pages ({:.1f} docs/s recently, '
+                  '{:.1f} docs/s overall)'
+                  .format(self.operation, self.documents, self.pages,
+                          recent_rate, self.overall_rate))
+
+  @property
+  def overall_rate(self):
+    if not self.start_time:
+      return 0.0
+    elapsed = time.time() - self.start_time
+    return self.documents / elapsed if elapsed else 0.0
+
+  def stop(self):
+    self._stopped = True
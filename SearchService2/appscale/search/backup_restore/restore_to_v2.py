@@ -3,14 +3,14 @@ Restore script for new Search Service.
 """
 import argparse
 import logging
-import random
+from concurrent.futures import ThreadPoolExecutor
 
 from kazoo.client import KazooClient
-from tornado import ioloop, gen
+from tornado import ioloop, gen, queues
 
 from appscale.common.constants import LOG_FORMAT, ZK_PERSISTENT_RECONNECTS
 from appscale.search import api_methods
-from appscale.search.backup_restore import storage
+from appscale.search.backup_restore import progress, storage
 
 from appscale.search.protocols import search_pb2
 
@@ -21,13 +21,14 @@ class Importer(object):
 
   max_retries = 10
 
-  def __init__(self, io_loop, source, zk_locations, max_concurrency):
+  def __init__(self, io_loop, source, zk_locations, max_concurrency, manifest):
     """
     Args:
       io_loop: an instance of tornado IOLoop.
       source: an instance of import Source (e.g.: S3Source).
       zk_locations: a list - Zookeeper locations.
-      max_concurrency: an int - maximum number of concurrent jobs.
+      max_concurrency: an int - number of objects imported concurrently.
+      manifest: an instance of ProgressManifest.
     """
     zk_client = KazooClient(
       hosts=','.join(zk_locations),
@@ -40,31 +41,47 @@ class Importer(object):
     self.status = 'Not started'
     self.finish_time = None
     self.api_methods = api_methods.APIMethods(zk_client)
-    self.scheduled_indexes = set()
-    self.scheduled_jobs = set()
     self.failed_jobs = set()
     self.succeeded_jobs = set()
     self.max_concurrency = max_concurrency
-    self.docs_imported = 0
+    self.manifest = manifest
+    # Keys of objects imported by previous runs are skipped.
+    self.imported_keys = set(manifest.data.get('imported_keys', []))
+    self.throughput = progress.ThroughputReporter('Import')
+    self.objects_queue = queues.Queue(maxsize=max_concurrency * 2)
+    # Blocking storage calls are done in threads (one per worker at most).
+    self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+  @property
+  def docs_imported(self):
+    return self.throughput.documents
 
   async def import_(self):
-    """ Starts concurrent jobs for importing all search indexes.
-    Then it waits for all started jobs to be completed.
+    """ Starts a pool of workers importing objects and feeds it
+    with keys of objects of all search indexes.
+    Then it waits for all objects to be imported.
     """
     self.start_time = self.ioloop.time()
     self.status = 'In progress'
 
-    for project_id, namespace, index in self.source.iter_indexes():
-      self.scheduled_indexes.add((project_id, namespace, index))
-      self.ioloop.add_callback(self.import_index,
-                               project_id, namespace, index)
-
-    logger.info('Waiting for all import jobs to be completed')
-    while self.scheduled_indexes or self.scheduled_jobs:
-      await gen.sleep(0.25)
-
-    logger.info('Import has been finished and took {:.2f}s'
-                .format(self.ioloop.time() - self.start_time))
+    self.ioloop.spawn_callback(self.throughput.run)
+    workers = [gen.convert_yielded(self.import_worker())
+               for _ in range(self.max_concurrency)]
+    indexes = await self.ioloop.run_in_executor(
+      self.executor, list, self.source.iter_indexes()
+    )
+    await gen.multi([self.import_index(*index) for index in indexes])
+    await self.objects_queue.join()
+    for _ in workers:
+      await self.objects_queue.put(None)
+    await gen.multi(workers)
+    self.executor.shutdown(wait=False)
+    self.throughput.stop()
+    self._record_progress(force=True)
+
+    logger.info('Import has been finished and took {:.2f}s ({:.1f} docs/s)'
+                .format(self.ioloop.time() - self.start_time,
+                        self.throughput.overall_rate))
 
     logger.info(' - {} jobs failed'
                 .format(len(self.failed_jobs)))
@@ -74,8 +91,8 @@ class Importer(object):
     self.finish_time = self.ioloop.time()
 
   async def import_index(self, project_id, namespace, index):
-    """ Starts concurrent jobs for importing entire index.
-    import_ method will wait for these jobs to be completed.
+    """ Puts keys of objects of entire index to the import queue.
+    import_ method will wait for these objects to be imported.
 
     Args:
       project_id: a str - GAE project ID.
@@ -84,19 +101,34 @@ class Importer(object):
     """
     logger.info('Starting import of index: {}/{}/{}'
                 .format(project_id, namespace, index))
-    first_page = True
-    for key in self.source.iter_object_keys(project_id, namespace, index):
-      while len(self.scheduled_jobs) > self.max_concurrency:
-        await gen.sleep(0.25 * (random.random() + 0.5))
-      self.scheduled_jobs.add(key)
-      self.ioloop.add_callback(self.import_page, key)
-      if first_page:
-        # Give the first self.import_page time to create index
-        # so we won't see warnings about collisions.
-        await gen.sleep(1)
-        first_page = False
-
-    self.scheduled_indexes.remove((project_id, namespace, index))
+    keys = await self.ioloop.run_in_executor(
+      self.executor, list,
+      self.source.iter_object_keys(project_id, namespace, index)
+    )
+    keys = [key for key in keys if key not in self.imported_keys]
+    if not keys:
+      return
+    # Import the first object before others so collection is created once
+    # and we won't see warnings about collisions.
+    try:
+      await self.import_page(keys[0])
+    except Exception:
+      logger.exception('Failed to import object {}'.format(keys[0]))
+    for key in keys[1:]:
+      await self.objects_queue.put(key)
+
+  async def import_worker(self):
+    """ Imports objects from the queue until None is received. """
+    while True:
+      object_key = await self.objects_queue.get()
+      try:
+        if object_key is None:
+          return
+        await self.import_page(object_key)
+      except Exception:
+        logger.exception('Failed to import object {}'.format(object_key))
+      finally:
+        self.objects_queue.task_done()
 
   async def import_page(self, object_key):
     """ Imports a single object from backup.
@@ -109,13 +141,17 @@ class Importer(object):
     for attempt in range(self.max_retries):
       try:
         # >>> DO MULTIPLE RETRIES FOR THE FRAGMENT OF CODE: >>>
-        index_documents_pb = self.source.get_index_documents_pb(object_key)
+        # Storage calls are blocking, so they are done in a thread.
+        index_documents_pb = await self.ioloop.run_in_executor(
+          self.executor, self.source.get_index_documents_pb, object_key
+        )
         response = search_pb2.IndexDocumentResponse()
         await self.api_methods.index_document(index_documents_pb, response)
         # <<< --------------------------------------------- <<<
-        self.docs_imported += len(index_documents_pb.params.document)
+        self.throughput.add(len(index_documents_pb.params.document))
         self.succeeded_jobs.add(object_key)
-        self.scheduled_jobs.remove(object_key)
+        self.imported_keys.add(object_key)
+        self._record_progress()
         logger.debug('Successfully imported object: {}'.format(object_key))
         break
       except Exception as err:
@@ -127,9 +163,18 @@ class Importer(object):
           await gen.sleep(backoff)
         else:
           self.failed_jobs.add(object_key)
-          self.scheduled_jobs.remove(object_key)
           raise
 
+  def _record_progress(self, force=False):
+    """ Saves keys of imported objects to progress manifest.
+
+    Args:
+      force: a bool - if False, manifest is saved only periodically.
+    """
+    if force or self.manifest.is_save_due():
+      self.manifest.data['imported_keys'] = list(self.imported_keys)
+      self.manifest.save()
+
 
 def main():
   """
@@ -154,6 +199,10 @@ def main():
     '--s3-secret-key', help='S3 secret key.')
   parser.add_argument(
     '--max-concurrency', type=int, help='Max import concurrency', default=10)
+  parser.add_argument(
+    '--progress-file', help='Path to JSON file where import progress is '
+                            'recorded. Interrupted import is resumed '
+                            'if the file exists.')
   args = parser.parse_args()
 
   if args.verbose:
@@ -170,7 +219,8 @@ def main():
     io_loop=io_loop,
     source=import_source,
     zk_locations=args.zk_locations,
-    max_concurrency=args.max_concurrency
+    max_concurrency=args.max_concurrency,
+    manifest=progress.ProgressManifest(args.progress_file)
   )
 
   try:
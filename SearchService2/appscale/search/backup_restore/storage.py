@@ -18,8 +18,15 @@ Expected data structure is approximately following:
 
 Every backup page contains serialized ProtocolBuffer message of type
 search_pb2.IndexDocument. It contains multiple documents which can be
-easily indexed to Search Service.
+easily indexed to Search Service. Pages are gzip-compressed
+(objects have ContentEncoding set to gzip), uncompressed pages written
+by older versions can be imported as well.
+
+Methods of sources and targets are blocking. They can be called from
+multiple threads at once, every thread uses its own S3 connection.
 """
+import gzip
+import threading
 
 import boto3
 from botocore import exceptions
@@ -27,6 +34,38 @@ from botocore import exceptions
 from appscale.search.protocols import search_pb2
 
 
+class ThreadLocalBucket(object):
+  """ Provides a separate boto3 Bucket to every thread
+  (boto3 resources can't be shared between threads).
+  """
+
+  def __init__(self, endpoint_url, bucket_name, access_key_id, secret_key):
+    """
+    Args:
+      endpoint_url: a str - S3 endpoint URL.
+      bucket_name: a str - S3 bucket name.
+      access_key_id: a str - S3 access key ID.
+      secret_key: a str - S3 secret key.
+    """
+    self._endpoint_url = endpoint_url
+    self._bucket_name = bucket_name
+    self._access_key_id = access_key_id
+    self._secret_key = secret_key
+    self._local = threading.local()
+
+  def get(self):
+    """ Returns a Bucket object of the current thread. """
+    bucket = getattr(self._local, 'bucket', None)
+    if bucket is None:
+      session = boto3.session.Session()
+      s3 = session.resource('s3', endpoint_url=self._endpoint_url,
+                            aws_access_key_id=self._access_key_id,
+                            aws_secret_access_key=self._secret_key)
+      bucket = s3.Bucket(self._bucket_name)
+      self._local.bucket = bucket
+    return bucket
+
+
 class S3Source(object):
   """ Import source implementation based on S3 backend """
 
@@ -39,12 +78,14 @@ class S3Source(object):
       secret_key: a str - S3 secret key.
     """
     self._endpoint_url = endpoint_url
-    self._s3 = boto3.resource('s3', endpoint_url=endpoint_url,
-                              aws_access_key_id=access_key_id,
-                              aws_secret_access_key=secret_key)
-    self._bucket = self._s3.Bucket(bucket_name)
+    self._buckets = ThreadLocalBucket(endpoint_url, bucket_name,
+                                      access_key_id, secret_key)
     self._iterator = None
 
+  @property
+  def _bucket(self):
+    return self._buckets.get()
+
   def iter_indexes(self):
     """ Generates full index name tuples present in the bucket:
     (<PROJECT_ID>, <NAMESPACE>, <INDEX>).
@@ -81,7 +122,10 @@ class S3Source(object):
     Returns:
       an instance of search_pb2.IndexDocumentRequest.
     """
-    object_body = self._bucket.Object(key).get()['Body'].read()
+    s3_object = self._bucket.Object(key).get()
+    object_body = s3_object['Body'].read()
+    if s3_object.get('ContentEncoding') == 'gzip':
+      object_body = gzip.decompress(object_body)
     index_documents_pb = search_pb2.IndexDocumentRequest()
     index_documents_pb.ParseFromString(object_body)
     return index_documents_pb
@@ -90,25 +134,30 @@ class S3Source(object):
 class S3Target(object):
   """ Export target implementation based on S3 backend """
 
-  def __init__(self, endpoint_url, bucket_name, access_key_id, secret_key):
+  def __init__(self, endpoint_url, bucket_name, access_key_id, secret_key,
+               compression_level=6):
     """
     Args:
       endpoint_url: a str - S3 endpoint URL.
       bucket_name: a str - S3 bucket name to import from.
       access_key_id: a str - S3 access key ID.
       secret_key: a str - S3 secret key.
+      compression_level: an int - gzip compression level (0 to disable).
     """
     self._endpoint_url = endpoint_url
-    self._s3 = boto3.resource('s3', endpoint_url=endpoint_url,
-                              aws_access_key_id=access_key_id,
-                              aws_secret_access_key=secret_key)
-    self._bucket = self._s3.Bucket(bucket_name)
+    self._buckets = ThreadLocalBucket(endpoint_url, bucket_name,
+                                      access_key_id, secret_key)
+    self._compression_level = compression_level
     try:
       self._bucket.create()
     except exceptions.ClientError as err:
       if err.response['Error']['Code'] != 'BucketAlreadyOwnedByYou':
         raise
 
+  @property
+  def _bucket(self):
+    return self._buckets.get()
+
   def save(self, project_id, namespace, index_name, index_documents_pb):
     """ Saves search_pb2.IndexDocumentRequest to S3 storage.
 
@@ -125,4 +174,8 @@ class S3Target(object):
       project_id, namespace, index_name, first_doc_id
     )
     body = index_documents_pb.SerializeToString()
-    self._bucket.put_object(Key=key, Body=body)
+    if self._compression_level:
+      body = gzip.compress(body, self._compression_level)
+      self._bucket.put_object(Key=key, Body=body, ContentEncoding='gzip')
+    else:
+      self._bucket.put_object(Key=key, Body=body)
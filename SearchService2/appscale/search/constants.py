@@ -3,9 +3,31 @@ from appscale.search.protocols import search_pb2
 # Max amount of time to wait for response from Solr (in seconds).
 SOLR_TIMEOUT = 60
 
+# Max number of simultaneous HTTP requests to Solr.
+SOLR_MAX_CLIENTS = 100
+
+# Max number of simultaneous HTTP requests to a single Solr node.
+SOLR_MAX_REQUESTS_PER_NODE = 20
+
 # Max amount of time to wait before commit updates (in milliseconds).
 SOLR_COMMIT_WITHIN = 0
 
+# Time during which cached collection schema is used without refreshing (s).
+SCHEMA_CACHE_TTL = 30
+
+# Max age of cached schema which can be served while it's being
+# refreshed in background (in seconds).
+SCHEMA_CACHE_MAX_STALENESS = 300
+
+# Time during which concurrent updates of a collection are merged (s).
+SOLR_UPDATE_BATCH_WINDOW = 0.02
+
+# Number of documents in merged update which triggers immediate sending.
+SOLR_UPDATE_BATCH_SIZE = 500
+
+# Max number of converted Search API queries to keep in memory.
+QUERY_CACHE_SIZE = 2048
+
 # Name of Solr configs set for appscale collections.
 APPSCALE_CONFIG_SET_NAME = 'appscale_search_api_config'
 
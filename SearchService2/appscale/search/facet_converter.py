@@ -7,41 +7,80 @@ from appscale.search.models import FacetResult, SolrSchemaFieldInfo
 logger = logging.getLogger(__name__)
 
 
-def discover_facets(facets_stats, facets_count, value_limit):
-  """ Prepares a list of facets to request from Solr based on
-  facets statistics.
+# Prefix of keys of facets used for discovering top facets.
+DISCOVERY_KEY_PREFIX = 'discover.'
+
+
+def generate_discovery_facets(facet_fields, value_limit):
+  """ Prepares facets which are computed for every facet field
+  to pick top facets of matching documents within the same Solr request.
+  Every facet reports a number of matching documents containing the field
+  and either top terms (for atom facets) or min and max (for numbers).
 
   Args:
-    facets_stats: a list of tuples (<SolrSchemaFieldInfo>, <count>).
-    facets_count: an int - number of top facets to discover.
+    facet_fields: a list of SolrSchemaFieldInfo of facet index fields.
     value_limit: an int - max number of values to request.
   Returns:
-    A tuple (<list of tuples (<facet key>, <facet info>)>,
-             <list of tuples (<solr_field>, <stats_line>)>).
+    A list of tuples (<facet key>, <facet info>).
   """
-  sorted_facets = sorted(facets_stats, key=lambda item: -item[1])
-  top_facets = sorted_facets[:facets_count]
   facet_items = []
-  stats_items = []
-  for solr_field, documents_count in top_facets:
-    gae_name = solr_field.gae_name
+  for solr_field in facet_fields:
     solr_name = solr_field.solr_name
     if solr_field.type == SolrSchemaFieldInfo.Type.ATOM_FACET_INDEX:
-      facet_key = '{}*'.format(gae_name)
-      facet_info = {
-        'type': 'terms',
-        'field': solr_name,
-        'limit': value_limit
+      nested_facets = {
+        'values': {'type': 'terms', 'field': solr_name, 'limit': value_limit}
       }
-      facet_items.append((facet_key, facet_info))
     else:
-      # Simple facet request for numbers means retrieving min, max and count.
-      stats_line = (
-        '{{!min=true max=true count=true}}{field_name}'
-        .format(field_name=solr_name)
-      )
-      stats_items.append((solr_field, stats_line))
-  return facet_items, stats_items
+      nested_facets = {
+        'min': 'min({})'.format(solr_name),
+        'max': 'max({})'.format(solr_name)
+      }
+    facet_info = {
+      'type': 'query',
+      'q': '{}:*'.format(solr_name),
+      'facet': nested_facets
+    }
+    facet_items.append((DISCOVERY_KEY_PREFIX + solr_name, facet_info))
+  return facet_items
+
+
+def convert_discovered_facets(solr_facet_results, facet_fields, facets_count):
+  """ Picks facets which are specified for the greatest number of
+  matching documents and converts them to a list of FacetResult.
+
+  Args:
+    solr_facet_results: a dict containing facets from Solr response.
+    facet_fields: a list of SolrSchemaFieldInfo passed to
+      generate_discovery_facets.
+    facets_count: an int - number of top facets to discover.
+  Returns:
+    A list of FacetResult.
+  """
+  discovered = []
+  for solr_field in facet_fields:
+    solr_facet_result = solr_facet_results.get(
+      DISCOVERY_KEY_PREFIX + solr_field.solr_name, {}
+    )
+    documents_count = solr_facet_result.get('count', 0)
+    if documents_count:
+      discovered.append((solr_field, documents_count, solr_facet_result))
+
+  discovered.sort(key=lambda item: -item[1])
+  facet_results = []
+  for solr_field, documents_count, solr_facet_result in (
+      discovered[:facets_count]):
+    if solr_field.type == SolrSchemaFieldInfo.Type.ATOM_FACET_INDEX:
+      buckets = solr_facet_result.get('values', {}).get('buckets', [])
+      values = [(bucket['val'], bucket['count']) for bucket in buckets]
+    else:
+      # Simple facet for numbers means retrieving min, max and count.
+      value_label = '[{},{})'.format(solr_facet_result['min'],
+                                     solr_facet_result['max'])
+      values = [(value_label, documents_count)]
+    facet_results.append(
+      FacetResult(name=solr_field.gae_name, values=values, ranges=[])
+    )
+  return facet_results
 
 
 def generate_refinement_filter(schema_grouped_facets, refinements):
@@ -148,6 +187,9 @@ def convert_facet_results(solr_facet_results, stats_results):
   facet_ranges = collections.defaultdict(list)
   facet_results = []
   for facet_key, solr_facet_result in solr_facet_results.items():
+    if facet_key.startswith(DISCOVERY_KEY_PREFIX):
+      # Discovered facets are converted by convert_discovered_facets.
+      continue
     if ':' in facet_key:
       # (1) it's one of values
       gae_facet_name, value = facet_key.split(':')
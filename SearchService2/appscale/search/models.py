@@ -128,6 +128,7 @@ class SolrIndexSchemaInfo(object):
   facets = attr.ib()
   grouped_fields = attr.ib()
   grouped_facet_indexes = attr.ib()
+  fields_fingerprint = attr.ib(default=None)
 
 
 @attr.s(cmp=False, hash=False, slots=True, frozen=True)
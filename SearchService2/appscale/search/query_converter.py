@@ -1,28 +1,99 @@
 """
 Code for turning a GAE Search query into a SOLR query.
 """
+import collections
 import logging
 
-from appscale.search.constants import InvalidRequest
+from appscale.search.constants import InvalidRequest, QUERY_CACHE_SIZE
 from appscale.search.models import SolrQueryOptions, SolrSchemaFieldInfo
 from appscale.search.query_parser import parser
 
 logger = logging.getLogger(__name__)
 
 
-def prepare_solr_query(gae_query, fields, grouped_fields):
+class SolrQueryCache(object):
+  """ LRU cache of converted queries. """
+
+  def __init__(self, max_size=QUERY_CACHE_SIZE):
+    """ Initializes SolrQueryCache.
+
+    Args:
+      max_size: an int - max number of queries to keep.
+    """
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self._items = collections.OrderedDict()
+
+  def get(self, key):
+    """ Retrieves cached query options.
+
+    Args:
+      key: a tuple (<GAE query>, <schema fingerprint>).
+    Returns:
+      An instance of SolrQueryOptions or None.
+    """
+    solr_query_options = self._items.get(key)
+    if solr_query_options is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self._items.move_to_end(key)
+    return solr_query_options
+
+  def put(self, key, solr_query_options):
+    """ Puts query options to the cache evicting least recently used item.
+
+    Args:
+      key: a tuple (<GAE query>, <schema fingerprint>).
+      solr_query_options: an instance of SolrQueryOptions.
+    """
+    self._items[key] = solr_query_options
+    self._items.move_to_end(key)
+    if len(self._items) > self.max_size:
+      self._items.popitem(last=False)
+
+
+query_cache = SolrQueryCache()
+
+
+def get_schema_fingerprint(fields):
+  """ Builds a hashable value identifying fields which affect
+  query conversion.
+
+  Args:
+    fields: a list of SolrSchemaFieldInfo.
+  Returns:
+    A tuple of (<solr name>, <type>) pairs.
+  """
+  return tuple((field.solr_name, field.type) for field in fields)
+
+
+def prepare_solr_query(gae_query, fields, grouped_fields,
+                       schema_fingerprint=None):
   """ Converts gae_query string into Solr query string.
+  Results are cached, so the same query against the same schema
+  is parsed only once.
 
   Args:
     gae_query: a str containing GAE Search query.
     fields: a list of SolrSchemaFieldInfo.
     grouped_fields: a dict containing mapping from GAE field name
                     to list of SolrSchemaFieldInfo.
+    schema_fingerprint: a result of get_schema_fingerprint(fields)
+                        (it is computed if not specified).
   Returns:
     An instance of SolrQueryOptions.
   """
-  converter = _QueryConverter(gae_query, fields, grouped_fields)
-  return converter.solr_query()
+  if schema_fingerprint is None:
+    schema_fingerprint = get_schema_fingerprint(fields)
+  cache_key = (gae_query, schema_fingerprint)
+  solr_query_options = query_cache.get(cache_key)
+  if solr_query_options is None:
+    converter = _QueryConverter(gae_query, fields, grouped_fields)
+    solr_query_options = converter.solr_query()
+    query_cache.put(cache_key, solr_query_options)
+  return solr_query_options
 
 
 _SOLR_TYPE = SolrSchemaFieldInfo.Type
@@ -23,6 +23,7 @@ ExpressionsGroup(
 """
 import datetime
 import logging
+import re
 
 import antlr4
 import attr
@@ -156,10 +157,81 @@ def _group_or_single_value(operator, elements):
 # ^^^^^^^^^^^^^^^^^^^^^^^^^^^
 
 
+# ======================================
+#  Simple queries which skip antlr4:
+# --------------------------------------
+# Tokens as they are defined in query.g4 (QUOTED without escaped quotes).
+_WORD = r'[^ \t\r\n\\"~=<>:(),]+'
+_QUOTED = r'"[^"\\]*"'
+_WS = r'[ \t\r\n]'
+# A single term of query which is a sequence of terms connected by implicit
+# AND, e.g.: `laptop ~cheap NOT refurbished brand:acme title:"hello world"`.
+_SIMPLE_TERM = re.compile(
+  r'{ws}*(?:'
+  r'(?P<field_name>{word})[:=](?P<field_value>{word}|{quoted})'
+  r'|(?:(?P<not>NOT){ws}+|(?P<stem>~))?(?P<value>{word}|{quoted})'
+  r')(?={ws}|$)'.format(word=_WORD, quoted=_QUOTED, ws=_WS)
+)
+_KEYWORDS = {'AND', 'OR', 'NOT'}
+
+
+def _parse_simple_query(query_str):
+  """ Parses query consisting of plain terms without using antlr4.
+
+  Args:
+    query_str: a str representing GAE search query.
+  Returns:
+    An Expression or ExpressionsGroup corresponding to query_str
+    or None if query is not simple.
+  """
+  expressions = []
+  position = 0
+  end = len(query_str.rstrip(' \t\r\n'))
+  while position < end:
+    match = _SIMPLE_TERM.match(query_str, position, end)
+    if not match:
+      return None
+    field_name = match.group('field_name')
+    if field_name is not None:
+      value_str = match.group('field_value')
+      if field_name in _KEYWORDS:
+        return None
+      value = Value(not_=False, stem=False, str_value=value_str)
+    else:
+      value_str = match.group('value')
+      value = Value(not_=match.group('not') is not None,
+                    stem=match.group('stem') is not None,
+                    str_value=value_str)
+    if value_str in _KEYWORDS:
+      return None
+    expressions.append(
+      Expression(field_name=field_name, operator=EQUALS, value=value)
+    )
+    position = match.end()
+  if not expressions:
+    return None
+  return _group_or_single_expr(AND, expressions)
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+
+
 def parse_query(query_str):
   """ Parses GAE search query and returns easily readable
   composition of Expressions.
 
+  Args:
+    query_str: a str representing GAE search query.
+  Returns:
+    An Expression or ExpressionsGroup corresponding to query_str.
+  """
+  simple_query = _parse_simple_query(query_str)
+  if simple_query is not None:
+    return simple_query
+  return _parse_antlr_query(query_str)
+
+
+def _parse_antlr_query(query_str):
+  """ Parses GAE search query using parser generated by antlr4.
+
   Args:
     query_str: a str representing GAE search query.
   Returns:
@@ -21,7 +21,7 @@ from appscale.common.constants import (
   LOG_FORMAT, SEARCH_SERVERS_NODE, ZK_PERSISTENT_RECONNECTS)
 from tornado import ioloop, web
 
-from appscale.search import api_methods
+from appscale.search import api_methods, query_converter
 from appscale.search.constants import SearchServiceError
 from appscale.search.protocols import search_pb2, remote_api_pb2
 
@@ -119,15 +119,20 @@ class ProtobufferAPIHandler(web.RequestHandler):
 class HealthRequestHandler(web.RequestHandler):
   """ Serves health check requests to SearchService2. """
 
-  def initialize(self, solr_api, zk_client):
-    self.solr_api = solr_api
+  def initialize(self, solr_adapter, zk_client):
+    self.solr_adapter = solr_adapter
     self.zk_client = zk_client
 
   def get(self):
     self.set_header('Content-Type', 'application/json')
     self.write(json.dumps({
-      'solr_live_nodes': self.solr_api.live_nodes,
-      'zookeeper_state': self.zk_client.state
+      'solr_live_nodes': self.solr_adapter.solr.live_nodes,
+      'zookeeper_state': self.zk_client.state,
+      'schema_cache': self.solr_adapter.schema_cache_stats,
+      'query_cache': {
+        'hits': query_converter.query_cache.hits,
+        'misses': query_converter.query_cache.misses
+      }
     }))
 
 
@@ -231,7 +236,7 @@ def main():
   logging.info('Starting server on port {}'.format(args.port))
   app = web.Application([
     (r'/?', ProtobufferAPIHandler, {'api': api}),
-    (r'/_health', HealthRequestHandler, {'solr_api': methods.solr_adapter.solr,
+    (r'/_health', HealthRequestHandler, {'solr_adapter': methods.solr_adapter,
                                          'zk_client': zk_client}),
   ])
   app.listen(args.port)
@@ -5,6 +5,7 @@ Interaction between APIMethods and SolrAdapter is done using objects
 described in appscale.search.models.
 """
 
+import asyncio
 import collections
 import logging
 import re
@@ -14,13 +15,15 @@ from datetime import datetime
 from appscale.search import query_converter, facet_converter
 from appscale.search.constants import (
   SOLR_ZK_ROOT, SUPPORTED_LANGUAGES, UnknownFieldTypeException,
-  UnknownFacetTypeException, InvalidRequest)
+  UnknownFacetTypeException, InvalidRequest, SCHEMA_CACHE_TTL,
+  SCHEMA_CACHE_MAX_STALENESS)
 from appscale.search.models import (
   Field, ScoredDocument, SearchResult, SolrIndexSchemaInfo, SolrSchemaFieldInfo,
   Facet, IndexMetadata
 )
 from appscale.search.settings import SearchServiceSettings
 from appscale.search.solr_api import SolrAPI
+from appscale.search.update_batcher import UpdateBatcher
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +48,26 @@ class SolrAdapter(object):
     """
     self._settings = SearchServiceSettings(zk_client)
     self.solr = SolrAPI(zk_client, SOLR_ZK_ROOT, self._settings)
+    self._update_batcher = UpdateBatcher(self.solr)
+    # Collection name -> (fetch time, SolrIndexSchemaInfo, Solr field names).
+    self._schema_cache = {}
+    # Collection name -> Future of schema info which is being fetched.
+    self._schema_fetches = {}
+    self.schema_cache_hits = 0
+    self.schema_cache_misses = 0
+
+  @property
+  def schema_cache_stats(self):
+    """ Reports how efficiently collection schemas are cached.
+
+    Returns:
+      A dict containing number of cache hits, misses and cached collections.
+    """
+    return {
+      'hits': self.schema_cache_hits,
+      'misses': self.schema_cache_misses,
+      'collections': len(self._schema_cache)
+    }
 
   async def list_indexes(self, app_id):
     """ Retrieves basic indexes metadata.
@@ -66,6 +89,8 @@ class SolrAdapter(object):
 
   async def index_documents(self, app_id, namespace, index_name, documents):
     """ Puts specified documents into the index (asynchronously).
+    Documents are sent to Solr together with other updates of the index
+    received at about the same time.
 
     Args:
       app_id: a str representing Application ID.
@@ -75,10 +100,19 @@ class SolrAdapter(object):
     """
     collection = get_collection_name(app_id, namespace, index_name)
     solr_documents = [_to_solr_document(doc) for doc in documents]
-    await self.solr.put_documents(collection, solr_documents)
+    await self._update_batcher.put_documents(collection, solr_documents)
+    cached = self._schema_cache.get(collection)
+    if cached:
+      _, _, known_fields = cached
+      if any(solr_field_name not in known_fields
+             for solr_doc in solr_documents for solr_field_name in solr_doc):
+        # New dynamic fields were created, cached schema is outdated.
+        self._invalidate_schema_info(collection)
 
   async def delete_documents(self, app_id, namespace, index_name, ids):
     """ Deletes documents with specified IDs from the index (asynchronously).
+    Deletion is sent to Solr together with other updates of the index
+    received at about the same time.
 
     Args:
       app_id: a str representing Application ID.
@@ -87,7 +121,7 @@ class SolrAdapter(object):
       ids: a list of document IDs to delete.
     """
     collection = get_collection_name(app_id, namespace, index_name)
-    await self.solr.delete_documents(collection, ids)
+    await self._update_batcher.delete_documents(collection, ids)
 
   async def list_documents(self, app_id, namespace, index_name, start_doc_id,
                            include_start_doc, limit, keys_only,
@@ -166,7 +200,8 @@ class SolrAdapter(object):
     index_schema = await self._get_schema_info(app_id, namespace, index_name)
     # Convert Search API query to Solr query with a list of fields to search.
     query_options = query_converter.prepare_solr_query(
-      query, index_schema.fields, index_schema.grouped_fields
+      query, index_schema.fields, index_schema.grouped_fields,
+      index_schema.fields_fingerprint
     )
     # Process GAE projection fields
     solr_projection_fields = self._convert_projection(
@@ -183,9 +218,9 @@ class SolrAdapter(object):
       refinement_filter = facet_converter.generate_refinement_filter(
         index_schema.grouped_facet_indexes, facet_refinements
       )
-    facet_items, stats_items = await self._convert_facet_args(
+    facet_items, stats_items, discovery_fields = self._convert_facet_args(
       auto_discover_facet_count, facet_auto_detect_limit, facet_requests,
-      index_schema, query_options, refinement_filter
+      index_schema
     )
     stats_fields = [stats_line for solr_field, stats_line in stats_items]
 
@@ -211,6 +246,10 @@ class SolrAdapter(object):
     facet_results = facet_converter.convert_facet_results(
       solr_result.facet_results, stats_results
     )
+    if discovery_fields:
+      facet_results = facet_converter.convert_discovered_facets(
+        solr_result.facet_results, discovery_fields, auto_discover_facet_count
+      ) + facet_results
     result = SearchResult(
       num_found=solr_result.num_found, scored_documents=docs,
       cursor=cursor, facet_results=facet_results
@@ -305,9 +344,9 @@ class SolrAdapter(object):
       solr_sort_expressions = ['rank desc']
     return solr_sort_expressions
 
-  async def _convert_facet_args(self, auto_discover_facet_count,
-                                facet_auto_detect_limit, facet_requests,
-                                index_schema, query_options, refinement_filter):
+  @staticmethod
+  def _convert_facet_args(auto_discover_facet_count, facet_auto_detect_limit,
+                          facet_requests, index_schema):
     """ Converts GAE facet arguments to Solr facet items
     and Solr stats fields.
 
@@ -316,26 +355,24 @@ class SolrAdapter(object):
       facet_auto_detect_limit: An int - number of top terms to return.
       facet_requests: A list of FacetRequest.
       index_schema: An instance of SolrIndexSchemaInfo.
-      query_options: An instance of SolrQueryOptions.
-      refinement_filter: A str - Solr filter corresponding to refinement.
-    Returns (asynchronously):
-      A tuple of two lists (<facet_items>, <stats_items>).
+    Returns:
+      A tuple of three lists (<facet_items>, <stats_items>,
+      <facet fields to discover top facets from>).
     """
     # Process Facet params
     facet_items = []
     stats_items = []
+    discovery_fields = []
     if auto_discover_facet_count:
-      # Figure out what facets are specified for greater number of documents.
-      atom_facets_stats = await self._get_facets_stats(
-        index_schema, query_options, refinement_filter
-      )
-      # Add auto-discovered facets to the list.
-      auto_facet_items, auto_stats_items = facet_converter.discover_facets(
-        atom_facets_stats, auto_discover_facet_count,
-        facet_auto_detect_limit
+      # Top facets are picked from results of the main query, so all facets
+      # which can be discovered are requested.
+      discovery_fields = [
+        facet for facet in index_schema.facets
+        if SolrSchemaFieldInfo.Type.is_facet_index(facet.type)
+      ]
+      facet_items += facet_converter.generate_discovery_facets(
+        discovery_fields, facet_auto_detect_limit
       )
-      facet_items += auto_facet_items
-      stats_items += auto_stats_items
     if facet_requests:
       # Add explicitly specified facets to the list.
       explicit_facet_items, explicit_stats_items = (
@@ -345,10 +382,91 @@ class SolrAdapter(object):
       )
       facet_items += explicit_facet_items
       stats_items += explicit_stats_items
-    return facet_items, stats_items
+    return facet_items, stats_items, discovery_fields
 
   async def _get_schema_info(self, app_id, namespace, gae_index_name):
     """ Retrieves information about schema of Solr collection
+    corresponding to Search API index. Schema is cached for SCHEMA_CACHE_TTL
+    seconds, after that it is refreshed in background while the cached
+    version is still served (up to SCHEMA_CACHE_MAX_STALENESS seconds).
+
+    Args:
+      app_id: a str representing Application ID.
+      namespace: a str representing GAE namespace or None.
+      gae_index_name: a str representing name of Search API index.
+    Returns (asynchronously):
+      An instance of SolrIndexSchemaInfo.
+    """
+    collection = get_collection_name(app_id, namespace, gae_index_name)
+    cached = self._schema_cache.get(collection)
+    if cached:
+      fetched_at, index_schema, _ = cached
+      age = time.time() - fetched_at
+      if age < SCHEMA_CACHE_MAX_STALENESS:
+        self.schema_cache_hits += 1
+        if age >= SCHEMA_CACHE_TTL:
+          self._start_schema_fetch(app_id, namespace, gae_index_name)
+        return index_schema
+    self.schema_cache_misses += 1
+    return await self._start_schema_fetch(app_id, namespace, gae_index_name)
+
+  def _start_schema_fetch(self, app_id, namespace, gae_index_name):
+    """ Starts fetching of collection schema unless it's already in progress.
+
+    Args:
+      app_id: a str representing Application ID.
+      namespace: a str representing GAE namespace or None.
+      gae_index_name: a str representing name of Search API index.
+    Returns:
+      A Future which resolves to SolrIndexSchemaInfo.
+    """
+    collection = get_collection_name(app_id, namespace, gae_index_name)
+    fetch = self._schema_fetches.get(collection)
+    if fetch is None:
+      fetch = asyncio.ensure_future(
+        self._fetch_schema_info(app_id, namespace, gae_index_name)
+      )
+      self._schema_fetches[collection] = fetch
+      fetch.add_done_callback(
+        lambda future: self._schema_fetch_done(collection, future)
+      )
+    return fetch
+
+  def _schema_fetch_done(self, collection, fetch):
+    """ Puts fetched schema to the cache.
+
+    Args:
+      collection: a str - name of Solr collection.
+      fetch: a completed Future of SolrIndexSchemaInfo.
+    """
+    if self._schema_fetches.get(collection) is not fetch:
+      # Schema was invalidated while it was being fetched.
+      return
+    del self._schema_fetches[collection]
+    if fetch.cancelled():
+      return
+    if fetch.exception():
+      logger.warning('Failed to fetch schema of {} ({})'
+                     .format(collection, fetch.exception()))
+      return
+    index_schema = fetch.result()
+    known_fields = {'id', 'rank', 'language'}
+    known_fields.update(field.solr_name for field in index_schema.fields)
+    known_fields.update(facet.solr_name for facet in index_schema.facets)
+    self._schema_cache[collection] = (time.time(), index_schema, known_fields)
+
+  def _invalidate_schema_info(self, collection):
+    """ Removes collection schema from the cache.
+
+    Args:
+      collection: a str - name of Solr collection.
+    """
+    self._schema_cache.pop(collection, None)
+    # Result of pending fetch may not contain recently added fields.
+    self._schema_fetches.pop(collection, None)
+
+  async def _fetch_schema_info(self, app_id, namespace, gae_index_name):
+    """ Requests information about schema of Solr collection
     corresponding to Search API index.
 
     Args:
@@ -417,42 +535,9 @@ class SolrAdapter(object):
       fields=fields,
       facets=facets,
       grouped_fields=grouped_fields,
-      grouped_facet_indexes=grouped_facet_indexes
-    )
-
-  async def _get_facets_stats(self, index_schema, query_options,
-                              refinement_filter):
-    """ Retrieves statistics of fields corresponding to facets of atom type.
-    Statistics per fields contains only number of documents containing
-    that solr field from those documents which matches the query.
-
-    Args:
-      index_schema: an instance of SolrIndexSchemaInfo.
-      query_options: a instance of SolrQueryOptions.
-      refinement_filter: a str representing Solr filter.
-    Returns:
-      A list of tuples (<SolrSchemaFieldInfo>, <documents count>).
-    """
-    facets_fields = [
-      facet for facet in index_schema.facets
-      if SolrSchemaFieldInfo.Type.is_facet_index(facet.type)
-    ]
-    request_facet_stats = [
-      # e.g.: '{!count=true}myfacetname_facet'
-      '{{!count=true}}{field_name}'.format(field_name=facet.solr_name)
-      for facet in facets_fields
-    ]
-    solr_result = await self.solr.query_documents(
-      collection=index_schema.collection, query=query_options.query_string,
-      offset=0, limit=0, fields=['id'], def_type=query_options.def_type,
-      query_fields=query_options.query_fields, filter_=refinement_filter,
-      stats_fields=request_facet_stats
+      grouped_facet_indexes=grouped_facet_indexes,
+      fields_fingerprint=query_converter.get_schema_fingerprint(fields)
     )
-    field_stats_items = []
-    for facet in facets_fields:
-      documents_count = solr_result.stats_results[facet.solr_name]['count']
-      field_stats_items.append((facet, documents_count))
-    return field_stats_items
 
 
 def get_collection_name(app_id, namespace, gae_index_name):
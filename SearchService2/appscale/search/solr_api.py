@@ -3,20 +3,24 @@ Helper module for handling routine work when communicating with Solr API.
 It knows where Solr servers are located, how to pass request arguments
 to API methods, etc.
 """
+import collections
+import functools
 import itertools
 import json
 import logging
+import random
 import socket
 import time
 
 from urllib.parse import urlencode
 
-from tornado import httpclient, ioloop
+from tornado import httpclient, ioloop, locks
 from appscale.common import appscale_info
 
 from appscale.search.constants import (
   SolrIsNotReachable, SOLR_TIMEOUT, SolrClientError, SolrServerError,
-  SolrError, SOLR_COMMIT_WITHIN, APPSCALE_CONFIG_SET_NAME
+  SolrError, SOLR_COMMIT_WITHIN, APPSCALE_CONFIG_SET_NAME, SOLR_MAX_CLIENTS,
+  SOLR_MAX_REQUESTS_PER_NODE
 )
 from appscale.search.models import SolrSearchResult
 
@@ -32,16 +36,55 @@ def tornado_synchronous(coroutine):
     A regular python function.
   """
   def synchronous_coroutine(*args, **kwargs):
-    async = lambda: coroutine(*args, **kwargs)
+    run_coroutine = lambda: coroutine(*args, **kwargs)
     # Like synchronous HTTPClient, create separate IOLoop for sync code
     io_loop = ioloop.IOLoop(make_current=False)
     try:
-      return io_loop.run_sync(async)
+      return io_loop.run_sync(run_coroutine)
     finally:
       io_loop.close()
   return synchronous_coroutine
 
 
+def configure_http_client():
+  """ Configures AsyncHTTPClient which is shared by all Solr requests.
+  Curl-based client is used if pycurl is installed as it keeps
+  connections to Solr nodes alive between requests.
+  """
+  try:
+    import pycurl  # pylint: disable=unused-import
+    implementation = 'tornado.curl_httpclient.CurlAsyncHTTPClient'
+  except ImportError:
+    logger.warning('pycurl is not installed, connections to Solr '
+                   'will not be reused')
+    implementation = None
+  httpclient.AsyncHTTPClient.configure(implementation,
+                                       max_clients=SOLR_MAX_CLIENTS)
+
+
+def parse_collection_state(state):
+  """ Lists Solr nodes hosting active replicas of collection.
+
+  Args:
+    state: a dict - collection state as stored in Zookeeper
+      (e.g.: content of /collections/<COLLECTION>/state.json).
+  Returns:
+    A tuple of two sets (<nodes hosting shard leaders>, <all nodes>).
+  """
+  leader_nodes = set()
+  replica_nodes = set()
+  for collection_state in state.values():
+    for shard in collection_state.get('shards', {}).values():
+      for replica in shard.get('replicas', {}).values():
+        if replica.get('state') != 'active':
+          continue
+        node = replica['node_name'].replace('_solr', '')
+        replica_nodes.add(node)
+        if replica.get('leader') == 'true':
+          leader_nodes.add(node)
+  return leader_nodes, replica_nodes
+
+
 class SolrAPI(object):
   """
   A helper class for performing basic operations with Solr.
@@ -63,9 +106,21 @@ class SolrAPI(object):
     self._solr_live_nodes_cycle = itertools.cycle(self._solr_live_nodes_list)
     self._local_solr = None
     self._private_ip = appscale_info.get_private_ip()
+    # Collection name -> (<nodes hosting leaders>, <nodes hosting replicas>).
+    self._collection_nodes = {}
+    self._watched_collections = set()
+    # Node location -> number of requests sent and not yet answered.
+    self._outstanding_requests = collections.Counter()
+    self._node_semaphores = collections.defaultdict(
+      lambda: locks.Semaphore(SOLR_MAX_REQUESTS_PER_NODE)
+    )
+    configure_http_client()
     self._zk_client.ChildrenWatch(
       '{}/live_nodes'.format(self._solr_zk_root), self._update_live_nodes
     )
+    self._zk_client.ChildrenWatch(
+      '{}/collections'.format(self._solr_zk_root), self._update_collections
+    )
     self._collections_cache = set()
     self._broken_collections_cache = set()
     self._cache_timestamp = 0.0
@@ -91,6 +146,49 @@ class SolrAPI(object):
     logger.info('Got a new list of solr live nodes: {}'
                 .format(self._solr_live_nodes_list))
 
+  def _update_collections(self, new_collections):
+    """ Starts watching state of new Solr collections.
+
+    Args:
+      new_collections: a list of strings representing collection names.
+    """
+    for collection in new_collections:
+      if collection in self._watched_collections:
+        continue
+      self._watched_collections.add(collection)
+      self._zk_client.DataWatch(
+        '{}/collections/{}/state.json'.format(self._solr_zk_root, collection),
+        functools.partial(self._update_collection_state, collection)
+      )
+
+  def _update_collection_state(self, collection, state_json, stat=None,
+                               event=None):
+    """ Updates information about nodes hosting collection replicas.
+    It is called by kazoo DataWatch as func(data, stat, event)
+    with collection name bound in advance.
+
+    Args:
+      collection: a str - name of Solr collection.
+      state_json: a bytes - content of collection state node.
+      stat: an instance of ZnodeStat (unused).
+      event: an instance of WatchedEvent (unused).
+    Returns:
+      False if collection was deleted and its state shouldn't be watched.
+    """
+    if state_json is None:
+      self._collection_nodes.pop(collection, None)
+      self._watched_collections.discard(collection)
+      return False
+    try:
+      state = json.loads(state_json.decode('utf-8'))
+      self._collection_nodes[collection] = parse_collection_state(state)
+    except (ValueError, KeyError, AttributeError):
+      logger.warning('Failed to parse state of collection {}'
+                     .format(collection))
+      self._collection_nodes.pop(collection, None)
+    logger.debug('Got new state of collection {}: {}'.format(
+      collection, self._collection_nodes.get(collection)))
+
   @property
   def solr_location(self):
     """
@@ -103,11 +201,46 @@ class SolrAPI(object):
       raise SolrIsNotReachable('There are no Solr live nodes')
     return next(self._solr_live_nodes_cycle)
 
+  def choose_location(self, collection=None, update=False):
+    """ Picks Solr node to send collection request to.
+    Nodes hosting collection replicas (shard leaders for updates) are
+    preferred as they can serve request without an extra hop. Local node
+    is chosen if it is one of candidates, otherwise the least busy one.
+
+    Args:
+      collection: a str - name of Solr collection the request is related to.
+      update: a bool indicating if request updates documents.
+    Returns:
+      A string representing Solr location.
+    """
+    if not self._solr_live_nodes_list:
+      raise SolrIsNotReachable('There are no Solr live nodes')
+    nodes = self._collection_nodes.get(collection) if collection else None
+    if not nodes:
+      return self.solr_location
+    leader_nodes, replica_nodes = nodes
+    live_nodes = set(self._solr_live_nodes_list)
+    candidates = (leader_nodes if update else replica_nodes) & live_nodes
+    if not candidates:
+      candidates = replica_nodes & live_nodes
+    if not candidates:
+      return self.solr_location
+    if self._local_solr in candidates:
+      return self._local_solr
+    least_outstanding = min(
+      self._outstanding_requests[node] for node in candidates
+    )
+    return random.choice([
+      node for node in candidates
+      if self._outstanding_requests[node] == least_outstanding
+    ])
+
   @property
   def live_nodes(self):
       return self._solr_live_nodes_list
 
-  async def request(self, method, path, params=None, json_data=None):
+  async def request(self, method, path, params=None, json_data=None,
+                    collection=None, update=False):
     """ Sends HTTP request to one of Solr live nodes.
 
     Args:
@@ -115,14 +248,17 @@ class SolrAPI(object):
       path: a str - HTTP path.
       params: a dict containing URL params
       json_data: a json-serializable object to pass in request body.
+      collection: a str - name of Solr collection the request is related to.
+      update: a bool indicating if request updates documents.
     Returns (asynchronously):
       A httpclient.HTTPResponse.
     """
+    location = self.choose_location(collection, update)
     if params:
       url_params = urlencode(params)
-      url = 'http://{}{}?{}'.format(self.solr_location, path, url_params)
+      url = 'http://{}{}?{}'.format(location, path, url_params)
     else:
-      url = 'http://{}{}'.format(self.solr_location, path)
+      url = 'http://{}{}'.format(location, path)
 
     if json_data is not None:
       headers = {'Content-type': 'application/json'}
@@ -134,14 +270,17 @@ class SolrAPI(object):
     if path.endswith('query'):
       logger.debug(u'QUERY_BODY: {}'.format(body))
 
+    # AsyncHTTPClient is a shared instance configured by configure_http_client.
     async_http_client = httpclient.AsyncHTTPClient()
     request = httpclient.HTTPRequest(
       url=url, method=method, headers=headers, body=body,
       connect_timeout=SOLR_TIMEOUT, request_timeout=SOLR_TIMEOUT,
       allow_nonstandard_methods=True
     )
+    self._outstanding_requests[location] += 1
     try:
-      response = await async_http_client.fetch(request)
+      async with self._node_semaphores[location]:
+        response = await async_http_client.fetch(request)
     except socket.error as err:
       raise SolrIsNotReachable('Socket error ({})'.format(err))
     except httpclient.HTTPError as err:
@@ -161,17 +300,21 @@ class SolrAPI(object):
         raise SolrClientError(msg)
       else:
         raise SolrServerError(msg)
+    finally:
+      self._outstanding_requests[location] -= 1
 
     return response
 
-  async def get(self, path, params=None, json_data=None):
+  async def get(self, path, params=None, json_data=None, collection=None):
     """ GET wrapper of request method """
-    response = await self.request('GET', path, params, json_data)
+    response = await self.request('GET', path, params, json_data, collection)
     return response
 
-  async def post(self, path, params=None, json_data=None):
+  async def post(self, path, params=None, json_data=None, collection=None,
+                 update=False):
     """ POST wrapper of request method """
-    response = await self.request('POST', path, params, json_data)
+    response = await self.request('POST', path, params, json_data,
+                                  collection, update)
     return response
 
   async def list_collections(self):
@@ -303,7 +446,8 @@ class SolrAPI(object):
       # created fields.
       # So using old API (/solr/...).
       response = await self.get(
-        '/solr/{}/admin/luke?numTerms=0'.format(collection)
+        '/solr/{}/admin/luke?numTerms=0'.format(collection),
+        collection=collection
       )
       return json.loads(response.body.decode('utf-8'))
     except SolrError:
@@ -326,7 +470,7 @@ class SolrAPI(object):
         params = {'commit': 'true'}
       await self.post(
         '/v2/collections/{}/update'.format(collection),
-        params=params, json_data=documents
+        params=params, json_data=documents, collection=collection, update=True
       )
       logger.info('Successfully indexed {} documents to collection {}'
                   .format(len(documents), collection))
@@ -352,7 +496,8 @@ class SolrAPI(object):
       # So using old API (/solr/...).
       await self.post(
         '/solr/{}/update'.format(collection),
-        params=params, json_data={"delete": ids}
+        params=params, json_data={"delete": ids}, collection=collection,
+        update=True
       )
       logger.info('Successfully deleted {} documents from collection {}'
                   .format(len(ids), collection))
@@ -417,7 +562,7 @@ class SolrAPI(object):
     try:
       response = await self.post(
         '/v2/collections/{}/query'.format(collection),
-        json_data=json_data
+        json_data=json_data, collection=collection
       )
       json_response = json.loads(response.body.decode('utf-8'))
       query_response = json_response['response']
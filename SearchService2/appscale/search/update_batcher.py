@@ -0,0 +1,169 @@
+"""
+Coalesces concurrent document updates of a Solr collection.
+
+Apps often index or delete documents one by one, so every Search API call
+would produce a separate Solr update request. UpdateBatcher holds updates
+for a short period of time and sends all updates which were received
+for a collection during that period as a single Solr request.
+"""
+import collections
+import itertools
+import logging
+
+from tornado import concurrent, ioloop, locks
+
+from appscale.search.constants import (
+  SolrClientError, SOLR_UPDATE_BATCH_WINDOW, SOLR_UPDATE_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+PUT = 'put'
+DELETE = 'delete'
+
+
+class _PendingUpdate(object):
+  """ Update requested by a single caller. """
+  __slots__ = ['kind', 'items', 'future']
+
+  def __init__(self, kind, items):
+    self.kind = kind
+    self.items = items
+    self.future = concurrent.Future()
+
+
+class _PendingBatch(object):
+  """ Updates of a collection waiting to be sent to Solr. """
+  __slots__ = ['updates', 'size', 'timeout']
+
+  def __init__(self):
+    self.updates = []
+    self.size = 0
+    self.timeout = None
+
+
+class UpdateBatcher(object):
+  """ Merges updates of a collection received within a short time window
+  into a single Solr update request.
+  """
+
+  def __init__(self, solr, window=SOLR_UPDATE_BATCH_WINDOW,
+               max_size=SOLR_UPDATE_BATCH_SIZE):
+    """ Initializes UpdateBatcher.
+
+    Args:
+      solr: an instance of SolrAPI.
+      window: a float - max number of seconds to hold updates for.
+      max_size: an int - number of documents which triggers sending
+        pending updates before the end of time window.
+    """
+    self.solr = solr
+    self.window = window
+    self.max_size = max_size
+    self._pending = {}
+    # Batches of the same collection should be applied in the same order.
+    self._send_locks = collections.defaultdict(locks.Lock)
+
+  async def put_documents(self, collection, documents):
+    """ Puts documents into Solr collection along with concurrent updates.
+
+    Args:
+      collection: a str - name of Solr collection.
+      documents: a list of documents to put.
+    """
+    await self._add_update(collection, PUT, documents)
+
+  async def delete_documents(self, collection, ids):
+    """ Deletes documents from Solr collection along with concurrent updates.
+
+    Args:
+      collection: a str - name of Solr collection.
+      ids: a list of document IDs to delete.
+    """
+    await self._add_update(collection, DELETE, ids)
+
+  def _add_update(self, collection, kind, items):
+    """ Adds update to pending batch of collection.
+
+    Args:
+      collection: a str - name of Solr collection.
+      kind: a str - PUT or DELETE.
+      items: a list of documents or document IDs.
+    Returns:
+      A Future which is resolved when the update is applied.
+    """
+    io_loop = ioloop.IOLoop.current()
+    batch = self._pending.get(collection)
+    if batch is None:
+      batch = self._pending[collection] = _PendingBatch()
+      batch.timeout = io_loop.call_later(self.window, self._flush, collection)
+    update = _PendingUpdate(kind, items)
+    batch.updates.append(update)
+    batch.size += len(items)
+    if batch.size >= self.max_size:
+      io_loop.remove_timeout(batch.timeout)
+      self._flush(collection)
+    return update.future
+
+  def _flush(self, collection):
+    """ Starts sending pending updates of collection.
+
+    Args:
+      collection: a str - name of Solr collection.
+    """
+    batch = self._pending.pop(collection, None)
+    if batch:
+      ioloop.IOLoop.current().spawn_callback(
+        self._send_batch, collection, batch.updates
+      )
+
+  async def _send_batch(self, collection, updates):
+    """ Sends updates to Solr and resolves futures of callers.
+    Consecutive updates of the same kind are sent as a single request.
+
+    Args:
+      collection: a str - name of Solr collection.
+      updates: a list of _PendingUpdate.
+    """
+    async with self._send_locks[collection]:
+      for kind, group in itertools.groupby(updates, lambda item: item.kind):
+        group = list(group)
+        try:
+          await self._send(collection, kind, group)
+        except SolrClientError as err:
+          if len(group) == 1:
+            group[0].future.set_exception(err)
+            continue
+          # One of documents is likely to be invalid. Don't let it
+          # fail updates of other callers.
+          logger.warning('Failed to apply {} merged updates to {}, '
+                         'retrying them one by one'
+                         .format(len(group), collection))
+          for update in group:
+            try:
+              await self._send(collection, kind, [update])
+            except Exception as err:
+              update.future.set_exception(err)
+            else:
+              update.future.set_result(None)
+          continue
+        except Exception as err:
+          for update in group:
+            update.future.set_exception(err)
+          continue
+        for update in group:
+          update.future.set_result(None)
+
+  async def _send(self, collection, kind, updates):
+    """ Sends merged updates of the same kind to Solr.
+
+    Args:
+      collection: a str - name of Solr collection.
+      kind: a str - PUT or DELETE.
+      updates: a list of _PendingUpdate.
+    """
+    items = [item for update in updates for item in update.items]
+    if kind == PUT:
+      await self.solr.put_documents(collection, items)
+    else:
+      await self.solr.delete_documents(collection, items)
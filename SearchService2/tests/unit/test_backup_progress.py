@@ -0,0 +1,37 @@
+import os
+
+from appscale.search.backup_restore.progress import (
+  CompletedRanges, ProgressManifest
+)
+
+
+def test_watermark_moves_after_consecutive_ranges():
+  ranges = CompletedRanges('*')
+  ranges.start('*', 'b')
+  ranges.start('b', 'd')
+  ranges.start('d', 'f')
+  ranges.complete('b')
+  assert ranges.watermark == '*'
+  ranges.complete('*')
+  assert ranges.watermark == 'd'
+  assert ranges.pending == 1
+  ranges.complete('d')
+  assert ranges.watermark == 'f'
+  assert ranges.pending == 0
+
+
+def test_manifest_is_saved_and_loaded(tmpdir):
+  path = os.path.join(str(tmpdir), 'progress.json')
+  manifest = ProgressManifest(path)
+  manifest.data['exported_ranges'] = {'app/ns/index': 'doc-100'}
+  manifest.save()
+  assert not manifest.is_save_due()
+  loaded = ProgressManifest(path)
+  assert loaded.data == {'exported_ranges': {'app/ns/index': 'doc-100'}}
+
+
+def test_manifest_without_path_is_not_saved():
+  manifest = ProgressManifest(None)
+  manifest.data['imported_keys'] = ['key']
+  manifest.save()
+  assert manifest.path is None
@@ -0,0 +1,18 @@
+import threading
+
+from appscale.search.backup_restore.storage import ThreadLocalBucket
+
+
+def test_every_thread_gets_own_bucket():
+  buckets = ThreadLocalBucket('http://127.0.0.1:9000', 'search-backup',
+                              'access-key', 'secret-key')
+  main_bucket = buckets.get()
+  assert buckets.get() is main_bucket
+  assert main_bucket.name == 'search-backup'
+
+  thread_buckets = []
+  thread = threading.Thread(target=lambda: thread_buckets.append(buckets.get()))
+  thread.start()
+  thread.join()
+  assert thread_buckets[0] is not main_bucket
+  assert thread_buckets[0].meta.client is not main_bucket.meta.client
@@ -2,8 +2,8 @@ import collections
 
 from appscale.search import solr_adapter
 from appscale.search.facet_converter import (
-  discover_facets, generate_refinement_filter, convert_facet_requests,
-  convert_facet_results
+  generate_discovery_facets, convert_discovered_facets,
+  generate_refinement_filter, convert_facet_requests, convert_facet_results
 )
 from appscale.search.models import (
   SolrSchemaFieldInfo, FacetRefinement, FacetRequest, FacetResult
@@ -70,44 +70,71 @@ def test_refinements_filter():
   assert actual_set == expected_set
 
 
-def test_discover_facets():
-  tag_solr_field = GROUPED_FACETS['tag'][0]
-  product_solr_field = GROUPED_FACETS['product'][0]
-  category_solr_field = GROUPED_FACETS['category'][0]
-  country_solr_field = GROUPED_FACETS['country'][0]
-  price_solr_field = GROUPED_FACETS['price'][0]
-  fake_stats = [
-    (tag_solr_field, 203),
-    (product_solr_field, 687),
-    (category_solr_field, 167),
-    (country_solr_field, 1023),
-    (price_solr_field, 365),
-  ]
-  facet_items, stats_items = discover_facets(
-    facets_stats=fake_stats, facets_count=4, value_limit=5
-  )
-  expected_facet_items = [
-    ('country*', {
-      'type': 'terms',
-      'field': 'country_atom_facet',
-      'limit': 5
+def test_generate_discovery_facets():
+  facet_fields = [GROUPED_FACETS['tag'][0], GROUPED_FACETS['price'][0]]
+  facet_items = generate_discovery_facets(facet_fields, value_limit=5)
+  assert facet_items == [
+    ('discover.tag_atom_facet', {
+      'type': 'query',
+      'q': 'tag_atom_facet:*',
+      'facet': {
+        'values': {'type': 'terms', 'field': 'tag_atom_facet', 'limit': 5}
+      }
     }),
-    ('product*', {
-      'type': 'terms',
-      'field': 'product_atom_facet',
-      'limit': 5
-    }),
-    ('tag*', {
-      'type': 'terms',
-      'field': 'tag_atom_facet',
-      'limit': 5
+    ('discover.price_number_facet', {
+      'type': 'query',
+      'q': 'price_number_facet:*',
+      'facet': {
+        'min': 'min(price_number_facet)',
+        'max': 'max(price_number_facet)'
+      }
     }),
   ]
-  expected_stats_items = [
-    (price_solr_field, '{!min=true max=true count=true}price_number_facet'),
+
+
+def test_convert_discovered_facets():
+  facet_fields = [
+    GROUPED_FACETS['tag'][0],
+    GROUPED_FACETS['product'][0],
+    GROUPED_FACETS['category'][0],
+    GROUPED_FACETS['country'][0],
+    GROUPED_FACETS['price'][0],
+    GROUPED_FACETS['year'][0],
   ]
-  assert facet_items == expected_facet_items
-  assert stats_items == expected_stats_items
+  solr_facet_results = {
+    'count': 2000,
+    'discover.tag_atom_facet': {
+      'count': 203,
+      'values': {'buckets': [{'val': 'food', 'count': 150}]}
+    },
+    'discover.product_atom_facet': {
+      'count': 687,
+      'values': {'buckets': [{'val': 'laptop', 'count': 600},
+                             {'val': 'phone', 'count': 87}]}
+    },
+    'discover.category_atom_facet': {
+      'count': 167,
+      'values': {'buckets': [{'val': 'books', 'count': 167}]}
+    },
+    'discover.country_atom_facet': {
+      'count': 1023,
+      'values': {'buckets': [{'val': 'cn', 'count': 1000}]}
+    },
+    'discover.price_number_facet': {'count': 365, 'min': 1.5, 'max': 99.0},
+    'discover.year_number_facet': {'count': 0},
+  }
+  facet_results = convert_discovered_facets(
+    solr_facet_results, facet_fields, facets_count=4
+  )
+  assert facet_results == [
+    FacetResult(name='country', values=[('cn', 1000)], ranges=[]),
+    FacetResult(name='product', values=[('laptop', 600), ('phone', 87)],
+                ranges=[]),
+    FacetResult(name='price', values=[('[1.5,99.0)', 365)], ranges=[]),
+    FacetResult(name='tag', values=[('food', 150)], ranges=[]),
+  ]
+  # Discovery facets are not converted as regular facets.
+  assert convert_facet_results(solr_facet_results, []) == []
 
 
 def test_convert_facet_requests():
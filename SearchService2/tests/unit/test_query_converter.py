@@ -4,7 +4,7 @@ import pytest
 
 from appscale.search import solr_adapter
 from appscale.search.models import SolrSchemaFieldInfo
-from appscale.search.query_converter import prepare_solr_query
+from appscale.search.query_converter import prepare_solr_query, query_cache
 
 
 def generate_fields(solr_field_names):
@@ -295,3 +295,16 @@ def test_complex_composition():
     'description_txt_en',
     'description_txt_fr',
   }
+
+
+def test_converted_query_is_cached():
+  hits = query_cache.hits
+  first = prepare_solr_query('cached query', FIELDS, GROUPED_FIELDS)
+  second = prepare_solr_query('cached query', FIELDS, GROUPED_FIELDS)
+  assert second is first
+  assert query_cache.hits == hits + 1
+  # Another schema gets its own cache entry.
+  fields, grouped_fields = generate_fields(['tag_atom'])
+  third = prepare_solr_query('cached query', fields, grouped_fields)
+  assert third is not first
+  assert set(third.query_fields) == {'tag_atom'}
@@ -0,0 +1,57 @@
+import pytest
+
+from appscale.search.query_parser import parser
+
+
+def dump(node):
+  """ Helper function for representing parsed query as comparable tuples.
+
+  Args:
+    node: an Expression, ExpressionsGroup, ValuesGroup or Value.
+  Returns:
+    A tuple describing the node and its children.
+  """
+  if isinstance(node, (parser.ExpressionsGroup, parser.ValuesGroup)):
+    return (node.operator, tuple(dump(element) for element in node.elements))
+  if isinstance(node, parser.Expression):
+    return (node.field_name, node.operator, dump(node.value))
+  return (node.not_, node.stem, node.str_value)
+
+
+@pytest.mark.parametrize('query', [
+  'hello',
+  '  hello   world ',
+  '~hello NOT world',
+  '"hello world" -123.4 2019-01-23',
+  'title:hello description="hello world"',
+  'laptop brand:acme NOT refurbished ~cheap',
+])
+def test_simple_query_matches_antlr(query):
+  simple_query = parser._parse_simple_query(query)
+  assert simple_query is not None
+  assert dump(simple_query) == dump(parser._parse_antlr_query(query))
+
+
+@pytest.mark.parametrize('query', [
+  'hello OR world',
+  'hello AND world',
+  '(hello world)',
+  'price < 10',
+  'price<10',
+  'title:(hello OR world)',
+  'title:~hello',
+  'NOT title:hello',
+  'NOT',
+  '"escaped \\" quote"',
+  '',
+])
+def test_complex_query_is_not_simple(query):
+  assert parser._parse_simple_query(query) is None
+
+
+def test_simple_query_structure():
+  query = parser.parse_query('NOT hello title:"big world"')
+  assert dump(query) == (parser.AND, (
+    (None, parser.EQUALS, (True, False, 'hello')),
+    ('title', parser.EQUALS, (False, False, '"big world"')),
+  ))
@@ -0,0 +1,102 @@
+import time
+from unittest import mock
+
+from tornado import ioloop
+
+from appscale.search import solr_adapter
+from appscale.search.constants import SCHEMA_CACHE_TTL
+from appscale.search.models import Document, Field
+
+LUKE_RESPONSE = {
+  'fields': {
+    'id': {'docs': 2},
+    'rank': {'docs': 2},
+    'title_txt_en': {'docs': 2},
+  },
+  'index': {
+    'numDocs': 2,
+    'indexHeapUsageBytes': 100,
+    'segmentsFileSizeInBytes': 1000,
+  }
+}
+
+
+class FakeSolrAPI(object):
+  def __init__(self):
+    self.schema_requests = 0
+
+  async def get_schema_info(self, collection):
+    self.schema_requests += 1
+    return LUKE_RESPONSE
+
+  async def put_documents(self, collection, solr_documents):
+    pass
+
+
+def make_adapter():
+  with mock.patch.object(solr_adapter, 'SearchServiceSettings'), \
+       mock.patch.object(solr_adapter, 'SolrAPI'):
+    adapter = solr_adapter.SolrAdapter(zk_client=None)
+  adapter.solr = FakeSolrAPI()
+  adapter._update_batcher.solr = adapter.solr
+  return adapter
+
+
+def run_sync(coroutine_function):
+  return ioloop.IOLoop.current().run_sync(coroutine_function)
+
+
+def test_schema_is_cached():
+  adapter = make_adapter()
+
+  async def get_schema_twice():
+    first = await adapter._get_schema_info('app', '', 'index')
+    second = await adapter._get_schema_info('app', '', 'index')
+    return first, second
+
+  first, second = run_sync(get_schema_twice)
+  assert first is second
+  assert adapter.solr.schema_requests == 1
+  assert adapter.schema_cache_stats == {
+    'hits': 1, 'misses': 1, 'collections': 1
+  }
+
+
+def test_stale_schema_is_refreshed_in_background():
+  adapter = make_adapter()
+
+  async def get_stale_schema():
+    first = await adapter._get_schema_info('app', '', 'index')
+    collection = first.collection
+    _, index_schema, fields = adapter._schema_cache[collection]
+    stale_time = time.time() - SCHEMA_CACHE_TTL - 1
+    adapter._schema_cache[collection] = (stale_time, index_schema, fields)
+    second = await adapter._get_schema_info('app', '', 'index')
+    # Let background refresh complete.
+    await adapter._schema_fetches[collection]
+    return first, second
+
+  first, second = run_sync(get_stale_schema)
+  assert first is second
+  assert adapter.solr.schema_requests == 2
+  assert adapter.schema_cache_hits == 1
+  fetched_at, _, _ = adapter._schema_cache[first.collection]
+  assert time.time() - fetched_at < SCHEMA_CACHE_TTL
+
+
+def test_new_field_invalidates_schema():
+  adapter = make_adapter()
+  known_field = Field(Field.Type.TEXT, 'title', 'Hello', 'en')
+  new_field = Field(Field.Type.ATOM, 'tag', 'greeting', None)
+
+  async def index_and_get_schema(fields):
+    await adapter._get_schema_info('app', '', 'index')
+    document = Document('doc1', fields, [], 'en', 1)
+    await adapter.index_documents('app', '', 'index', [document])
+    await adapter._get_schema_info('app', '', 'index')
+
+  run_sync(lambda: index_and_get_schema([known_field]))
+  assert adapter.solr.schema_requests == 1
+
+  run_sync(lambda: index_and_get_schema([known_field, new_field]))
+  assert adapter.solr.schema_requests == 2
@@ -0,0 +1,98 @@
+import json
+from unittest import mock
+
+from appscale.search import solr_api
+
+COLLECTION_STATE = {
+  'appscale_app_ns_index': {
+    'shards': {
+      'shard1': {
+        'replicas': {
+          'core_node1': {
+            'node_name': '10.0.0.1:8983_solr',
+            'state': 'active',
+            'leader': 'true'
+          },
+          'core_node2': {
+            'node_name': '10.0.0.2:8983_solr',
+            'state': 'active'
+          },
+          'core_node3': {
+            'node_name': '10.0.0.3:8983_solr',
+            'state': 'down'
+          }
+        }
+      }
+    }
+  }
+}
+
+
+def make_solr_api(private_ip):
+  with mock.patch.object(solr_api, 'appscale_info') as appscale_info, \
+       mock.patch.object(solr_api, 'tornado_synchronous'):
+    appscale_info.get_private_ip.return_value = private_ip
+    api = solr_api.SolrAPI(mock.MagicMock(), '/solr', settings=None)
+  api._update_live_nodes(
+    ['10.0.0.1:8983_solr', '10.0.0.2:8983_solr', '10.0.0.3:8983_solr',
+     '10.0.0.4:8983_solr']
+  )
+  state_json = json.dumps(COLLECTION_STATE).encode('utf-8')
+  api._update_collection_state('appscale_app_ns_index', state_json)
+  return api
+
+
+def test_parse_collection_state():
+  leaders, replicas = solr_api.parse_collection_state(COLLECTION_STATE)
+  assert leaders == {'10.0.0.1:8983'}
+  assert replicas == {'10.0.0.1:8983', '10.0.0.2:8983'}
+
+
+def test_updates_go_to_leader():
+  api = make_solr_api('10.0.0.2')
+  location = api.choose_location('appscale_app_ns_index', update=True)
+  assert location == '10.0.0.1:8983'
+
+
+def test_local_replica_is_preferred():
+  api = make_solr_api('10.0.0.2')
+  assert api.choose_location('appscale_app_ns_index') == '10.0.0.2:8983'
+
+
+def test_least_busy_replica_is_chosen():
+  api = make_solr_api('10.0.0.4')
+  api._outstanding_requests['10.0.0.1:8983'] = 3
+  api._outstanding_requests['10.0.0.2:8983'] = 1
+  assert api.choose_location('appscale_app_ns_index') == '10.0.0.2:8983'
+
+
+def test_unknown_collection_uses_local_node():
+  api = make_solr_api('10.0.0.4')
+  assert api.choose_location('appscale_unknown') == '10.0.0.4:8983'
+
+
+def test_deleted_collection_is_forgotten():
+  api = make_solr_api('10.0.0.4')
+  assert api._update_collection_state('appscale_app_ns_index', None) is False
+  assert 'appscale_app_ns_index' not in api._collection_nodes
+
+
+def test_collection_state_is_watched_by_name():
+  api = make_solr_api('10.0.0.4')
+  api._update_collections(['appscale_app_other_index'])
+  watch_path, callback = api._zk_client.DataWatch.call_args[0]
+  assert watch_path == '/solr/collections/appscale_app_other_index/state.json'
+
+  # DataWatch passes (data, stat, event) to the callback.
+  state_json = json.dumps(COLLECTION_STATE).encode('utf-8')
+  callback(state_json, mock.MagicMock(), None)
+  callback(state_json, mock.MagicMock(), mock.MagicMock())
+  assert set(api._collection_nodes) == {
+    'appscale_app_ns_index', 'appscale_app_other_index'
+  }
+
+  # Recreated collection is watched again after deletion.
+  assert callback(None, None, mock.MagicMock()) is False
+  assert 'appscale_app_other_index' not in api._watched_collections
+  api._update_collections(['appscale_app_other_index'])
+  assert api._zk_client.DataWatch.call_count == 2
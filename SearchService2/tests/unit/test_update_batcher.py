@@ -0,0 +1,82 @@
+from tornado import gen, ioloop
+
+from appscale.search.constants import SolrClientError
+from appscale.search.update_batcher import UpdateBatcher
+
+
+class FakeSolrAPI(object):
+  def __init__(self):
+    self.requests = []
+
+  async def put_documents(self, collection, documents):
+    self.requests.append(('put', collection, list(documents)))
+    if any(doc.get('invalid') for doc in documents):
+      raise SolrClientError('Invalid document')
+
+  async def delete_documents(self, collection, ids):
+    self.requests.append(('delete', collection, list(ids)))
+
+
+def run_sync(coroutine_function):
+  return ioloop.IOLoop.current().run_sync(coroutine_function)
+
+
+def test_concurrent_updates_are_merged():
+  solr = FakeSolrAPI()
+  batcher = UpdateBatcher(solr, window=0.01, max_size=100)
+
+  async def update():
+    await gen.multi([
+      batcher.put_documents('col', [{'id': '1'}]),
+      batcher.put_documents('col', [{'id': '2'}, {'id': '3'}]),
+      batcher.delete_documents('col', ['4']),
+      batcher.delete_documents('col', ['5']),
+      batcher.put_documents('other', [{'id': '6'}]),
+    ])
+
+  run_sync(update)
+  assert sorted(solr.requests) == [
+    ('delete', 'col', ['4', '5']),
+    ('put', 'col', [{'id': '1'}, {'id': '2'}, {'id': '3'}]),
+    ('put', 'other', [{'id': '6'}]),
+  ]
+  # Order of updates of the same collection is preserved.
+  assert solr.requests.index(('delete', 'col', ['4', '5'])) > (
+    solr.requests.index(('put', 'col', [{'id': '1'}, {'id': '2'}, {'id': '3'}]))
+  )
+
+
+def test_batch_is_sent_when_size_limit_is_reached():
+  solr = FakeSolrAPI()
+  batcher = UpdateBatcher(solr, window=60, max_size=2)
+
+  async def update():
+    await gen.multi([
+      batcher.put_documents('col', [{'id': '1'}]),
+      batcher.put_documents('col', [{'id': '2'}]),
+    ])
+
+  run_sync(update)
+  assert solr.requests == [('put', 'col', [{'id': '1'}, {'id': '2'}])]
+
+
+def test_invalid_document_fails_only_its_caller():
+  solr = FakeSolrAPI()
+  batcher = UpdateBatcher(solr, window=0.01, max_size=100)
+
+  async def put(documents):
+    try:
+      await batcher.put_documents('col', documents)
+      return 'ok'
+    except SolrClientError:
+      return 'error'
+
+  async def update():
+    return await gen.multi([
+      put([{'id': '1'}]),
+      put([{'id': '2', 'invalid': True}]),
+      put([{'id': '3'}]),
+    ])
+
+  assert run_sync(update) == ['ok', 'error', 'ok']
+  assert len(solr.requests) == 4
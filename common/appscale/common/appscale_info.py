@@ -2,9 +2,12 @@
 This file contains functions for getting and setting information related
 to AppScale and the current node/machine.
 """
+import copy
 import json
 import logging
 import multiprocessing
+import os
+import threading
 import yaml
 
 from . import constants
@@ -13,6 +16,60 @@ from . import file_io
 logger = logging.getLogger(__name__)
 
 
+class FileCache(object):
+  """ Keeps contents of deployment files in memory until the files change.
+
+  A file is considered changed when its mtime, size or inode differ from the
+  ones it had when it was read, so files replaced with a rename are picked up
+  as well.
+  """
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._entries = {}  # {(path, parser): (file_version, value)}
+
+  def read(self, path, parser=None):
+    """ Reads a file using the cached contents if the file hasn't changed.
+
+    Args:
+      path: A str, the path to the file.
+      parser: A function to apply to the contents before caching them.
+    Returns:
+      The contents of the file (parsed if a parser is given).
+    Raises:
+      IOError if the file can't be read.
+    """
+    key = (path, parser)
+    try:
+      file_stat = os.stat(path)
+    except OSError:
+      # Let file_io raise the usual error.
+      file_version = None
+    else:
+      file_version = (file_stat.st_mtime, file_stat.st_size, file_stat.st_ino)
+      with self._lock:
+        entry = self._entries.get(key)
+      if entry is not None and entry[0] == file_version:
+        return entry[1]
+
+    value = file_io.read(path)
+    if parser is not None:
+      value = parser(value)
+
+    if file_version is not None:
+      with self._lock:
+        self._entries[key] = (file_version, value)
+
+    return value
+
+  def clear(self):
+    """ Removes all cached contents. """
+    with self._lock:
+      self._entries.clear()
+
+
+file_cache = FileCache()
+
+
 def read_file_contents(path):
   """ Reads the contents of the given file.
 
@@ -24,12 +81,12 @@ def read_file_contents(path):
 
 def get_appcontroller_client():
   """ Returns an AppControllerClient instance for this deployment. """
-  raw_ips = file_io.read('/etc/appscale/load_balancer_ips')
+  raw_ips = file_cache.read('/etc/appscale/load_balancer_ips')
   ips = raw_ips.split('\n')
   head_node = ips[0]
 
   secret_file = '/etc/appscale/secret.key'
-  secret = read_file_contents(secret_file)
+  secret = file_cache.read(secret_file)
 
   from appscale.appcontroller_client import AppControllerClient
   return AppControllerClient(head_node, secret)
@@ -44,9 +101,9 @@ def get_all_ips():
   Returns:
     A list of node IPs.
   """
-  nodes = file_io.read(constants.ALL_IPS_LOC)
+  nodes = file_cache.read(constants.ALL_IPS_LOC)
   nodes = nodes.split('\n')
-  return filter(None, nodes)
+  return [node for node in nodes if node]
 
 def get_load_balancer_ips():
   """ Get the IPs for all load balancer nodes in the deployment.
@@ -54,8 +111,8 @@ def get_load_balancer_ips():
   Returns:
     A list of LB node IPs.
   """
-  with open(constants.LOAD_BALANCER_IPS_LOC) as lbs_file:
-    return [line.strip() for line in lbs_file if line.strip()]
+  lbs = file_cache.read(constants.LOAD_BALANCER_IPS_LOC)
+  return [line.strip() for line in lbs.split('\n') if line.strip()]
 
 def get_headnode_ip():
   """ Get the private IP of the head node. NOTE: it can change if node
@@ -64,7 +121,7 @@ def get_headnode_ip():
   Returns:
     String containing the private IP of the head node.
   """
-  return file_io.read(constants.HEADNODE_IP_LOC).rstrip()
+  return file_cache.read(constants.HEADNODE_IP_LOC).rstrip()
 
 def get_login_ip():
   """ Get the public IP of the head node. NOTE: it can change if node
@@ -73,7 +130,7 @@ def get_login_ip():
   Returns:
     String containing the public IP of the head node.
   """
-  return file_io.read(constants.LOGIN_IP_LOC).rstrip()
+  return file_cache.read(constants.LOGIN_IP_LOC).rstrip()
 
 def get_db_proxy():
   """ Get the IP of an active DB load balancer. Since there can be
@@ -82,7 +139,7 @@ def get_db_proxy():
   Returns:
     String containing the IP of an active load balancer.
   """
-  raw_ips = file_io.read(constants.LOAD_BALANCER_IPS_LOC)
+  raw_ips = file_cache.read(constants.LOAD_BALANCER_IPS_LOC)
   ips = raw_ips.split('\n')
   return ips[0]
 
@@ -93,7 +150,7 @@ def get_tq_proxy():
   Returns:
     String containing the IP of an active load balancer.
   """
-  raw_ips = file_io.read(constants.LOAD_BALANCER_IPS_LOC)
+  raw_ips = file_cache.read(constants.LOAD_BALANCER_IPS_LOC)
   ips = raw_ips.split('\n')
   return ips[0]
 
@@ -103,7 +160,7 @@ def get_private_ip():
   Returns:
     String containing the private IP of the current machine.
   """
-  return file_io.read(constants.PRIVATE_IP_LOC).rstrip()
+  return file_cache.read(constants.PRIVATE_IP_LOC).rstrip()
 
 def get_public_ip():
   """ Get the public IP of the current machine.
@@ -111,7 +168,7 @@ def get_public_ip():
   Returns:
     String containing the public IP of the current machine.
   """
-  return file_io.read(constants.PUBLIC_IP_LOC).rstrip()
+  return file_cache.read(constants.PUBLIC_IP_LOC).rstrip()
 
 def get_secret():
   """ Get AppScale shared security key for authentication.
@@ -119,7 +176,7 @@ def get_secret():
   Returns:
     String containing the secret key.
   """
-  return file_io.read(constants.SECRET_LOC).rstrip()
+  return file_cache.read(constants.SECRET_LOC).rstrip()
 
 def get_num_cpus():
   """ Get the number of CPU processes on the current machine.
@@ -135,8 +192,8 @@ def get_db_info():
   Returns:
     A dictionary with database info
   """
-  info = file_io.read(constants.DB_INFO_LOC)
-  return yaml.safe_load(info)
+  # The parsed dictionary is shared, so callers get a copy of it.
+  return copy.deepcopy(file_cache.read(constants.DB_INFO_LOC, yaml.safe_load))
 
 def get_taskqueue_nodes():
   """ Returns a list of all the taskqueue nodes (including the master).
@@ -145,7 +202,7 @@ def get_taskqueue_nodes():
   Returns:
     A list of taskqueue nodes.
   """
-  nodes = file_io.read(constants.TASKQUEUE_NODE_FILE)
+  nodes = file_cache.read(constants.TASKQUEUE_NODE_FILE)
   nodes = nodes.split('\n')
   if nodes[-1] == '':
     nodes = nodes[:-1]
@@ -215,7 +272,7 @@ def get_db_master_ip():
     A str, the IP of the datastore master.
   """
   try:
-    return file_io.read(constants.MASTERS_FILE_LOC).rstrip()
+    return file_cache.read(constants.MASTERS_FILE_LOC).rstrip()
   except IOError:
     return []
 
@@ -247,7 +304,7 @@ def get_search_location():
     is not available.
   """
   try:
-    return file_io.read(constants.SEARCH_FILE_LOC).rstrip()
+    return file_cache.read(constants.SEARCH_FILE_LOC).rstrip()
   except IOError:
     logger.warning("Search role is not configured.")
     return ""
@@ -1,4 +1,5 @@
 """ This module contains standard functions to use in Service Stats. """
+import math
 
 
 def categorize_by_app(req_info):
@@ -52,3 +53,87 @@ def count_avg_latency(requests):
   if not requests:
     return None
   return sum(request.latency for request in requests) / len(requests)
+
+
+class LatencyHistogram(object):
+  """ A streaming latency histogram with log-linear buckets (similar to
+  HdrHistogram). Values are recorded with a relative error below
+  1 / 2 ** (sub_bucket_bits - 1), so memory usage depends on the range of
+  recorded values rather than on their number.
+  """
+
+  def __init__(self, percentiles, sub_bucket_bits=8):
+    """ Initialises an instance of LatencyHistogram.
+
+    Args:
+      percentiles: a tuple of percentiles to report in summary.
+      sub_bucket_bits: a number of bits defining precision of buckets.
+    """
+    self.percentiles = percentiles
+    self.total = 0
+    self._sub_bucket_bits = sub_bucket_bits
+    self._counts = {}  # {bucket_index: number_of_values}
+
+  def record(self, value):
+    """ Adds value to the histogram.
+
+    Args:
+      value: a non-negative number (latency in ms).
+    """
+    value = max(int(value), 0)
+    shift = max(value.bit_length() - self._sub_bucket_bits, 0)
+    index = (shift << self._sub_bucket_bits) + (value >> shift)
+    self._counts[index] = self._counts.get(index, 0) + 1
+    self.total += 1
+
+  def value_at_percentile(self, percentile):
+    """ Finds the highest value equivalent to the percentile.
+
+    Args:
+      percentile: a number between 0 and 100.
+    Returns:
+      an integer value or None if nothing was recorded.
+    """
+    if not self.total:
+      return None
+    rank = max(int(math.ceil(percentile / 100.0 * self.total)), 1)
+    seen = 0
+    for index in sorted(self._counts):
+      seen += self._counts[index]
+      if seen >= rank:
+        break
+    shift = index >> self._sub_bucket_bits
+    lowest = (index & ((1 << self._sub_bucket_bits) - 1)) << shift
+    return lowest + (1 << shift) - 1
+
+  def summary(self):
+    """
+    Returns:
+      a dictionary containing value for every configured percentile,
+      e.g.: {"p50": 32, "p95": 180, "p99": 422}.
+    """
+    return {
+      "p{:g}".format(percentile): self.value_at_percentile(percentile)
+      for percentile in self.percentiles
+    }
+
+
+class LatencyPercentiles(object):
+  """ Reports latency percentiles. Can be used in cumulative counters config,
+  where it is backed by a LatencyHistogram, and as a metric for recent
+  requests.
+  """
+
+  DEFAULT_PERCENTILES = (50, 95, 99)
+
+  def __init__(self, percentiles=DEFAULT_PERCENTILES):
+    self.percentiles = tuple(percentiles)
+
+  def new_histogram(self):
+    return LatencyHistogram(self.percentiles)
+
+  def __call__(self, requests):
+    histogram = self.new_histogram()
+    for request in requests:
+      histogram.record(request.latency)
+    return histogram.summary()
@@ -2,8 +2,6 @@ from collections import defaultdict
 import logging
 import time
 
-import copy
-
 from appscale.common.service_stats import samples
 
 
@@ -164,7 +162,8 @@ class ServiceStats(object):
     # Initialize properties for tracking latest N requests
     self._last_request_no = 0
     self._current_requests = {}  # {request_no: RequestInfo()}
-    self._finished_requests = []  # circular list containing recent N requests
+    # Circular list containing recent N requests
+    self._finished_requests = _RingBuffer(history_size)
 
     # Configure parameters limiting memory usage
     self._history_size = history_size
@@ -267,8 +266,6 @@ class ServiceStats(object):
     request_info.latency = now - request_info.start_time
     # Add finished request to circular list of finished requests
     self._finished_requests.append(request_info)
-    if len(self._finished_requests) > self._history_size:
-      self._finished_requests.pop(0)
     # Update cumulative counters
     self._increment_counters(self._cumulative_counters_config,
                              self._cumulative_counters, request_info)
@@ -280,6 +277,21 @@ class ServiceStats(object):
       #  - str, callable(categorizer), callable(summarizer), None
       #  - str, callable(categorizer), None, nested config(tuple)
 
+      if isinstance(summarizer, samples.LatencyPercentiles):
+        if categorizer is None:
+          histogram = counters_dict[counter_name]
+        else:
+          category = categorizer(request_info)
+          if category is HIDDEN_CATEGORY:
+            continue
+          category_counters = _get_nested_dict(counters_dict, counter_name)
+          histogram = category_counters.get(category)
+          if histogram is None:
+            histogram = summarizer.new_histogram()
+            category_counters[category] = histogram
+        histogram.record(request_info.latency)
+        continue
+
       if nested_config is None:
         # Stop as soon as possible if we know that matcher doesn't match
         value_to_add = summarizer(request_info)
@@ -310,7 +322,7 @@ class ServiceStats(object):
     Returns:
       A dictionary containing current value of cumulative counters.
     """
-    counter_stats = copy.deepcopy(self._cumulative_counters)
+    counter_stats = _render_counters(self._cumulative_counters)
     counter_stats["from"] = self._start_time
     counter_stats["to"] = _now()
     return counter_stats
@@ -405,7 +417,7 @@ class ServiceStats(object):
       a list of requests finished since specified timestamp.
     """
     if since is None:
-      return self._finished_requests
+      return self._finished_requests.tail(0)
     # Find the first element newer than 'since' using bisect
     left, right = 0, len(self._finished_requests)
     while left < right:
@@ -414,7 +426,7 @@ class ServiceStats(object):
         right = middle
       else:
         left = middle + 1
-    result = self._finished_requests[left:]
+    result = self._finished_requests.tail(left)
     return result
 
   def _clean_outdated(self):
@@ -435,6 +447,54 @@ class ServiceStats(object):
     self._last_autoclean_time = now
 
 
+class _RingBuffer(object):
+  """ A preallocated list of fixed size which replaces the oldest item
+  when a new one is added to a full buffer.
+  """
+
+  def __init__(self, size):
+    self._items = [None] * size
+    self._first = 0  # Position of the oldest item
+    self._count = 0
+
+  def __len__(self):
+    return self._count
+
+  def __getitem__(self, index):
+    """ Gets item by its index starting from the oldest one. """
+    if not 0 <= index < self._count:
+      raise IndexError('Ring buffer index out of range')
+    return self._items[(self._first + index) % len(self._items)]
+
+  def append(self, item):
+    size = len(self._items)
+    if not size:
+      return
+    if self._count < size:
+      self._items[(self._first + self._count) % size] = item
+      self._count += 1
+    else:
+      self._items[self._first] = item
+      self._first = (self._first + 1) % size
+
+  def tail(self, start):
+    """ Copies items to a list.
+
+    Args:
+      start: an index of the first item to copy.
+    Returns:
+      a list of items from start to the newest one.
+    """
+    if start >= self._count:
+      return []
+    size = len(self._items)
+    begin = (self._first + start) % size
+    end = begin + self._count - start
+    if end <= size:
+      return self._items[begin:end]
+    return self._items[begin:] + self._items[:end - size]
+
+
 def _now():
   """
   Returns:
@@ -472,19 +532,42 @@ def _fill_zero_counters_dict(counters_config, counters_dict):
   Returns:
     a filled dictionary with zero counters.
   """
-  for counter_name, categorizer, _, _ in counters_config:
+  for counter_name, categorizer, summarizer, _ in counters_config:
     # Counters config can contain following types of items:
       #  - str, None, callable(summarizer), None
       #  - str, callable(categorizer), callable(summarizer), None
       #  - str, callable(categorizer), None, nested config(tuple)
     if categorizer is None:
       # Set single counter if key is str
-      counters_dict[counter_name] = 0
+      if isinstance(summarizer, samples.LatencyPercentiles):
+        counters_dict[counter_name] = summarizer.new_histogram()
+      else:
+        counters_dict[counter_name] = 0
     else:
       # if categorizer
       counters_dict[counter_name] = {}
   return counters_dict
 
+def _render_counters(counters_dict):
+  """ A util function for copying counters dict. Latency histograms are
+  replaced with their summaries.
+
+  Args:
+    counters_dict: a dict containing counters.
+  Returns:
+    a new dictionary containing values of counters.
+  """
+  rendered = {}
+  for key, value in counters_dict.items():
+    if isinstance(value, dict):
+      rendered[key] = _render_counters(value)
+    elif isinstance(value, samples.LatencyHistogram):
+      rendered[key] = value.summary()
+    else:
+      rendered[key] = value
+  return rendered
+
+
 def _convert_config_dict(init_dict):
   """ Converts initialized by user dict to the tuples model for
   more effective use of Service Stats.
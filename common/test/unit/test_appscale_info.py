@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 try:
@@ -7,7 +10,7 @@ except ImportError:
 
 from mock import patch, MagicMock
 
-from appscale.common import appscale_info, file_io
+from appscale.common import appscale_info, constants, file_io
 
 
 class TestAppScaleInfo(unittest.TestCase):
@@ -87,5 +90,55 @@ class TestAppScaleInfo(unittest.TestCase):
     read_mock.side_effect = IOError('Boom')
     self.assertEquals(appscale_info.get_search_location(), '')
 
+
+class TestFileCache(unittest.TestCase):
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.temp_dir)
+    self.cache = appscale_info.FileCache()
+
+  def write(self, name, contents):
+    path = os.path.join(self.temp_dir, name)
+    with open(path, 'w') as file_handle:
+      file_handle.write(contents)
+    return path
+
+  def test_read_cached(self):
+    path = self.write('all_ips', '192.168.0.1\n')
+    with patch.object(file_io, 'read', wraps=file_io.read) as read_mock:
+      self.assertEqual(self.cache.read(path), '192.168.0.1\n')
+      self.assertEqual(self.cache.read(path), '192.168.0.1\n')
+      self.assertEqual(read_mock.call_count, 1)
+
+      # Files replaced by a rename are read again.
+      new_path = self.write('all_ips.tmp', '192.168.0.2\n')
+      os.rename(new_path, path)
+      self.assertEqual(self.cache.read(path), '192.168.0.2\n')
+      self.assertEqual(read_mock.call_count, 2)
+
+      # So are files rewritten in place.
+      self.write('all_ips', '192.168.0.3\n192.168.0.4\n')
+      self.assertEqual(self.cache.read(path), '192.168.0.3\n192.168.0.4\n')
+      self.assertEqual(read_mock.call_count, 3)
+
+      self.cache.clear()
+      self.cache.read(path)
+      self.assertEqual(read_mock.call_count, 4)
+
+  def test_read_parsed(self):
+    path = self.write('database_info.yaml', ':table: cassandra\n')
+    with patch.object(constants, 'DB_INFO_LOC', path):
+      db_info = appscale_info.get_db_info()
+      db_info[':table'] = 'other'
+      self.assertEqual(appscale_info.get_db_info()[':table'], 'cassandra')
+
+  def test_missing_file(self):
+    path = os.path.join(self.temp_dir, 'missing')
+    self.assertRaises(IOError, self.cache.read, path)
+    self.write('missing', 'contents')
+    self.assertEqual(self.cache.read(path), 'contents')
+
+
 if __name__ == '__main__':
   unittest.main()
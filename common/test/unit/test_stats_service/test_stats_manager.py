@@ -597,6 +597,95 @@ class TestScrollingRecent(unittest.TestCase):
     })
 
 
+class TestLatencyPercentiles(unittest.TestCase):
+
+  def setUp(self):
+    self.time_patcher = patch.object(stats_manager.time, 'time')
+    self.time_mock = self.time_patcher.start()
+    self.time_mock.return_value = time()
+    percentiles = samples.LatencyPercentiles((50, 90, 99.9))
+    self.stats = stats_manager.ServiceStats(
+      "my_service", history_size=10,
+      cumulative_counters={
+        "all": samples.summarize_all,
+        "latency_percentiles": percentiles,
+        ("by_app", samples.categorize_by_app): percentiles
+      },
+      default_metrics_for_recent={
+        "all": samples.count_all,
+        "latency_percentiles": percentiles
+      })
+    self.request_simulation = request_simulator(self.stats, self.time_mock)
+
+  def tearDown(self):
+    self.time_patcher.stop()
+
+  def test_empty_stats(self):
+    counters = self.stats.get_cumulative_counters()
+    self.assertEqual(counters["latency_percentiles"],
+                     {"p50": None, "p90": None, "p99.9": None})
+    self.assertEqual(counters["by_app"], {})
+    recent = self.stats.get_recent()
+    self.assertEqual(recent["latency_percentiles"],
+                     {"p50": None, "p90": None, "p99.9": None})
+
+  def test_percentiles(self):
+    for latency in range(1, 101):
+      app = "guestbook" if latency <= 90 else "other"
+      self.request_simulation(latency=latency, app=app, status=200,
+                              end_time=1515595821111 + latency)
+
+    counters = self.stats.get_cumulative_counters()
+    self.assertEqual(counters["all"], 100)
+    self.assertPercentiles(counters["latency_percentiles"],
+                           {"p50": 50, "p90": 90, "p99.9": 100})
+    self.assertEqual(set(counters["by_app"]), {"guestbook", "other"})
+    self.assertPercentiles(counters["by_app"]["guestbook"],
+                           {"p50": 45, "p90": 81, "p99.9": 90})
+    self.assertPercentiles(counters["by_app"]["other"],
+                           {"p50": 95, "p90": 99, "p99.9": 100})
+
+    # Only 10 latest requests are kept in history
+    recent = self.stats.get_recent()
+    self.assertEqual(recent["all"], 10)
+    self.assertPercentiles(recent["latency_percentiles"],
+                           {"p50": 95, "p90": 99, "p99.9": 100})
+
+  def assertPercentiles(self, actual, expected):
+    # Latencies reported by request_simulator can be off by 1ms
+    # because of float rounding.
+    self.assertEqual(set(actual), set(expected))
+    for key, value in expected.items():
+      self.assertAlmostEqual(actual[key], value, delta=1)
+
+  def test_histogram_precision(self):
+    histogram = samples.LatencyHistogram((50, 99))
+    for latency in range(1000, 1000001, 1000):
+      histogram.record(latency)
+    for percentile, expected in ((50, 500000), (99, 990000)):
+      value = histogram.value_at_percentile(percentile)
+      self.assertLessEqual(abs(value - expected), expected / 128.0)
+
+
+class TestRingBuffer(unittest.TestCase):
+
+  def test_ring_buffer(self):
+    ring_buffer = stats_manager._RingBuffer(3)
+    self.assertEqual(ring_buffer.tail(0), [])
+    for item in range(5):
+      ring_buffer.append(item)
+    self.assertEqual(len(ring_buffer), 3)
+    self.assertEqual([ring_buffer[index] for index in range(3)], [2, 3, 4])
+    self.assertEqual(ring_buffer.tail(0), [2, 3, 4])
+    self.assertEqual(ring_buffer.tail(2), [4])
+    self.assertEqual(ring_buffer.tail(3), [])
+    self.assertRaises(IndexError, ring_buffer.__getitem__, 3)
+
+    empty_buffer = stats_manager._RingBuffer(0)
+    empty_buffer.append(1)
+    self.assertEqual(empty_buffer.tail(0), [])
+
+
 class TestProperties(unittest.TestCase):
 
   def test_service_name(self):